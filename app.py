@@ -1,24 +1,34 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
-import requests
 import json
 import os
 from datetime import datetime
 import logging
 from config import Config
 import traceback
-import feedparser
 import random
 import hashlib
-import time
-from PIL import Image
-import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from utils.business_info_api import url_scrape
 from utils.content_api import generate_content, get_industry_news, generate_ai_content
 from utils.weekly_planner import auto_distribute_days
+from utils.token_registry import TokenRegistry
+from utils.http_cache import collection_versions, conditional, compress_response
+from utils.events import EventBroker
+from utils.content_pool import ContentPool
+from utils.serialization import FastJSONProvider, collection_response
+from utils.graph_client import GraphClient, CircuitOpenError
+from utils.post_records import RecordMap, PostRecord, PublishedRecord, to_json
+from utils.news_aggregator import NewsAggregator, load_sources
+from utils.admission import AdmissionControl
+from utils.media_store import MediaStore, MediaEmpty, MediaMissing, MediaTooLarge
+from utils.static_assets import StaticAssets
+from utils.profiler import RequestProfiler, forbidden
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
@@ -29,8 +39,84 @@ for warning in warnings:
     logger.warning(warning)
 
 connected_pages = {}
-generated_posts = {}
-published_posts = {}
+# Entries are stored as compact records that read and serialize like dicts
+generated_posts = RecordMap(PostRecord)
+published_posts = RecordMap(PublishedRecord)
+
+
+def _update_page_token(page_id, access_token):
+    if page_id in connected_pages:
+        connected_pages[page_id]['access_token'] = access_token
+        collection_versions.bump('connected_pages')
+
+token_registry = TokenRegistry(
+    Config.FACEBOOK_GRAPH_URL,
+    app_id=Config.FB_APP_ID,
+    app_secret=Config.FB_APP_SECRET,
+    user_token=os.getenv('FB_ACCESS_TOKEN'),
+    refresh_margin=Config.TOKEN_REFRESH_MARGIN_SECONDS,
+    introspect_interval=Config.TOKEN_INTROSPECT_INTERVAL_SECONDS,
+    on_refresh=_update_page_token,
+)
+
+graph_client = GraphClient(
+    connect_timeout=Config.GRAPH_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=Config.GRAPH_READ_TIMEOUT_SECONDS,
+    max_retries=Config.GRAPH_MAX_RETRIES,
+    failure_threshold=Config.GRAPH_BREAKER_FAILURES,
+    reset_timeout=Config.GRAPH_BREAKER_RESET_SECONDS,
+    idempotency_ttl=Config.GRAPH_IDEMPOTENCY_TTL_SECONDS,
+    deferred_max=Config.GRAPH_DEFERRED_MAX,
+)
+
+_trend_tracker = None
+_trend_lock = threading.Lock()
+
+def get_trend_tracker():
+    """Trending terms per industry, created on first use so NumPy isn't imported at startup."""
+    global _trend_tracker
+    with _trend_lock:
+        if _trend_tracker is None:
+            from utils.trending import TrendTracker
+            _trend_tracker = TrendTracker(
+                half_life_hours=Config.TRENDING_HALF_LIFE_HOURS,
+                k=Config.TRENDING_TOP_K,
+                width=Config.TRENDING_SKETCH_WIDTH,
+                depth=Config.TRENDING_SKETCH_DEPTH,
+                max_industries=Config.TRENDING_MAX_INDUSTRIES,
+            )
+        return _trend_tracker
+
+
+def observe_headlines(industry, headlines):
+    get_trend_tracker().observe_headlines(industry, headlines)
+
+
+def observe_page(industry, text):
+    get_trend_tracker().observe_page(industry, text)
+
+news_aggregator = NewsAggregator(
+    load_sources(Config.NEWS_SOURCES_FILE),
+    budget=Config.NEWS_LATENCY_BUDGET_SECONDS,
+    refresh_interval=Config.NEWS_REFRESH_SECONDS,
+    max_items=Config.NEWS_MAX_HEADLINES,
+    max_feeds=Config.NEWS_MAX_FEEDS,
+    on_headlines=observe_headlines,
+)
+
+admission = AdmissionControl({
+    'scrape': {'limit': Config.ADMISSION_SCRAPE_LIMIT, 'max_queue': Config.ADMISSION_SCRAPE_QUEUE,
+               'max_wait': Config.ADMISSION_MAX_WAIT_SECONDS},
+    'publish': {'limit': Config.ADMISSION_PUBLISH_LIMIT, 'max_queue': Config.ADMISSION_PUBLISH_QUEUE,
+                'max_wait': Config.ADMISSION_MAX_WAIT_SECONDS},
+    'generate': {'limit': Config.ADMISSION_GENERATE_LIMIT, 'max_queue': Config.ADMISSION_GENERATE_QUEUE,
+                 'max_wait': Config.ADMISSION_MAX_WAIT_SECONDS},
+})
+
+event_broker = EventBroker(
+    max_queue=Config.EVENT_STREAM_MAX_QUEUE,
+    heartbeat=Config.EVENT_STREAM_HEARTBEAT_SECONDS,
+)
 
 scheduled_posts = {
     "monday": None,
@@ -63,10 +149,57 @@ business_profiles = {
     }
 }
 
+def generate_pool_posts(profile, tone, post_type, count):
+    """Generator used by the content pools: fetch news, then build `count` posts."""
+    industry = profile['industry']
+    industry_news = get_industry_news(industry, news_aggregator)
+    if not industry_news:
+        logger.warning(f"No industry news found for {industry}, using default content")
+        industry_news = [
+            f"Latest {industry} trends and developments",
+            f"New innovations in {industry} sector",
+            f"Industry insights for {industry} professionals"
+        ]
+    return generate_content(profile, industry_news, tone, post_type, count)
+
+content_pool = ContentPool(
+    generate_pool_posts,
+    capacity=Config.CONTENT_POOL_CAPACITY,
+    low_water=Config.CONTENT_POOL_LOW_WATER,
+    idle_ttl=Config.CONTENT_POOL_IDLE_SECONDS,
+    max_pools=Config.CONTENT_POOL_MAX_POOLS,
+)
+
+_pools_warmed = False
+
+def warm_preset_pools():
+    """Queue refills for the preset business profiles in every post type."""
+    global _pools_warmed
+    if _pools_warmed:
+        return
+    _pools_warmed = True
+    for profile in business_profiles.values():
+        for post_type in ('promo', 'tip', 'update'):
+            content_pool.warm(profile, profile['tone'], post_type)
+
+
+static_assets = StaticAssets()
+
 @app.route('/')
 def index():
     """Serve the main application page"""
-    return render_template('index.html')
+    try:
+        return static_assets.shell_response()
+    except OSError as e:
+        # e.g. a read-only checkout without a prebuilt static/dist
+        logger.warning(f"Serving the unbuilt dashboard template: {e}")
+        return render_template('index.html')
+
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    """Serve a fingerprinted dashboard asset"""
+    return static_assets.asset_response(filename)
 
 
 POSTS_FILE = "generated_posts.json"
@@ -77,12 +210,124 @@ def load_generated_posts():
             return json.load(file)
     return {}
 
-def save_generated_posts(posts):
-    with open(POSTS_FILE, "w") as file:
-        json.dump(posts, file)
-
-generated_posts = load_generated_posts()
+_posts_file_lock = threading.Lock()
 
+def save_generated_posts(posts):
+    with _posts_file_lock:
+        # Copy first: other requests may add posts while this one is writing
+        snapshot = dict(posts)
+        with open(POSTS_FILE, "w") as file:
+            json.dump(snapshot, file, default=to_json)
+    if _search_index is not None:
+        _search_index.save(SEARCH_INDEX_FILE)
+
+
+SEARCH_INDEX_FILE = "search_index.json"
+
+_search_index = None
+_search_lock = threading.Lock()
+
+def get_search_index():
+    """Full-text index over posts, loaded from disk or rebuilt on first use."""
+    global _search_index
+    ensure_generated_posts_loaded()
+    with _search_lock:
+        if _search_index is None:
+            from utils.search_index import SearchIndex
+            index = None
+            if os.path.exists(SEARCH_INDEX_FILE):
+                try:
+                    index = SearchIndex.load(SEARCH_INDEX_FILE)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable search index: {e}")
+            # A snapshot that doesn't cover the same posts is stale; rebuild it
+            if index is None or len(index) != len(generated_posts):
+                index = SearchIndex()
+                for post_id, post_data in list(generated_posts.items()):
+                    index.add(post_id, post_data)
+            _search_index = index
+        return _search_index
+
+
+# The posts file is parsed on the first request rather than at import, so
+# workers and CLI tools that import this module don't pay for it up front.
+_posts_loaded = False
+_posts_lock = threading.Lock()
+
+def ensure_generated_posts_loaded():
+    global _posts_loaded
+    if _posts_loaded:
+        return
+    with _posts_lock:
+        if not _posts_loaded:
+            generated_posts.update(load_generated_posts())
+            collection_versions.bump('generated_posts')
+            _posts_loaded = True
+
+@app.before_request
+def load_state():
+    ensure_generated_posts_loaded()
+
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': f"Request body exceeds {Config.MAX_CONTENT_LENGTH // (1024 * 1024)} MiB"}), 413
+
+
+@app.after_request
+def compress(response):
+    return compress_response(response, Config.COMPRESSION_MIN_BYTES)
+
+# Installed after compression so its hook sees the uncompressed response
+request_profiler = RequestProfiler(
+    sample_rate=Config.PROFILER_SAMPLE_RATE,
+    admin_token=Config.PROFILER_ADMIN_TOKEN,
+    interval=Config.PROFILER_INTERVAL_MS / 1000,
+    max_profiles=Config.PROFILER_MAX_PROFILES,
+    max_seconds=Config.PROFILER_MAX_SECONDS,
+    allow_local=Config.PROFILER_ALLOW_LOCAL,
+)
+request_profiler.install(app)
+
+
+
+_dedup_index = None
+_dedup_lock = threading.Lock()
+
+def get_dedup_index():
+    """Near-duplicate index over generated posts, built on first use."""
+    global _dedup_index
+    ensure_generated_posts_loaded()
+    with _dedup_lock:
+        if _dedup_index is None:
+            from utils.dedup import NearDuplicateIndex
+            index = NearDuplicateIndex(threshold=Config.DEDUP_THRESHOLD, history=Config.DEDUP_HISTORY)
+            for post_id, post_data in list(generated_posts.items()):
+                if post_data.get('content'):
+                    index.add(post_id, post_data['content'], post_data.get('page_id'))
+            _dedup_index = index
+        return _dedup_index
+
+
+def generate_unique_content(generate, page_id, attempts=3):
+    """Call `generate` until it yields content that isn't a near-duplicate on the page.
+
+    Returns the last content and the duplicates it matched (empty if unique).
+    """
+    index = get_dedup_index()
+    for _ in range(attempts):
+        content = generate()
+        duplicates = index.find(content, page_id)
+        if not duplicates:
+            break
+    return content, duplicates
+
+
+def duplicate_response(duplicates):
+    return jsonify({
+        'error': 'Content is a near-duplicate of a recent post on this page',
+        'duplicates': [{'post_id': post_id, 'similarity': similarity} for post_id, similarity in duplicates]
+    }), 409
 
 
 @app.route('/api/create-post', methods=['POST'])
@@ -94,16 +339,30 @@ def create_post():
         
         post_id = f"post_{str(datetime.now().strftime('%Y%m%d_%H%M%S'))}"
         
+        duplicates = get_dedup_index().find(post_content or '', page_id, exclude=post_id)
+        if duplicates and Config.DEDUP_MODE == 'reject':
+            return duplicate_response(duplicates)
+        
         generated_posts[post_id] = {
             'page_id': page_id,
             'content': post_content,
             'status': 'generated',
             'created_at': datetime.now().isoformat(),
         }
+        if duplicates:
+            generated_posts[post_id]['near_duplicate_of'] = [d[0] for d in duplicates]
         
+        get_dedup_index().add(post_id, post_content or '', page_id)
+        get_search_index().add(post_id, generated_posts[post_id])
+        collection_versions.bump('generated_posts')
         save_generated_posts(generated_posts)
+        event_broker.publish('post_generated', {'post_id': post_id, 'page_id': page_id})
         
-        return jsonify({'success': True, 'post_id': post_id, 'message': 'Post created successfully'})
+        response = {'success': True, 'post_id': post_id, 'message': 'Post created successfully'}
+        if duplicates:
+            response['warning'] = 'Content is a near-duplicate of a recent post on this page'
+            response['duplicates'] = [d[0] for d in duplicates]
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Error creating post: {str(e)}")
@@ -120,40 +379,52 @@ def connect_page():
         if not page_id or not access_token:
             return jsonify({'error': 'Page ID and access token are required'}), 400
         
-        verify_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}"
-        params = {
-            'access_token': access_token,
-            'fields': 'id,name,access_token'
-        }
-        
-        response = requests.get(verify_url, params=params)
-        
-        if response.status_code != 200:
-            return jsonify({'error': 'Invalid page access token'}), 400
-        
-        page_info = response.json()
+        # Reconnecting with a token we've already verified skips the Graph call
+        cached = token_registry.get_cached(page_id, access_token)
+        if cached and cached['name']:
+            page_name = cached['name']
+        else:
+            verify_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}"
+            params = {
+                'access_token': access_token,
+                'fields': 'id,name,access_token'
+            }
+            
+            response = graph_client.get('page', verify_url, params=params)
+            
+            if response.status_code != 200:
+                return jsonify({'error': 'Invalid page access token'}), 400
+            
+            page_name = response.json().get('name')
         
         connected_pages[page_id] = {
-            'name': page_info.get('name', 'Unknown Page'),
+            'name': page_name or 'Unknown Page',
             'access_token': access_token,
             'connected_at': datetime.now().isoformat()
         }
         
-        logger.info(f"Connected page: {page_info.get('name')} (ID: {page_id})")
+        collection_versions.bump('connected_pages')
+        token_registry.register(page_id, access_token, page_name)
+        token_registry.start()
+        
+        logger.info(f"Connected page: {page_name} (ID: {page_id})")
         
         return jsonify({
             'success': True,
             'page_id': page_id,
-            'page_name': page_info.get('name'),
+            'page_name': page_name,
             'message': 'Page connected successfully'
         })
         
+    except CircuitOpenError as e:
+        return graph_unavailable(e)
     except Exception as e:
         logger.error(f"Error connecting page: {str(e)}")
         return jsonify({'error': 'Failed to connect page'}), 500
 
 
 @app.route('/api/generate-post', methods=['POST'])
+@admission.limit('generate')
 def generate_post():
     """Generate AI post content using existing generate-content route"""
     try:
@@ -185,7 +456,11 @@ def generate_post():
             'post_preferences': post_preferences
         }
         
-        generated_content = generate_ai_content(industry, tone, content_type)
+        generated_content, duplicates = generate_unique_content(
+            lambda: generate_ai_content(industry, tone, content_type, get_trend_tracker().hashtags(industry)), page_id
+        )
+        if duplicates and Config.DEDUP_MODE == 'reject':
+            return duplicate_response(duplicates)
         
         post_id = f"post_{len(generated_posts) + 1}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
@@ -198,15 +473,25 @@ def generate_post():
             'generated_at': datetime.now().isoformat(),
             'status': 'draft'
         }
+        if duplicates:
+            generated_posts[post_id]['near_duplicate_of'] = [d[0] for d in duplicates]
         
+        get_dedup_index().add(post_id, generated_content, page_id)
+        get_search_index().add(post_id, generated_posts[post_id])
+        collection_versions.bump('generated_posts')
+        event_broker.publish('post_generated', {'post_id': post_id, 'page_id': page_id})
         logger.info(f"Generated post {post_id} for page {page_id}")
         
-        return jsonify({
+        response = {
             'success': True,
             'post_id': post_id,
             'content': generated_content,
             'message': 'Post content generated successfully'
-        })
+        }
+        if duplicates:
+            response['warning'] = 'Content is a near-duplicate of a recent post on this page'
+            response['duplicates'] = [d[0] for d in duplicates]
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error generating post: {str(e)}")
@@ -231,6 +516,9 @@ def update_post():
         
         generated_posts[post_id]['content'] = content
         generated_posts[post_id]['updated_at'] = datetime.now().isoformat()
+        get_dedup_index().add(post_id, content, generated_posts[post_id].get('page_id'))
+        get_search_index().add(post_id, generated_posts[post_id])
+        collection_versions.bump('generated_posts')
         
         logger.info(f"Updated post {post_id}")
         
@@ -247,10 +535,12 @@ def update_post():
 
 
 @app.route('/api/publish-post', methods=['POST'])
+@admission.limit('publish')
 def publish_post():
     try:
         post_id = request.form.get('post_id')
         image_file = request.files.get('image')
+        image_source = None
         
         
         scheduled_time_str = request.form.get('scheduled_time')      
@@ -289,19 +579,32 @@ def publish_post():
         if page_id not in connected_pages:
             logger.error(f"Page ID {page_id} is not connected.")
             return jsonify({'error': 'Page not connected'}), 400
+        
+        if not token_registry.is_valid(page_id):
+            logger.error(f"Access token for page {page_id} is expired or invalid.")
+            return jsonify({'error': 'Page access token has expired. Please reconnect the page.'}), 401
+
+        # Stored once by content hash; every attempt below reads the stored copy
+        image_source = store_upload(image_file) if image_file else None
 
+        # While Facebook is failing, hold the post back instead of waiting on it
+        if graph_client.is_open('feed') or (image_source and graph_client.is_open('photos')):
+            return queue_publish_response(post_id, page_id, post_data['content'], image_source, unix_timestamp)
+
+        event_broker.publish('publish_started', {'post_id': post_id, 'page_id': page_id})
 
         publish_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/feed"
         params = {
             'access_token': connected_pages[page_id]['access_token'],
             'message': post_data['content']
         }
+        publish_key = graph_idempotency_key('feed', page_id, post_id, post_data['content'], unix_timestamp, image_source)
 
         logger.info(f"Initial params: {params}")
         
-        if image_file:
+        if image_source:
             try:
-                modified_image = add_unique_watermark(image_file)
+                modified_image = open_publish_image(image_source, post_id)
                 
                 upload_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/photos"
                 if unix_timestamp:
@@ -320,7 +623,13 @@ def publish_post():
                 
                 files = {'file': ('image.jpg', modified_image, 'image/jpeg')}
                 
-                upload_response = requests.post(upload_url, data=image_params, files=files)
+                try:
+                    upload_response = graph_client.post(
+                        'photos', upload_url, data=image_params, files=files,
+                        idempotency_key=graph_idempotency_key('photos', page_id, post_id, post_data['content'], unix_timestamp, image_source)
+                    )
+                finally:
+                    modified_image.close()
                 print(upload_response.status_code)
                 
                 logger.info(f"Image upload response: {upload_response.text}")
@@ -329,17 +638,16 @@ def publish_post():
                     logger.error(f"Error uploading image to Facebook: {upload_response.text}")
                     
                     logger.info("Attempting to post without attached_media as fallback")
-                    response = requests.post(publish_url, data=params)
-                    
                     if unix_timestamp:
                         params['published'] = 'false'
                         params['scheduled_publish_time'] = unix_timestamp
 
-                    response = requests.post(publish_url, data=params)
+                    response = graph_client.post('feed', publish_url, data=params, idempotency_key=publish_key)
                     
                 else:
                     upload_data = upload_response.json()
                     media_fbid = upload_data.get('id')
+                    event_broker.publish('media_uploaded', {'post_id': post_id, 'page_id': page_id, 'media_fbid': media_fbid})
                     
                     if media_fbid:
                         params['attached_media'] = json.dumps([{"media_fbid": media_fbid}])
@@ -349,7 +657,7 @@ def publish_post():
                             params['scheduled_publish_time'] = unix_timestamp
                         
                         logger.info(f"Params after adding image: {params}")
-                        response = requests.post(publish_url, data=params)
+                        response = graph_client.post('feed', publish_url, data=params, idempotency_key=publish_key)
                         
                     else:
                         logger.error("No media_fbid returned after image upload.")
@@ -358,8 +666,10 @@ def publish_post():
                             params['published'] = 'false'
                             params['scheduled_publish_time'] = unix_timestamp
                                                     
-                        response = requests.post(publish_url, data=params)
+                        response = graph_client.post('feed', publish_url, data=params, idempotency_key=publish_key)
             
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"Error processing image: {e}")
                 logger.info("Posting without image due to processing error")
@@ -369,13 +679,13 @@ def publish_post():
                     params['published'] = 'false'
                     params['scheduled_publish_time'] = unix_timestamp
                                     
-                response = requests.post(publish_url, data=params)
+                response = graph_client.post('feed', publish_url, data=params, idempotency_key=publish_key)
         else:
             if unix_timestamp:
                 params['published'] = 'false'
                 params['scheduled_publish_time'] = unix_timestamp
                 
-            response = requests.post(publish_url, data=params)
+            response = graph_client.post('feed', publish_url, data=params, idempotency_key=publish_key)
         
         logger.info(f"Facebook API response: {response.text}")
         
@@ -396,7 +706,10 @@ def publish_post():
                     text_only_params['published'] = 'false'
                     text_only_params['scheduled_publish_time'] = unix_timestamp                
                 
-                retry_response = requests.post(publish_url, data=text_only_params)
+                retry_response = graph_client.post(
+                    'feed', publish_url, data=text_only_params,
+                    idempotency_key=graph_idempotency_key('feed', page_id, post_id, text_only_params['message'], unix_timestamp)
+                )
                 
                 if retry_response.status_code == 200:
                     try:
@@ -405,16 +718,21 @@ def publish_post():
                         
                         # Save published post data
                         published_posts[post_id] = {
+                            'page_id': page_id,
                             'fb_post_id': fb_response.get('id'),
                             'fb_post_url': post_url,
                             'published_at': datetime.now().isoformat(),
                             'original_content': post_data['content'],
                             'has_image': False,
-                            'note': 'Posted as text-only due to duplicate image'
+                            'note': 'Posted as text-only due to duplicate image',
+                            **scheduled_slot(unix_timestamp)
                         }
                         
                         generated_posts[post_id]['status'] = 'published'
+                        get_search_index().set_status(post_id, 'published')
+                        collection_versions.bump('generated_posts', 'published_posts')
                         save_generated_posts(generated_posts)
+                        event_broker.publish('published', {'post_id': post_id, 'page_id': page_id, 'fb_post_id': fb_response.get('id')})
                         
                         return jsonify({
                             'success': True,
@@ -427,6 +745,7 @@ def publish_post():
                         print("waiting...")
             
             logger.error(f"Facebook API error: {response.status_code} - {error_message}. Details: {error_details}")
+            event_broker.publish('publish_failed', {'post_id': post_id, 'page_id': page_id, 'error': error_message})
             return jsonify({'error': f'Failed to publish to Facebook: {error_message}. {error_details}'}), 500
         
         fb_response = response.json()
@@ -434,18 +753,23 @@ def publish_post():
         
         # Save published post data
         published_posts[post_id] = {
+            'page_id': page_id,
             'fb_post_id': fb_response.get('id'),
             'fb_post_url': post_url,
             'published_at': datetime.now().isoformat(),
             'original_content': post_data['content'],
-            'has_image': bool(image_file)
+            'has_image': bool(image_source),
+            **scheduled_slot(unix_timestamp)
         }
         
         generated_posts[post_id]['status'] = 'published'
+        get_search_index().set_status(post_id, 'published')
+        collection_versions.bump('generated_posts', 'published_posts')
         
         # Save updated posts to file
         save_generated_posts(generated_posts)
         
+        event_broker.publish('published', {'post_id': post_id, 'page_id': page_id, 'fb_post_id': fb_response.get('id')})
         logger.info(f"Published post {post_id} to Facebook: {post_url}")
         
         if unix_timestamp and unix_timestamp > int(datetime.now().timestamp()):
@@ -460,61 +784,325 @@ def publish_post():
             'message': message
         })
 
-    
+    except CircuitOpenError:
+        return queue_publish_response(post_id, page_id, post_data['content'], image_source, unix_timestamp)
+    except MediaTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except MediaEmpty as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Unexpected error occurred: {str(e)}")
         logger.error(f"Stack trace: {traceback.format_exc()}")
+        event_broker.publish('publish_failed', {'post_id': request.form.get('post_id'), 'error': str(e)})
         return jsonify({'error': 'Failed to publish post'}), 500
 
 
-def add_unique_watermark(image_file):
-    """Add a subtle timestamp watermark to make image unique"""
-    try:
-        # Reset file pointer to beginning
-        image_file.seek(0)
-        
-        # Open image with PIL
-        image = Image.open(image_file)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Create a copy to modify
-        modified_image = image.copy()
-        
-        # Add a tiny transparent timestamp in bottom-right corner
-        from PIL import ImageDraw, ImageFont
-        
-        draw = ImageDraw.Draw(modified_image)
-        timestamp = str(int(time.time()))[-6:]  # Last 6 digits of timestamp
-        
-        # Try to use a small font, fallback to default if not available
+def graph_idempotency_key(endpoint, page_id, post_id, content, unix_timestamp=None, image_source=None):
+    """Key under which a publish call is sent at most once.
+
+    `image_source` is the media store hash of the attached image, so
+    republishing the same text with another image isn't answered from the
+    earlier call.
+    """
+    digest = hashlib.sha1(f"{content}|{unix_timestamp}|{image_source}".encode()).hexdigest()[:16]
+    return f"{endpoint}:{page_id}:{post_id}:{digest}"
+
+
+def scheduled_slot(unix_timestamp):
+    """The scheduled_publish_time of a published_posts entry, when the post was scheduled."""
+    return {'scheduled_publish_time': unix_timestamp} if unix_timestamp else {}
+
+
+def graph_unavailable(error):
+    response = jsonify({'error': str(error), 'retry_after': round(error.retry_after)})
+    response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response, 503
+
+
+def queue_publish(post_id, page_id, content, image_source=None, unix_timestamp=None):
+    """Hold a publish until the Graph breakers let calls through again."""
+    if image_source:
+        # The queue only holds the hash, so the upload must outlive eviction until the job has run
+        get_media_store().pin('sources', image_source)
+
+    def done(result):
         try:
-            font = ImageFont.truetype("arial.ttf", 10)
-        except:
-            font = ImageFont.load_default()
-        
-        # Get image dimensions
-        width, height = modified_image.size
-        
-        # Add nearly invisible watermark (very light gray)
-        draw.text((width-50, height-15), timestamp, fill=(250, 250, 250, 1), font=font)
-        
-        # Convert back to bytes
-        img_byte_arr = io.BytesIO()
-        modified_image.save(img_byte_arr, format='JPEG', quality=95)
-        img_byte_arr.seek(0)
-        
-        return img_byte_arr
-        
+            record_deferred_publish(post_id, content, result)
+        finally:
+            if image_source:
+                get_media_store().unpin('sources', image_source)
+
+    queued = graph_client.defer(
+        'feed',
+        lambda: publish_to_page(page_id, content, image_source, unix_timestamp, post_id, defer=False),
+        done
+    )
+    if not queued and image_source:
+        get_media_store().unpin('sources', image_source)
+    if queued:
+        if post_id in generated_posts and generated_posts[post_id].get('status') != 'published':
+            generated_posts[post_id]['status'] = 'queued'
+            collection_versions.bump('generated_posts')
+        event_broker.publish('publish_queued', {'post_id': post_id, 'page_id': page_id})
+        logger.warning(f"Graph API unavailable, queued publish of {post_id} to page {page_id}")
+    return queued
+
+
+def queue_publish_response(post_id, page_id, content, image_source=None, unix_timestamp=None):
+    if not queue_publish(post_id, page_id, content, image_source, unix_timestamp):
+        return jsonify({'error': 'Facebook is unavailable and the publish queue is full'}), 503
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'post_id': post_id,
+        'message': 'Facebook is unavailable right now; the post will be published when it recovers.'
+    }), 202
+
+
+def record_deferred_publish(post_id, content, result):
+    """Store the outcome of a queued publish like a direct one."""
+    if not result['success']:
+        logger.error(f"Queued publish of {post_id} to page {result['page_id']} failed: {result.get('error')}")
+        if post_id in generated_posts and generated_posts[post_id].get('status') == 'queued':
+            generated_posts[post_id]['status'] = 'failed'
+            collection_versions.bump('generated_posts')
+        return
+
+    page = {'fb_post_id': result['fb_post_id'], 'fb_post_url': result['fb_post_url'],
+            **scheduled_slot(result.get('scheduled_publish_time'))}
+    entry = published_posts.get(post_id)
+    if entry is None:
+        published_posts[post_id] = {
+            'page_id': result['page_id'],
+            **page,
+            'published_at': datetime.now().isoformat(),
+            'original_content': content,
+            'has_image': result['has_image']
+        }
+    else:
+        entry.setdefault('pages', {})[result['page_id']] = page
+
+    if post_id in generated_posts:
+        generated_posts[post_id]['status'] = 'published'
+        get_search_index().set_status(post_id, 'published')
+    collection_versions.bump('generated_posts', 'published_posts')
+    save_generated_posts(generated_posts)
+    logger.info(f"Published queued post {post_id} to page {result['page_id']}")
+
+
+_media_store = None
+_media_store_lock = threading.Lock()
+
+def get_media_store():
+    """Content-addressed store for uploaded images and their variants, opened on first use."""
+    global _media_store
+    with _media_store_lock:
+        if _media_store is None:
+            _media_store = MediaStore(
+                Config.MEDIA_STORE_DIR,
+                max_bytes=Config.MEDIA_STORE_MAX_BYTES,
+                max_upload_bytes=Config.MEDIA_MAX_UPLOAD_BYTES,
+            )
+        return _media_store
+
+
+def store_upload(image_file):
+    """Stream an uploaded image into the media store and return its content hash."""
+    return get_media_store().put(image_file.stream)
+
+
+def publish_image_params(post_id):
+    # The stamp only has to differ between posts, so retries, other pages and
+    # republishing the same post all reuse one rendered variant
+    stamp = str(int(hashlib.sha1(str(post_id).encode()).hexdigest(), 16))[-6:]
+    return {'watermark': stamp, 'max_side': Config.MEDIA_MAX_SIDE, 'format': 'JPEG', 'quality': 95}
+
+
+def open_publish_image(image_source, post_id):
+    """Memory-mapped watermarked variant of a stored upload, or the original if it can't be processed."""
+    store = get_media_store()
+    try:
+        return store.open_variant(image_source, publish_image_params(post_id))
+    except MediaMissing:
+        raise
     except Exception as e:
         logger.error(f"Error adding watermark: {e}")
-        image_file.seek(0)
-        return image_file
+        return store.open('sources', image_source)
+
+
+def publish_to_page(page_id, content, image_source=None, unix_timestamp=None, post_id=None, defer=True):
+    """Publish content (and a stored image, see `store_upload`) to a single page.
+
+    Returns a per-page result dict; never raises. If a Graph breaker is open
+    the publish is queued (`queued` in the result) unless `defer` is False,
+    in which case the CircuitOpenError propagates.
+    """
+    try:
+        if page_id not in connected_pages:
+            return {'page_id': page_id, 'success': False, 'error': 'Page not connected'}
+        if not token_registry.is_valid(page_id):
+            return {'page_id': page_id, 'success': False, 'error': 'Page access token has expired'}
+
+        event_broker.publish('publish_started', {'post_id': post_id, 'page_id': page_id})
+
+        access_token = connected_pages[page_id]['access_token']
+        publish_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/feed"
+        params = {
+            'access_token': access_token,
+            'message': content
+        }
+        if unix_timestamp:
+            params['published'] = 'false'
+            params['scheduled_publish_time'] = unix_timestamp
+
+        if image_source:
+            upload_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/photos"
+            image_params = {
+                'access_token': access_token,
+                'caption': content,
+                'published': 'false'
+            }
+            with open_publish_image(image_source, post_id) as image_data:
+                files = {'file': ('image.jpg', image_data, 'image/jpeg')}
+                upload_response = graph_client.post(
+                    'photos', upload_url, data=image_params, files=files,
+                    idempotency_key=graph_idempotency_key('photos', page_id, post_id, content, unix_timestamp, image_source)
+                )
+
+            if upload_response.status_code == 200 and upload_response.json().get('id'):
+                media_fbid = upload_response.json()['id']
+                params['attached_media'] = json.dumps([{"media_fbid": media_fbid}])
+                event_broker.publish('media_uploaded', {'post_id': post_id, 'page_id': page_id, 'media_fbid': media_fbid})
+            else:
+                logger.error(f"Error uploading image to page {page_id}: {upload_response.text}")
+
+        response = graph_client.post(
+            'feed', publish_url, data=params,
+            idempotency_key=graph_idempotency_key('feed', page_id, post_id, content, unix_timestamp, image_source)
+        )
+        if response.status_code != 200:
+            error = response.json().get('error', {}).get('message', 'Unknown error')
+            event_broker.publish('publish_failed', {'post_id': post_id, 'page_id': page_id, 'error': error})
+            return {'page_id': page_id, 'success': False, 'error': error}
+
+        fb_post_id = response.json().get('id')
+        event_broker.publish('published', {'post_id': post_id, 'page_id': page_id, 'fb_post_id': fb_post_id})
+        return {
+            'page_id': page_id,
+            'success': True,
+            'fb_post_id': fb_post_id,
+            'fb_post_url': f"https://www.facebook.com/{fb_post_id}",
+            'has_image': 'attached_media' in params,
+            'scheduled_publish_time': unix_timestamp
+        }
+
+    except CircuitOpenError as e:
+        if not defer:
+            raise
+        if not queue_publish(post_id, page_id, content, image_source, unix_timestamp):
+            return {'page_id': page_id, 'success': False, 'error': str(e)}
+        return {'page_id': page_id, 'success': False, 'queued': True, 'error': str(e), 'retry_after': round(e.retry_after)}
+    except Exception as e:
+        logger.error(f"Error publishing to page {page_id}: {e}")
+        event_broker.publish('publish_failed', {'post_id': post_id, 'page_id': page_id, 'error': str(e)})
+        return {'page_id': page_id, 'success': False, 'error': str(e)}
+
+
+@app.route('/api/publish-post-multi', methods=['POST'])
+@admission.limit('publish')
+def publish_post_multi():
+    """Publish one post to several connected pages concurrently"""
+    try:
+        post_id = request.form.get('post_id')
+        image_file = request.files.get('image')
+        page_ids = request.form.getlist('page_ids')
+        if len(page_ids) == 1:
+            page_ids = [p.strip() for p in page_ids[0].split(',')]
+        page_ids = list(dict.fromkeys(p for p in page_ids if p))
+
+        if not post_id:
+            return jsonify({'error': 'Post ID is required'}), 400
+
+        if post_id not in generated_posts:
+            return jsonify({'error': f'Post {post_id} not found'}), 404
+
+        if not page_ids:
+            return jsonify({'error': 'At least one page ID is required'}), 400
+
+        unix_timestamp = None
+        scheduled_time_str = request.form.get('scheduled_time')
+        if scheduled_time_str:
+            unix_timestamp = int(datetime.strptime(scheduled_time_str, '%Y-%m-%dT%H:%M').timestamp())
+
+        content = generated_posts[post_id]['content']
+
+        # Stored once; the watermarked variant is rendered by the first page and reused by the rest
+        image_source = store_upload(image_file) if image_file else None
+
+        workers = min(Config.FANOUT_MAX_WORKERS, len(page_ids))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                lambda page_id: publish_to_page(page_id, content, image_source, unix_timestamp, post_id),
+                page_ids
+            ))
+
+        succeeded = [r for r in results if r['success']]
+        queued = [r for r in results if r.get('queued')]
+        if succeeded:
+            pages = {r['page_id']: {'fb_post_id': r['fb_post_id'], 'fb_post_url': r['fb_post_url'],
+                                    **scheduled_slot(unix_timestamp)}
+                     for r in succeeded}
+            entry = published_posts.get(post_id)
+            if entry is None:
+                published_posts[post_id] = {
+                    'page_id': succeeded[0]['page_id'],
+                    'fb_post_id': succeeded[0]['fb_post_id'],
+                    'fb_post_url': succeeded[0]['fb_post_url'],
+                    'published_at': datetime.now().isoformat(),
+                    'original_content': content,
+                    'has_image': succeeded[0]['has_image'],
+                    'pages': pages,
+                    **scheduled_slot(unix_timestamp)
+                }
+            else:
+                # Published before (or by a queued publish); keep the pages it already went to
+                entry.setdefault('pages', {}).update(pages)
+            generated_posts[post_id]['status'] = 'published'
+            get_search_index().set_status(post_id, 'published')
+            collection_versions.bump('generated_posts', 'published_posts')
+            save_generated_posts(generated_posts)
+
+        logger.info(f"Fan-out publish of {post_id}: {len(succeeded)}/{len(results)} pages succeeded")
+
+        if len(succeeded) == len(results):
+            status = 200
+        elif len(queued) == len(results):
+            status = 202
+        elif succeeded or queued:
+            status = 207
+        else:
+            status = 500
+
+        return jsonify({
+            'success': bool(succeeded or queued),
+            'post_id': post_id,
+            'published': len(succeeded),
+            'queued': len(queued),
+            'failed': len(results) - len(succeeded) - len(queued),
+            'results': results
+        }), status
+
+    except MediaTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except MediaEmpty as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in fan-out publish: {str(e)}")
+        return jsonify({'error': 'Failed to publish post'}), 500
 
 
 @app.route('/api/publish-post-alternative', methods=['POST'])
+@admission.limit('publish')
 def publish_post_alternative():
     """Alternative method: Post image directly with caption instead of using attached_media"""
     try:
@@ -532,22 +1120,29 @@ def publish_post_alternative():
 
         if not page_id or page_id not in connected_pages:
             return jsonify({'error': 'Invalid or unconnected page ID'}), 400
+        
+        if not token_registry.is_valid(page_id):
+            return jsonify({'error': 'Page access token has expired. Please reconnect the page.'}), 401
 
         if image_file:
             # Post directly to photos endpoint (this creates the post automatically)
             upload_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/photos"
             
-            # Add timestamp to make image unique
-            modified_image = add_unique_watermark(image_file)
+            # Add a stamp to make the image unique
+            image_source = store_upload(image_file)
             
             params = {
                 'access_token': connected_pages[page_id]['access_token'],
                 'caption': post_data['content']
             }
             
-            files = {'file': ('image.jpg', modified_image, 'image/jpeg')}
-            
-            response = requests.post(upload_url, data=params, files=files)
+            with open_publish_image(image_source, post_id) as modified_image:
+                files = {'file': ('image.jpg', modified_image, 'image/jpeg')}
+                
+                response = graph_client.post(
+                    'photos', upload_url, data=params, files=files,
+                    idempotency_key=graph_idempotency_key('photos', page_id, post_id, post_data['content'], image_source=image_source)
+                )
         else:
             # Regular text post
             publish_url = f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/feed"
@@ -555,7 +1150,10 @@ def publish_post_alternative():
                 'access_token': connected_pages[page_id]['access_token'],
                 'message': post_data['content']
             }
-            response = requests.post(publish_url, data=params)
+            response = graph_client.post(
+                'feed', publish_url, data=params,
+                idempotency_key=graph_idempotency_key('feed', page_id, post_id, post_data['content'])
+            )
 
         if response.status_code == 200:
             fb_response = response.json()
@@ -570,6 +1168,12 @@ def publish_post_alternative():
         else:
             return jsonify({'error': 'Failed to publish post'}), 500
             
+    except CircuitOpenError as e:
+        return graph_unavailable(e)
+    except MediaTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except MediaEmpty as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in alternative publish: {e}")
         return jsonify({'error': 'Failed to publish post'}), []
@@ -577,6 +1181,7 @@ def publish_post_alternative():
 
 
 @app.route('/api/generate-content', methods=['POST'])
+@admission.limit('generate')
 def generate_content_route():
     """Generate content using the enhanced content generation system"""
     try:
@@ -591,24 +1196,14 @@ def generate_content_route():
             return jsonify({"error": "Post Preferences not found"}), 400
            
         b_name = data['business_profile']['name']
-        industry = data['business_profile']['industry']
         services = data['business_profile']['services']
         tone = data['post_preferences']['tone']
         post_type = data['post_preferences']['post_type']
         frequency = data['post_preferences'].get('frequency') or 3
         
-        industry_news = get_industry_news(business_profile["industry"])
-
-        # Don't fail if no industry news - use default content instead
-        if not industry_news:
-            logger.warning(f"No industry news found for {industry}, using default content")
-            industry_news = [
-                f"Latest {industry} trends and developments",
-                f"New innovations in {industry} sector",
-                f"Industry insights for {industry} professionals"
-            ]
-
-        content = generate_content(business_profile, industry_news, tone, post_type, frequency)
+        warm_preset_pools()
+        # Served from the profile's pool; only a shortfall is generated inline
+        content = content_pool.take(business_profile, tone, post_type, frequency)
         return jsonify({"posts": content}), 200
         
     except Exception as e:
@@ -618,6 +1213,7 @@ def generate_content_route():
 
 
 @app.route('/api/generate-content-integrated', methods=['POST'])
+@admission.limit('generate')
 def generate_content_integrated():
     """Generate content using the existing generate-content route"""
     try:
@@ -649,7 +1245,11 @@ def generate_content_integrated():
         frequency = post_preferences.get('frequency') or 3
         
         # Simulate the content generation (replace with actual call to your route)
-        generated_content = generate_ai_content(industry, tone, post_type)
+        generated_content, duplicates = generate_unique_content(
+            lambda: generate_ai_content(industry, tone, post_type, get_trend_tracker().hashtags(industry)), page_id
+        )
+        if duplicates and Config.DEDUP_MODE == 'reject':
+            return duplicate_response(duplicates)
         
         post_id = f"post_{len(generated_posts) + 1}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
@@ -665,21 +1265,32 @@ def generate_content_integrated():
             'generated_at': datetime.now().isoformat(),
             'status': 'draft'
         }
+        if duplicates:
+            generated_posts[post_id]['near_duplicate_of'] = [d[0] for d in duplicates]
         
+        get_dedup_index().add(post_id, generated_content, page_id)
+        get_search_index().add(post_id, generated_posts[post_id])
+        collection_versions.bump('generated_posts')
+        event_broker.publish('post_generated', {'post_id': post_id, 'page_id': page_id})
         logger.info(f"Generated integrated post {post_id} for page {page_id}")
         
-        return jsonify({
+        response = {
             'success': True,
             'post_id': post_id,
             'content': generated_content,
             'message': 'Content generated successfully using integrated route'
-        })
+        }
+        if duplicates:
+            response['warning'] = 'Content is a near-duplicate of a recent post on this page'
+            response['duplicates'] = [d[0] for d in duplicates]
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error generating integrated content: {str(e)}")
         return jsonify({'error': 'Failed to generate content'}), 500
 
 @app.route('/api/connected-pages', methods=['GET'])
+@conditional('connected_pages')
 def get_connected_pages():
     """Get list of connected pages"""
     return jsonify({
@@ -693,42 +1304,305 @@ def get_connected_pages():
         ]
     })
 
+@app.route('/api/search', methods=['GET'])
+def search_posts():
+    """Ranked full-text search over drafts and published posts"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing search query'}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+        
+        hits, total = get_search_index().search(
+            query, page, per_page,
+            status=request.args.get('status'),
+            page_id=request.args.get('page_id')
+        )
+        
+        results = []
+        for post_id, score in hits:
+            post_data = generated_posts.get(post_id, {})
+            results.append({
+                'post_id': post_id,
+                'score': score,
+                'page_id': post_data.get('page_id'),
+                'content': post_data.get('content'),
+                'industry': post_data.get('industry'),
+                'tone': post_data.get('tone'),
+                'status': post_data.get('status'),
+                'fb_post_url': published_posts.get(post_id, {}).get('fb_post_url')
+            })
+        
+        return jsonify({'query': query, 'total': total, 'page': page, 'per_page': per_page, 'results': results})
+        
+    except Exception as e:
+        logger.error(f"Error searching posts: {str(e)}")
+        return jsonify({'error': 'Failed to search posts'}), 500
+
+
+@app.route('/api/content-pools', methods=['GET'])
+def get_content_pool_stats():
+    """Get content pool sizes and hit rate"""
+    return jsonify(content_pool.stats())
+
+
+@app.route('/api/graph-status', methods=['GET'])
+def get_graph_status():
+    """Get Graph API circuit breaker states and queued publishes"""
+    return jsonify(graph_client.status())
+
+
+@app.route('/api/admission-status', methods=['GET'])
+def get_admission_status():
+    """Get concurrency limiter occupancy, queues and rejections per route class"""
+    return jsonify(admission.status())
+
+
+@app.route('/api/media-status', methods=['GET'])
+def get_media_status():
+    """Get media store size, variant cache hits and evictions"""
+    return jsonify(get_media_store().status())
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles with their timing breakdown"""
+    if not request_profiler.authorized():
+        return forbidden()
+    return jsonify({'enabled': request_profiler.enabled, 'profiles': request_profiler.profiles()})
+
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Get one request profile; ?format=collapsed returns flame graph input"""
+    if not request_profiler.authorized():
+        return forbidden()
+    record = request_profiler.get(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(request_profiler.collapsed(record), mimetype='text/plain')
+    return jsonify(record)
+
+
+@app.route('/api/token-status', methods=['GET'])
+def get_token_status():
+    """Get cached access token validity for connected pages"""
+    return jsonify({'tokens': token_registry.status()})
+
 @app.route('/api/generated-posts', methods=['GET'])
+@conditional('generated_posts', negotiated=True)
 def get_generated_posts():
     """Get list of generated posts"""
-    return jsonify({
-        'posts': [
-            {
-                'post_id': post_id,
-                'page_id': post_data['page_id'],
-                'content': post_data['content'],
-                'industry': post_data['industry'],
-                'tone': post_data['tone'],
-                'status': post_data['status'],
-                'generated_at': post_data['generated_at']
-            }
-            for post_id, post_data in generated_posts.items()
-        ]
-    })
+    return collection_response('posts', generated_posts, lambda post_id, post_data: {
+        'post_id': post_id,
+        'page_id': post_data['page_id'],
+        'content': post_data['content'],
+        'industry': post_data['industry'],
+        'tone': post_data['tone'],
+        'status': post_data['status'],
+        'generated_at': post_data['generated_at']
+    }, Config.STREAM_MIN_ITEMS)
 
 @app.route('/api/published-posts', methods=['GET'])
+@conditional('published_posts', negotiated=True)
 def get_published_posts():
     """Get list of published posts"""
+    return collection_response('posts', published_posts, lambda post_id, pub_data: {
+        'post_id': post_id,
+        'fb_post_id': pub_data['fb_post_id'],
+        'fb_post_url': pub_data['fb_post_url'],
+        'published_at': pub_data['published_at'],
+        'original_content': pub_data['original_content']
+    }, Config.STREAM_MIN_ITEMS)
+
+
+INSIGHTS_FILE = "insights.npz"
+
+_insights_ingester = None
+_insights_lock = threading.Lock()
+
+def get_insights_ingester():
+    """Load the insights store on first use; NumPy isn't imported at startup."""
+    global _insights_ingester
+    with _insights_lock:
+        if _insights_ingester is None:
+            from utils.insights import InsightsStore, InsightsIngester
+            _insights_ingester = InsightsIngester(
+                InsightsStore.load(INSIGHTS_FILE),
+                Config.FACEBOOK_GRAPH_URL,
+                update_window=Config.INSIGHTS_UPDATE_WINDOW_DAYS * 24 * 3600,
+                min_interval=Config.INSIGHTS_MIN_INTERVAL_SECONDS,
+            )
+        return _insights_ingester
+
+
+_posting_time_model = None
+
+def get_posting_time_model():
+    global _posting_time_model
+    ingester = get_insights_ingester()
+    with _insights_lock:
+        if _posting_time_model is None:
+            from utils.posting_times import PostingTimeModel
+            _posting_time_model = PostingTimeModel(ingester.store)
+        return _posting_time_model
+
+
+def insights_candidates():
+    """Published posts on connected pages, one entry per page they went to."""
+    candidates = []
+    for post_id, pub_data in list(published_posts.items()):
+        post_data = generated_posts.get(post_id, {})
+        pages = dict(pub_data.get('pages') or {})
+        if pub_data.get('page_id'):
+            pages = {pub_data['page_id']: {'fb_post_id': pub_data.get('fb_post_id')}, **pages}
+        # Scheduled posts go out at their slot, not when the API call was made
+        published_ts = (pub_data.get('scheduled_publish_time')
+                        or int(datetime.fromisoformat(pub_data['published_at']).timestamp()))
+        for page_id, page_post in pages.items():
+            if page_id not in connected_pages or not page_post.get('fb_post_id'):
+                continue
+            candidates.append({
+                'fb_post_id': page_post['fb_post_id'],
+                'page_id': page_id,
+                'access_token': connected_pages[page_id]['access_token'],
+                'industry': post_data.get('industry'),
+                'tone': post_data.get('tone'),
+                'published_ts': page_post.get('scheduled_publish_time') or published_ts,
+            })
+    return candidates
+
+
+PAGE_EVENTS_FILE = "page_events.jsonl"
+
+_webhook_ingester = None
+_webhook_lock = threading.Lock()
+
+def get_webhook_ingester():
+    """Replay the page event log and start the ingestion worker on first use."""
+    global _webhook_ingester
+    with _webhook_lock:
+        if _webhook_ingester is None:
+            from utils.webhooks import ActivityStore, PostIndex, WebhookIngester
+            _webhook_ingester = WebhookIngester(
+                ActivityStore(PAGE_EVENTS_FILE),
+                PostIndex(published_posts.items,
+                          lambda: (len(published_posts), collection_versions.get('published_posts'))),
+                max_queue=Config.WEBHOOK_MAX_QUEUE,
+                batch_size=Config.WEBHOOK_BATCH_SIZE,
+                flush_interval=Config.WEBHOOK_FLUSH_MS / 1000,
+                on_batch=lambda events: event_broker.publish('page_activity', {
+                    'posts': sorted({event['post_id'] for event in events if event['post_id']}),
+                    'events': len(events),
+                }),
+            )
+        return _webhook_ingester
+
+
+@app.route('/api/webhooks/facebook', methods=['GET'])
+def verify_webhook():
+    """Answer Facebook's subscription handshake"""
+    if (request.args.get('hub.mode') == 'subscribe' and Config.FB_WEBHOOK_VERIFY_TOKEN
+            and request.args.get('hub.verify_token') == Config.FB_WEBHOOK_VERIFY_TOKEN):
+        return Response(request.args.get('hub.challenge', ''), mimetype='text/plain')
+    return jsonify({'error': 'Verification failed'}), 403
+
+
+@app.route('/api/webhooks/facebook', methods=['POST'])
+def receive_webhook():
+    """Queue a signed page webhook delivery for batched ingestion"""
+    from utils.webhooks import SIGNATURE_HEADER, verify_signature
+    ingester = get_webhook_ingester()
+    body = request.get_data()
+    if not verify_signature(Config.FB_APP_SECRET, body, request.headers.get(SIGNATURE_HEADER)):
+        ingester.reject()
+        return jsonify({'error': 'Invalid signature'}), 403
+    if not ingester.submit(body):
+        # Facebook retries deliveries that aren't acknowledged
+        response = jsonify({'error': 'Webhook queue is full'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return Response('EVENT_RECEIVED', mimetype='text/plain')
+
+
+@app.route('/api/webhook-status', methods=['GET'])
+def get_webhook_status():
+    """Get webhook queue depth, batch timing and event counts"""
+    return jsonify(get_webhook_ingester().status())
+
+
+@app.route('/api/published-posts/<post_id>/activity', methods=['GET'])
+def get_post_activity(post_id):
+    """Get comments, reactions and status reported by webhooks for a published post, per page"""
+    pub_data = published_posts.get(post_id)
+    if pub_data is None:
+        return jsonify({'error': 'Post not published'}), 404
+    pages = dict(pub_data.get('pages') or {})
+    if pub_data.get('page_id'):
+        pages = {pub_data['page_id']: {'fb_post_id': pub_data.get('fb_post_id')}, **pages}
+    fb_post_ids = {page_id: page_post.get('fb_post_id') for page_id, page_post in pages.items()}
+    activity = get_webhook_ingester().store.activity([fb_post_id for fb_post_id in fb_post_ids.values() if fb_post_id])
     return jsonify({
-        'posts': [
-            {
-                'post_id': post_id,
-                'fb_post_id': pub_data['fb_post_id'],
-                'fb_post_url': pub_data['fb_post_url'],
-                'published_at': pub_data['published_at'],
-                'original_content': pub_data['original_content']
-            }
-            for post_id, pub_data in published_posts.items()
-        ]
+        'post_id': post_id,
+        'pages': {page_id: {'fb_post_id': fb_post_id, **activity.get(fb_post_id, {})}
+                  for page_id, fb_post_id in fb_post_ids.items()},
     })
 
 
+@app.route('/api/insights/ingest', methods=['POST'])
+def ingest_insights():
+    """Fetch insights for published posts that are still inside their update window"""
+    try:
+        result = get_insights_ingester().ingest(insights_candidates())
+        logger.info(f"Insights ingestion: {result}")
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        logger.error(f"Error ingesting insights: {str(e)}")
+        return jsonify({'error': 'Failed to ingest insights'}), 500
+
+
+@app.route('/api/insights/aggregate', methods=['GET'])
+def aggregate_insights():
+    """Aggregate post metrics by page, industry, tone or weekday"""
+    try:
+        by = request.args.get('by', 'page')
+        metric = request.args.get('metric', 'engagement')
+        store = get_insights_ingester().store
+        
+        try:
+            groups = store.aggregate(by, metric)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'by': by, 'metric': metric, 'posts': len(store), 'groups': groups})
+        
+    except Exception as e:
+        logger.error(f"Error aggregating insights: {str(e)}")
+        return jsonify({'error': 'Failed to aggregate insights'}), 500
+
+
+@app.route('/api/best-times', methods=['GET'])
+def best_posting_times():
+    """Top posting slots for a page based on past engagement"""
+    try:
+        page_id = request.args.get('page_id')
+        n = request.args.get('n', 5, type=int)
+        one_per_day = request.args.get('one_per_day', 'false').lower() == 'true'
+        
+        slots = get_posting_time_model().top_slots(page_id, n, one_per_day=one_per_day)
+        return jsonify({'page_id': page_id, 'slots': slots})
+        
+    except Exception as e:
+        logger.error(f"Error computing best posting times: {str(e)}")
+        return jsonify({'error': 'Failed to compute best posting times'}), 500
+
+
 @app.route('/api/business-understanding', methods=['POST'])
+@admission.limit('scrape')
 def business_understanding():
     try:
         data = request.get_json()
@@ -736,8 +1610,15 @@ def business_understanding():
         if not url:
             return jsonify({"error": "Missing URL"}), 400
 
-        logger.info(f"Analyzing business website: {url}")
-        result = url_scrape(url)
+        crawl = bool(data.get('crawl', False))
+        crawl_options = {
+            'max_pages': Config.CRAWL_MAX_PAGES,
+            'max_bytes': Config.CRAWL_MAX_BYTES,
+            'time_budget': Config.CRAWL_TIME_BUDGET_SECONDS,
+        }
+        
+        logger.info(f"Analyzing business website: {url} (crawl={crawl})")
+        result = url_scrape(url, crawl=crawl, crawl_options=crawl_options, on_page_text=observe_page)
         
         if result is None:
             logger.error("url_scrape returned None")
@@ -756,6 +1637,7 @@ def business_understanding():
 
 
 @app.route('/api/generate-content-standalone', methods=['POST'])
+@admission.limit('generate')
 def generate_content_standalone():
     """Generate content without requiring Facebook page connection"""
     try:
@@ -779,19 +1661,8 @@ def generate_content_standalone():
         
         logger.info(f"Processing enhanced content: {industry}, {tone}, {post_type}, {frequency}")
         
-        industry_news = get_industry_news(business_profile["industry"])
-        logger.info(f"Industry news received: {len(industry_news) if industry_news else 0} items")
-
-        # Don't fail if no industry news - use default content instead
-        if not industry_news:
-            logger.warning(f"No industry news found for {industry}, using default content")
-            industry_news = [
-                f"Latest {industry} trends and developments",
-                f"New innovations in {industry} sector",
-                f"Industry insights for {industry} professionals"
-            ]
-
-        content = generate_content(business_profile, industry_news, tone, post_type, frequency)
+        warm_preset_pools()
+        content = content_pool.take(business_profile, tone, post_type, frequency)
         logger.info(f"Generated {len(content)} posts")
         return jsonify({"posts": content}), 200
         
@@ -801,23 +1672,39 @@ def generate_content_standalone():
 
 
 @app.route('/api/news', methods=['POST'])
+@admission.limit('generate')
 def generate_news():
     try:
         data = request.get_json()
         industry = data.get('industry')
         if not industry:
             return jsonify({"error": "Missing industry parameter"}), 400
-            
-        url = f"https://news.google.com/rss/search?q={industry}"
-        feed = feedparser.parse(url)
-        headlines = [entry.title for entry in feed.entries[:5]]
-        return jsonify(headlines), 200
+        
+        # Ranked, deduplicated headlines from every configured source, within the latency budget
+        if data.get('detail'):
+            return jsonify(news_aggregator.stories(industry)), 200
+        return jsonify(news_aggregator.headlines(industry)), 200
         
     except Exception as e:
         logger.error(f"Error generating news: {str(e)}")
         return jsonify({'error': 'Failed to generate news'}), 500
 
 
+@app.route('/api/trending', methods=['GET'])
+def get_trending():
+    industry = request.args.get('industry')
+    if not industry:
+        return jsonify({"error": "Missing industry parameter"}), 400
+    limit = min(request.args.get('limit', 10, type=int), Config.TRENDING_TOP_K)
+    tracker = get_trend_tracker()
+    return jsonify({
+        'industry': industry,
+        'hashtags': tracker.hashtags(industry, limit),
+        'terms': [{'term': term, 'score': score} for term, score in tracker.trending(industry, limit)],
+        'tracker': tracker.status(),
+    }), 200
+
+
 
 
 
@@ -831,6 +1718,7 @@ def weekly_planner():
         posts = data.get("posts", [])
         frequency = data.get("post_frequency", len(posts))
         preferred_days = data.get("preferred_days", [])
+        page_id = data.get("page_id")
 
         if not posts or frequency == 0:
             return jsonify({"error": "Missing posts or post frequency"}), 400
@@ -838,15 +1726,30 @@ def weekly_planner():
             return jsonify({"error": "Not enough posts provided"}), 400
 
         all_days = list(scheduled_posts.keys())
-        selected_days = [day.lower() for day in preferred_days][:frequency] if preferred_days else random.sample(all_days, frequency)
+        posting_times = {}
+        if preferred_days:
+            selected_days = [day.lower() for day in preferred_days][:frequency]
+        else:
+            # Use the page's best-engagement days when there is insight data
+            slots = get_posting_time_model().top_slots(page_id, frequency, one_per_day=True) if page_id else []
+            selected_days = [slot['day'] for slot in slots]
+            posting_times = {slot['day']: f"{slot['hour']:02d}:00" for slot in slots}
+            # Days no post has gone out on yet are picked at random, without a time
+            other_days = [day for day in all_days if day not in posting_times]
+            selected_days += random.sample(other_days, frequency - len(selected_days))
 
         for day in scheduled_posts:
             scheduled_posts[day] = None
 
         for i, day in enumerate(selected_days):
             scheduled_posts[day] = posts[i]
+        collection_versions.bump('scheduled_posts')
+        event_broker.publish('schedule_changed', {'schedule': scheduled_posts})
 
-        return jsonify({"schedule": scheduled_posts})
+        response = {"schedule": scheduled_posts}
+        if posting_times:
+            response["posting_times"] = posting_times
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error in weekly planner: {str(e)}")
@@ -856,6 +1759,7 @@ def weekly_planner():
 
 
 @app.route('/api/weekly-planner', methods=['GET'])
+@conditional('scheduled_posts')
 def get_weekly_schedule():
     """Get the current weekly schedule"""
     return jsonify({"schedule": scheduled_posts})
@@ -877,6 +1781,8 @@ def update_weekly_post(day):
             return jsonify({"error": "No post content provided"}), 400
 
         scheduled_posts[day] = new_content
+        collection_versions.bump('scheduled_posts')
+        event_broker.publish('schedule_changed', {'day': day, 'post': new_content})
         return jsonify({"message": f"Post for {day.capitalize()} updated", "post": new_content})
         
     except Exception as e:
@@ -899,6 +1805,8 @@ def delete_weekly_post(day):
 
         deleted_post = scheduled_posts[day]
         scheduled_posts[day] = None
+        collection_versions.bump('scheduled_posts')
+        event_broker.publish('schedule_changed', {'day': day, 'post': None})
         return jsonify({"message": f"Post for {day.capitalize()} deleted", "deleted_post": deleted_post})
         
     except Exception as e:
@@ -908,6 +1816,17 @@ def delete_weekly_post(day):
 
 
 
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """Server-sent event stream of generation, publish and schedule changes"""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscriber = event_broker.subscribe(last_event_id)
+    response = Response(stream_with_context(event_broker.stream(subscriber)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/mock-facebook', methods=['POST'])
 def connect_facebook():
     """Mock Facebook connection for testing purposes"""
@@ -0,0 +1,328 @@
+"""Run business understanding, content generation, weekly planning and publishing over a file of businesses.
+
+Usage:
+    python batch.py businesses.csv -o results.jsonl [--publish] [--crawl]
+        [--post-type promo] [--frequency 3] [--processes 4] [--threads 16] [--chunk-size 200]
+
+Each input row (CSV with a header, or JSONL) is a business URL and/or a
+profile: id, url, name, industry, services (";"-separated in CSV), tone,
+post_type, frequency, page_id, access_token. Missing profile fields are
+filled in by analyzing the website.
+
+Rows are processed in chunks, stage by stage: fetch websites (threads),
+parse and classify them (processes), fetch industry news (threads),
+generate posts, plan the week, and optionally schedule the posts on the
+rows' Facebook pages (threads). One JSON line is written per row, in input
+order, and the file is flushed after every chunk. Re-running with the same
+output file skips rows already in it, so an interrupted run resumes where it
+stopped; with --retry-failed, failed rows run again and their new line
+supersedes the old one. Rows whose publishing was cut short are reported
+instead of being published a second time. Access tokens are never written
+to the output.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from utils.business_info_api import analyze_page, fetch_page
+from utils.content_api import generate_ai_content, generate_content, get_industry_news
+from utils.graph_client import CircuitOpenError, GraphClient
+from utils.news_aggregator import NewsAggregator, load_sources
+from utils.trending import TrendTracker
+from utils.weekly_planner import auto_distribute_days
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Post types generate_content builds from the profile; anything else uses the industry templates
+PROFILE_POST_TYPES = ("promo", "tip", "update")
+MAX_HTML_BYTES = 2_000_000
+
+
+def read_rows(path):
+    """(row id, row dict) for each input row; ids default to the row number."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for number, row in enumerate(rows, 1):
+            row = {key.strip().lower(): value for key, value in row.items() if key and value not in (None, '')}
+            yield str(row.get('id') or f"row-{number}"), row
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_services(value):
+    if isinstance(value, list):
+        return value
+    return [service.strip() for service in str(value).replace('|', ';').split(';') if service.strip()]
+
+
+def read_checkpoint(output_path, retry_failed):
+    """Ids already written to the output. A half-written last line is cut off."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end != len(data):
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get('status') == 'ok' or not retry_failed:
+            done.add(record['id'])
+    return done
+
+
+def read_journal(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def next_slot(day, hour, now):
+    """Unix time of the next `day` at `hour`:00 local time, at least an hour away."""
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    target += timedelta(days=(DAYS.index(day) - now.weekday()) % 7)
+    if target - now < timedelta(hours=1):
+        target += timedelta(days=7)
+    return int(target.timestamp())
+
+
+class Pipeline:
+    def __init__(self, args):
+        self.args = args
+        self.threads = ThreadPoolExecutor(max_workers=args.threads)
+        # Spawned, not forked: the parent already runs fetch and news threads
+        self.processes = ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context('spawn'))
+        self.trend_tracker = TrendTracker()
+        self.news = NewsAggregator(
+            load_sources(Config.NEWS_SOURCES_FILE),
+            budget=Config.NEWS_LATENCY_BUDGET_SECONDS,
+            refresh_interval=Config.NEWS_REFRESH_SECONDS,
+            max_items=Config.NEWS_MAX_HEADLINES,
+            max_feeds=Config.NEWS_MAX_FEEDS,
+            on_headlines=self.trend_tracker.observe_headlines,
+        )
+        self.graph = GraphClient(
+            connect_timeout=Config.GRAPH_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=Config.GRAPH_READ_TIMEOUT_SECONDS,
+            max_retries=Config.GRAPH_MAX_RETRIES,
+            failure_threshold=Config.GRAPH_BREAKER_FAILURES,
+            reset_timeout=Config.GRAPH_BREAKER_RESET_SECONDS,
+        )
+        self.crawl_options = {
+            'max_pages': Config.CRAWL_MAX_PAGES,
+            'max_bytes': Config.CRAWL_MAX_BYTES,
+            'time_budget': Config.CRAWL_TIME_BUDGET_SECONDS,
+        }
+
+    def close(self):
+        self.threads.shutdown()
+        self.processes.shutdown()
+
+    def run_chunk(self, chunk, journal):
+        records = [{'id': row_id, 'input': row, 'status': 'ok'} for row_id, row in chunk]
+        self.understand(records)
+        self.generate(records)
+        self.plan(records)
+        if self.args.publish:
+            self.publish(records, journal)
+        return records
+
+    @staticmethod
+    def fail(record, stage, error):
+        record['status'] = 'error'
+        record['stage'] = stage
+        record['error'] = str(error)
+
+    def understand(self, records):
+        """Fetch sites on the thread pool, then parse and classify them on the process pool."""
+        for record in records:
+            row = record['input']
+            record['profile'] = {
+                'name': row.get('name'),
+                'industry': row.get('industry'),
+                'services': parse_services(row.get('services', [])),
+                'tone': row.get('tone'),
+            }
+        pending = [r for r in records if r['input'].get('url') and not (r['profile']['name'] and r['profile']['industry'])]
+        htmls = self.threads.map(fetch_page, [r['input']['url'] for r in pending])
+
+        analyses = []
+        for record, html in zip(pending, htmls):
+            if html is None:
+                self.fail(record, 'fetch', f"Could not fetch {record['input']['url']}")
+                continue
+            analyses.append((record, self.processes.submit(
+                analyze_page, record['input']['url'], html[:MAX_HTML_BYTES], self.args.crawl, self.crawl_options
+            )))
+        for record, future in analyses:
+            try:
+                analysis = future.result()
+            except Exception as e:
+                self.fail(record, 'analyze', e)
+                continue
+            profile = record['profile']
+            record['analysis'] = analysis
+            profile['name'] = profile['name'] or analysis['Name']
+            profile['industry'] = profile['industry'] or analysis['Industry']
+            profile['services'] = profile['services'] or parse_services(analysis['Services'].replace(', ', ';'))
+            profile['tone'] = profile['tone'] or analysis['Tone of voice']
+
+        for record in records:
+            if record['status'] == 'ok' and not (record['profile']['name'] and record['profile']['industry']):
+                self.fail(record, 'understand', "Row needs a url, or a name and industry")
+
+    def generate(self, records):
+        records = [r for r in records if r['status'] == 'ok']
+        industries = {r['profile']['industry'] for r in records}
+        news = dict(zip(industries, self.threads.map(lambda industry: get_industry_news(industry, self.news), industries)))
+        for record in records:
+            row, profile = record['input'], record['profile']
+            try:
+                # Blank CSV cells fall back to the defaults
+                post_type = row.get('post_type') or self.args.post_type
+                frequency = min(int(row.get('frequency') or self.args.frequency), len(DAYS))
+                tone = (profile['tone'] or 'professional').lower()
+                if post_type in PROFILE_POST_TYPES:
+                    if not profile['services']:
+                        profile['services'] = [f"{profile['industry']} services"]
+                    posts = generate_content(profile, list(news[profile['industry']]), tone, post_type, frequency)
+                else:
+                    hashtags = self.trend_tracker.hashtags(profile['industry'])
+                    posts = [generate_ai_content(profile['industry'].lower(), tone, post_type, hashtags)
+                             for _ in range(frequency)]
+            except Exception as e:
+                self.fail(record, 'generate', e)
+                continue
+            record['posts'] = posts
+
+    def plan(self, records):
+        for record in records:
+            if record['status'] == 'ok':
+                days = sorted(auto_distribute_days(len(record['posts'])), key=DAYS.index)
+                record['schedule'] = dict(zip(days, record['posts']))
+
+    def publish(self, records, journal):
+        """Schedule each planned post on the row's page. Rows are journaled first so a crash can't double-post."""
+        records = [r for r in records if r['status'] == 'ok' and r['input'].get('page_id')]
+        for record in records:
+            journal.write(f"{record['id']}\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        for record, result in zip(records, self.threads.map(self.publish_record, records)):
+            record['published'] = result
+            if not all(post.get('success') for post in result):
+                self.fail(record, 'publish', "Some posts were not scheduled")
+
+    def publish_record(self, record):
+        row = record['input']
+        page_id = row['page_id']
+        access_token = row.get('access_token') or Config.FB_ACCESS_TOKEN
+        now = datetime.now()
+        results = []
+        for day, content in record['schedule'].items():
+            unix_timestamp = next_slot(day, self.args.publish_hour, now)
+            key = hashlib.sha256(f"batch|{record['id']}|{page_id}|{unix_timestamp}|{content}".encode()).hexdigest()
+            try:
+                response = self.post_feed(page_id, {
+                    'access_token': access_token,
+                    'message': content,
+                    'published': 'false',
+                    'scheduled_publish_time': unix_timestamp,
+                }, key)
+                body = response.json() if response.content else {}
+                if response.status_code == 200:
+                    results.append({'day': day, 'success': True, 'fb_post_id': body.get('id'),
+                                    'scheduled_publish_time': unix_timestamp})
+                else:
+                    error = (body.get('error') or {}).get('message', 'Unknown error') if isinstance(body, dict) else 'Unknown error'
+                    results.append({'day': day, 'success': False, 'error': error})
+            except Exception as e:
+                results.append({'day': day, 'success': False, 'error': str(e)})
+        return results
+
+    def post_feed(self, page_id, data, key, waits=3):
+        """POST to the page feed, waiting out an open breaker a few times instead of failing the row."""
+        for attempt in range(waits + 1):
+            try:
+                return self.graph.post('feed', f"{Config.FACEBOOK_GRAPH_URL}/{page_id}/feed", data=data, idempotency_key=key)
+            except CircuitOpenError as e:
+                if attempt == waits:
+                    raise
+                time.sleep(max(e.retry_after, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV (with header) or JSONL file of businesses")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--post-type", default="promo", help="Default post type (promo, tip, update, trending, ...)")
+    parser.add_argument("--frequency", type=int, default=3, help="Default posts per week")
+    parser.add_argument("--crawl", action="store_true", help="Also crawl relevant subpages of each site")
+    parser.add_argument("--publish", action="store_true", help="Schedule the planned posts on each row's page_id")
+    parser.add_argument("--publish-hour", type=int, default=10, help="Local hour scheduled posts go out")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="Parser processes")
+    parser.add_argument("--threads", type=int, default=16, help="Threads for fetching and publishing")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Rows per checkpoint")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run rows whose previous result was an error")
+    args = parser.parse_args()
+
+    journal_path = f"{args.output}.publishing"
+    done = read_checkpoint(args.output, args.retry_failed)
+    interrupted = read_journal(journal_path) - done
+    if done:
+        print(f"Resuming: {len(done)} rows already in {args.output}", file=sys.stderr)
+
+    pipeline = Pipeline(args)
+    started = time.monotonic()
+    processed = failed = 0
+    try:
+        with open(args.output, 'a', encoding='utf-8') as output, open(journal_path, 'a') as journal:
+            rows = ((row_id, row) for row_id, row in read_rows(args.input) if row_id not in done)
+            for chunk in chunks(rows, args.chunk_size):
+                cut_short = [(row_id, row) for row_id, row in chunk if row_id in interrupted]
+                records = pipeline.run_chunk([item for item in chunk if item[0] not in interrupted], journal)
+                for row_id, row in cut_short:
+                    records.append({'id': row_id, 'input': row, 'status': 'error', 'stage': 'publish',
+                                    'error': "Previous run stopped while publishing; not retried to avoid duplicate posts"})
+                for record in records:
+                    record['input'] = {key: value for key, value in record['input'].items() if key != 'access_token'}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    failed += record['status'] != 'ok'
+                output.flush()
+                os.fsync(output.fileno())
+                processed += len(records)
+                elapsed = time.monotonic() - started
+                print(f"{processed} rows ({failed} failed) in {elapsed:.0f}s, {processed / elapsed:.1f} rows/s",
+                      file=sys.stderr)
+        # Every journaled row now has its result in the output
+        os.remove(journal_path)
+    finally:
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
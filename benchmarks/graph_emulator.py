@@ -0,0 +1,233 @@
+"""Local stand-in for the Graph API endpoints the app calls, with injectable latency and errors.
+
+Usage:
+    python benchmarks/graph_emulator.py [--port 8900] [--latency-ms 120] [--error-rate 0.01]
+        [--latency photos=600] [--error feed=0.05]
+
+Point the app at it with FACEBOOK_GRAPH_URL=http://127.0.0.1:8900/v23.0.
+Besides the Graph endpoints it serves a small business website under
+`/site/` for business-understanding, and `/stats` with call counts.
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+# Endpoint kinds latency and errors can be configured for
+KINDS = ('page', 'feed', 'photos', 'batch', 'site')
+
+SITE_HTML = """<!doctype html>
+<html><head><title>Harbor Fitness Studio</title>
+<meta property="og:site_name" content="Harbor Fitness Studio"></head>
+<body>
+<nav><a href="/site/services">Services</a> <a href="/site/classes">Classes</a></nav>
+<h1>Harbor Fitness Studio</h1>
+<p>Your friendly neighbourhood gym. Join our community for personal training, group classes,
+yoga, spin and strength workouts. Membership plans for every goal, with certified trainers
+and a free first session.</p>
+<h2>Our services</h2>
+<ul><li>Personal Training</li><li>Group Classes</li><li>Yoga</li><li>Nutrition Coaching</li></ul>
+</body></html>
+"""
+
+SUBPAGE_HTML = """<!doctype html>
+<html><head><title>{title} - Harbor Fitness Studio</title></head>
+<body><h1>{title}</h1><p>Personal training, HIIT classes, yoga and spin sessions with certified coaches.
+Book a workout or a nutrition consultation today.</p></body></html>
+"""
+
+GRAPH_ERROR = {
+    'message': 'An unexpected error has occurred. Please retry your request later.',
+    'type': 'OAuthException',
+    'is_transient': True,
+    'code': 2,
+}
+
+
+class EmulatorSettings:
+    """Per-kind latency (seconds) and error probability."""
+
+    def __init__(self, latency=0.1, jitter=0.5, error_rate=0.0, latency_overrides=None, error_overrides=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.latency_overrides = latency_overrides or {}
+        self.error_overrides = error_overrides or {}
+
+    def delay(self, kind):
+        base = self.latency_overrides.get(kind, self.latency)
+        if base > 0:
+            time.sleep(max(0.0, random.uniform(base * (1 - self.jitter), base * (1 + self.jitter))))
+
+    def fails(self, kind):
+        return random.random() < self.error_overrides.get(kind, self.error_rate)
+
+
+def create_emulator(settings):
+    app = Flask(__name__)
+    ids = itertools.count(1)
+    calls = {kind: 0 for kind in KINDS}
+    errors = {kind: 0 for kind in KINDS}
+    lock = threading.Lock()
+
+    def record(kind):
+        settings.delay(kind)
+        failed = settings.fails(kind)
+        with lock:
+            calls[kind] += 1
+            errors[kind] += failed
+        return failed
+
+    def graph_error():
+        return jsonify({'error': GRAPH_ERROR}), 500
+
+    @app.route('/<version>/<page_id>', methods=['GET'])
+    def page(version, page_id):
+        if record('page'):
+            return graph_error()
+        return jsonify({
+            'id': page_id,
+            'name': f"Load Test Page {page_id}",
+            'access_token': request.args.get('access_token', 'emulated-token'),
+        })
+
+    @app.route('/<version>/<page_id>/feed', methods=['POST'])
+    def feed(version, page_id):
+        if record('feed'):
+            return graph_error()
+        return jsonify({'id': f"{page_id}_{next(ids)}"})
+
+    @app.route('/<version>/<page_id>/photos', methods=['POST'])
+    def photos(version, page_id):
+        # Drain the upload like the real endpoint would
+        upload = request.files.get('file') or request.files.get('source')
+        if upload:
+            upload.read()
+        if record('photos'):
+            return graph_error()
+        photo_id = next(ids)
+        if request.form.get('published', 'true') == 'false':
+            return jsonify({'id': str(photo_id)})
+        return jsonify({'id': str(photo_id), 'post_id': f"{page_id}_{photo_id}"})
+
+    @app.route('/<version>', methods=['POST'])
+    @app.route('/<version>/', methods=['POST'])
+    def batch(version):
+        if record('batch'):
+            return graph_error()
+        items = json.loads(request.form.get('batch') or '[]')
+        results = []
+        for item in items:
+            if settings.fails('batch'):
+                results.append({'code': 500, 'body': json.dumps({'error': GRAPH_ERROR})})
+                continue
+            relative_url = item.get('relative_url', '')
+            if relative_url.startswith('debug_token'):
+                body = {'data': {'is_valid': True, 'expires_at': int(time.time()) + 60 * 24 * 3600}}
+            elif '/insights' in relative_url:
+                impressions = random.randint(100, 5000)
+                body = {'data': [
+                    {'name': 'post_impressions', 'values': [{'value': impressions}]},
+                    {'name': 'post_impressions_unique', 'values': [{'value': int(impressions * 0.7)}]},
+                    {'name': 'post_clicks', 'values': [{'value': random.randint(0, impressions // 10)}]},
+                    {'name': 'post_engaged_users', 'values': [{'value': random.randint(0, impressions // 8)}]},
+                ]}
+            else:
+                body = {'id': relative_url.split('?')[0]}
+            results.append({'code': 200, 'body': json.dumps(body)})
+        return jsonify(results)
+
+    @app.route('/site/')
+    @app.route('/site/<path:subpage>')
+    def site(subpage=None):
+        if record('site'):
+            return 'Service unavailable', 503
+        if subpage:
+            return SUBPAGE_HTML.format(title=subpage.replace('-', ' ').title())
+        return SITE_HTML
+
+    @app.route('/robots.txt')
+    def robots():
+        return 'User-agent: *\nAllow: /\n', 200, {'Content-Type': 'text/plain'}
+
+    @app.route('/stats')
+    def stats():
+        with lock:
+            return jsonify({'calls': dict(calls), 'errors': dict(errors)})
+
+    return app
+
+
+class GraphEmulator:
+    """Runs the emulator on a background thread."""
+
+    def __init__(self, settings, host='127.0.0.1', port=8900, api_version='v23.0', quiet=True):
+        if quiet:
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.app = create_emulator(settings)
+        self.server = make_server(host, port, self.app, threaded=True)
+        self.base_url = f"http://{host}:{self.server.server_port}"
+        self.graph_url = f"{self.base_url}/{api_version}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name='graph-emulator', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def stats(self):
+        with self.app.test_client() as client:
+            return client.get('/stats').get_json()
+
+
+def parse_overrides(values, cast=float):
+    """`kind=value` pairs into a dict, validating the kind."""
+    overrides = {}
+    for value in values or []:
+        kind, _, number = value.partition('=')
+        if kind not in KINDS or not number:
+            raise argparse.ArgumentTypeError(f"Expected one of {', '.join(KINDS)} as kind=value, got '{value}'")
+        overrides[kind] = cast(number)
+    return overrides
+
+
+def add_settings_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=100, help="Mean Graph latency")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency varies uniformly by +/- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability a call fails")
+    parser.add_argument("--latency", action="append", metavar="KIND=MS", help="Per-kind latency override")
+    parser.add_argument("--error", action="append", metavar="KIND=RATE", help="Per-kind error rate override")
+
+
+def settings_from_args(args):
+    return EmulatorSettings(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        latency_overrides={kind: ms / 1000 for kind, ms in parse_overrides(args.latency).items()},
+        error_overrides=parse_overrides(args.error),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    emulator = GraphEmulator(settings_from_args(args), args.host, args.port, quiet=False)
+    print(f"Graph emulator on {emulator.graph_url}")
+    emulator.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
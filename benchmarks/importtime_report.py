@@ -0,0 +1,68 @@
+"""Summarise `python -X importtime` for the app and check it against a cold-start budget.
+
+Usage:
+    python benchmarks/importtime_report.py [--module app] [--top 15] [--budget-ms 250] [--runs 3]
+
+Exits non-zero when the median cumulative import time exceeds the budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+
+
+def run_importtime(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=Config.COLD_START_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    totals = []
+    rows = []
+    for _ in range(args.runs):
+        rows = run_importtime(args.module)
+        total = next(cum for name, _, cum in rows if name.strip() == args.module)
+        totals.append(total / 1000)
+
+    print(f"Slowest imports for '{args.module}' (last run, cumulative):")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    median = statistics.median(totals)
+    print()
+    print(f"Median cold import over {args.runs} runs: {median:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if median > args.budget_ms:
+        print("Cold-start budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare stdlib `jsonify` with the fast and streaming encoders on a large post listing.
+
+Usage:
+    python benchmarks/json_serialization.py [--posts 100000] [--runs 3]
+
+Time is the median wall time to produce the full body. Peak memory is the
+tracemalloc peak while producing it, measured in a separate run.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from utils.serialization import FastJSONProvider, _orjson, collection_response
+
+
+def make_posts(count):
+    return {
+        f"post_{i}": {
+            'page_id': str(100000 + i % 50),
+            'content': f"Post {i}: discover what our team can do for you this week. Book now and save 15%! ✨",
+            'industry': 'Fitness',
+            'tone': 'friendly',
+            'status': 'draft' if i % 3 else 'published',
+            'generated_at': '2024-05-01T12:00:00',
+        }
+        for i in range(count)
+    }
+
+
+def serialize(post_id, post_data):
+    return {'post_id': post_id, **post_data}
+
+
+def stdlib_jsonify(app, posts):
+    app.json = DefaultJSONProvider(app)
+    return jsonify({'posts': [serialize(*item) for item in posts.items()]}).get_data()
+
+
+def fast_jsonify(app, posts):
+    app.json = FastJSONProvider(app)
+    return jsonify({'posts': [serialize(*item) for item in posts.items()]}).get_data()
+
+
+def streamed(app, posts, fmt):
+    app.json = FastJSONProvider(app)
+    size = 0
+    with app.test_request_context(f"/?format={fmt}"):
+        response = collection_response('posts', posts, serialize, stream_min_items=0)
+        for chunk in response.response:
+            size += len(chunk)
+    return size
+
+
+def measure(fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    posts = make_posts(args.posts)
+    cases = [
+        ("jsonify (stdlib)", lambda: stdlib_jsonify(app, posts)),
+        ("jsonify (fast provider)", lambda: fast_jsonify(app, posts)),
+        ("streamed JSON", lambda: streamed(app, posts, 'json')),
+        ("streamed NDJSON", lambda: streamed(app, posts, 'ndjson')),
+    ]
+
+    print(f"{args.posts} posts, orjson {'available' if _orjson() else 'not installed'}")
+    print(f"{'encoder':<26} {'median ms':>10} {'peak MiB':>10}")
+    with app.app_context():
+        for name, fn in cases:
+            results = [measure(fn) for _ in range(args.runs)]
+            elapsed = statistics.median(r[0] for r in results)
+            peak = max(r[1] for r in results)
+            print(f"{name:<26} {elapsed * 1000:>10.1f} {peak / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Drive scripted user journeys against the app at fixed arrival rates, with Graph calls served locally.
+
+Usage:
+    python benchmarks/loadtest.py [--rates 2,5,10,20] [--duration 20] [--journey full]
+        [--concurrency 32] [--target http://127.0.0.1:5000 | --app-cmd "gunicorn -w 4 -b 127.0.0.1:{port} app:app"]
+        [--latency-ms 100] [--error-rate 0.01] [--latency photos=600] [--json results.json]
+
+Journeys start at a fixed rate (open loop) for each rate in turn. Without
+`--target` the app is started from a temporary directory, so its state
+files don't touch the checkout, with FACEBOOK_GRAPH_URL pointing at the
+emulator (see graph_emulator.py). With `--target`, start the app yourself
+with that variable set to the URL printed at startup.
+
+Per route it reports throughput and p50/p95/p99 latency. Journey latency is
+measured from the scheduled start, so queueing behind a saturated worker
+pool shows up instead of being hidden. A step is marked saturated when it
+completes under 90% of the offered rate or has to drop journeys.
+"""
+import argparse
+import io
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.graph_emulator import GraphEmulator, add_settings_arguments, settings_from_args
+
+INDUSTRIES = ('fitness', 'beauty', 'restaurant', 'retail', 'technology')
+TONES = ('professional', 'friendly', 'casual')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latencies (seconds) and failures per route."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, elapsed, status):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            self.statuses.setdefault(route, {})
+            self.statuses[route][status] = self.statuses[route].get(status, 0) + 1
+            if status == 'exception' or status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed):
+        rows = []
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            rows.append({
+                'route': route,
+                'count': len(values),
+                'errors': self.errors.get(route, 0),
+                'throughput': len(values) / elapsed,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000,
+                'statuses': {str(status): count for status, count in self.statuses[route].items()},
+            })
+        return rows
+
+
+class JourneyContext:
+    def __init__(self, base_url, session, recorder, number, pages, site_url, image):
+        self.base_url = base_url
+        self.session = session
+        self.recorder = recorder
+        self.page_id = f"lt_{number % pages}"
+        self.access_token = f"loadtest-token-{number % pages}"
+        self.industry = INDUSTRIES[number % len(INDUSTRIES)]
+        self.tone = TONES[number % len(TONES)]
+        self.site_url = site_url
+        self.image = image
+        self.post_id = None
+        self.content = None
+        self.failed = False
+
+    def call(self, route, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(route, time.perf_counter() - start, 'exception')
+            self.failed = True
+            return None
+        self.recorder.record(route, time.perf_counter() - start, response.status_code)
+        if response.status_code >= 400:
+            self.failed = True
+            return None
+        return response.json()
+
+
+def connect(ctx):
+    ctx.call('connect-page', 'POST', '/api/connect-page',
+             json={'page_id': ctx.page_id, 'access_token': ctx.access_token})
+
+
+def business_understanding(ctx):
+    ctx.call('business-understanding', 'POST', '/api/business-understanding', json={'url': ctx.site_url})
+
+
+def generate(ctx):
+    data = ctx.call('generate-post', 'POST', '/api/generate-post',
+                    json={'page_id': ctx.page_id, 'industry': ctx.industry, 'tone': ctx.tone})
+    if data:
+        ctx.post_id = data.get('post_id')
+        ctx.content = data.get('content')
+
+
+def plan_week(ctx):
+    posts = [ctx.content or f"Weekly update from {ctx.page_id}"] * 3
+    ctx.call('weekly-planner', 'POST', '/api/weekly-planner',
+             json={'posts': posts, 'post_frequency': 3, 'page_id': ctx.page_id})
+
+
+def publish(ctx):
+    if not ctx.post_id:
+        return
+    files = {'image': ('photo.jpg', io.BytesIO(ctx.image), 'image/jpeg')} if ctx.image else None
+    ctx.call('publish-post', 'POST', '/api/publish-post', data={'post_id': ctx.post_id}, files=files)
+
+
+JOURNEYS = {
+    'full': (connect, business_understanding, generate, plan_week, publish),
+    'publish': (connect, generate, publish),
+    'onboard': (connect, business_understanding),
+    'plan': (connect, generate, plan_week),
+}
+
+
+def make_image(width=640, height=480):
+    """A JPEG to publish, or None when Pillow isn't installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (40, 120, 180)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def run_step(base_url, steps, rate, duration, concurrency, pages, site_url, image, max_backlog):
+    recorder = Recorder()
+    journeys = Recorder()
+    local = threading.local()
+    outstanding = [0]
+    lock = threading.Lock()
+
+    def run_journey(number, scheduled):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        ctx = JourneyContext(base_url, local.session, recorder, number, pages, site_url, image)
+        try:
+            for step in steps:
+                step(ctx)
+                if ctx.failed:
+                    break
+            journeys.record('journey', time.perf_counter() - scheduled, 500 if ctx.failed else 200)
+        finally:
+            with lock:
+                outstanding[0] -= 1
+
+    dropped = 0
+    started = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            scheduled = start + started / rate
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            started += 1
+            with lock:
+                if outstanding[0] >= max_backlog:
+                    dropped += 1
+                    continue
+                outstanding[0] += 1
+            executor.submit(run_journey, started, scheduled)
+    elapsed = time.perf_counter() - start
+
+    journey_rows = journeys.summary(elapsed)
+    completed = journey_rows[0]['count'] if journey_rows else 0
+    return {
+        'rate': rate,
+        'elapsed_s': elapsed,
+        'offered': started,
+        'completed': completed,
+        'dropped': dropped,
+        'achieved_rate': completed / elapsed,
+        'journey': journey_rows[0] if journey_rows else None,
+        'routes': recorder.summary(elapsed),
+        'saturated': dropped > 0 or completed / elapsed < 0.9 * rate,
+    }
+
+
+def print_step(result):
+    journey = result['journey'] or {}
+    print()
+    print(f"== {result['rate']:g} journeys/s for {result['elapsed_s']:.1f}s: "
+          f"{result['completed']} completed ({result['achieved_rate']:.2f}/s), "
+          f"{journey.get('errors', 0)} failed, {result['dropped']} dropped"
+          f"{'  [SATURATED]' if result['saturated'] else ''}")
+    print(f"{'route':<24} {'count':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for row in result['routes'] + ([dict(journey, route='(journey)')] if journey else []):
+        print(f"{row['route']:<24} {row['count']:>6} {row['errors']:>6} {row['throughput']:>7.2f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(app_cmd, graph_url, workdir):
+    port = free_port()
+    if app_cmd:
+        command = shlex.split(app_cmd.format(port=port))
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+                   '--no-reload', '--no-debugger', '--with-threads']
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+        FACEBOOK_GRAPH_URL=graph_url,
+        # An FB_PAGE_ID override would send every publish to one unconnected page
+        FB_PAGE_ID='',
+        FLASK_DEBUG='false',
+    )
+    log = open(os.path.join(workdir, 'app.log'), 'wb')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def wait_until_ready(base_url, process=None, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/api/token-status", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App at {base_url} did not become ready within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", default="2,5,10", help="Comma-separated journey arrival rates per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per rate")
+    parser.add_argument("--journey", choices=sorted(JOURNEYS), default="full")
+    parser.add_argument("--concurrency", type=int, default=32, help="Client threads running journeys")
+    parser.add_argument("--max-backlog", type=int, default=None,
+                        help="Journeys in flight or queued before new ones are dropped (default 4x concurrency)")
+    parser.add_argument("--pages", type=int, default=20, help="Distinct pages the journeys connect")
+    parser.add_argument("--target", help="Base URL of an already running app")
+    parser.add_argument("--app-cmd", help="Command to start the app; {port} is substituted")
+    parser.add_argument("--emulator-port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--json", help="Also write the results to this file")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    rates = [float(rate) for rate in args.rates.split(',') if rate]
+    emulator = GraphEmulator(settings_from_args(args), port=args.emulator_port).start()
+    print(f"Graph emulator: {emulator.graph_url}")
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    try:
+        if args.target:
+            base_url = args.target.rstrip('/')
+            print(f"Target: {base_url} (start it with FACEBOOK_GRAPH_URL={emulator.graph_url})")
+        else:
+            process, base_url = start_app(args.app_cmd, emulator.graph_url, workdir)
+            print(f"Started app at {base_url} in {workdir}")
+        wait_until_ready(base_url, process)
+
+        results = []
+        for rate in rates:
+            result = run_step(
+                base_url, JOURNEYS[args.journey], rate, args.duration, args.concurrency, args.pages,
+                f"{emulator.base_url}/site/", make_image(), args.max_backlog or 4 * args.concurrency,
+            )
+            print_step(result)
+            results.append(result)
+
+        print()
+        print("Graph emulator calls:", json.dumps(emulator.stats()))
+        saturated = next((r['rate'] for r in results if r['saturated']), None)
+        if saturated is not None:
+            print(f"Saturated at {saturated:g} journeys/s")
+        else:
+            print(f"No saturation up to {rates[-1]:g} journeys/s")
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'journey': args.journey, 'steps': results, 'graph': emulator.stats()}, f, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Memory used by generated/published post collections as plain dicts versus compact records.
+
+Usage:
+    python benchmarks/post_memory.py [--posts 100000 1000000]
+
+Posts are loaded from JSON text, the way `generated_posts.json` is read at
+startup, and the tracemalloc size of the resulting collection is reported.
+Before measuring, every record is checked to read back exactly as the dict
+it was built from, including fields holding values of unexpected types.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.post_records import PostRecord, PublishedRecord, RecordMap
+
+INDUSTRIES = ['Fitness', 'Beauty', 'Restaurant', 'Retail', 'Technology', 'Healthcare', 'Education']
+TONES = ['professional', 'friendly', 'casual', 'enthusiastic']
+STATUSES = ['draft', 'published', 'generated']
+
+
+def make_json(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    generated = {}
+    published = {}
+    for i in range(count):
+        post_id = f"post_{i}_{start.strftime('%Y%m%d_%H%M%S')}"
+        page_id = str(100000000000 + rng.randrange(500))
+        moment = (start + timedelta(seconds=i * 37, microseconds=rng.randrange(1000000))).isoformat()
+        content = f"Post {i}: " + " ".join(rng.choice(["Book", "your", "session", "today", "and", "save", "15%",
+                                                        "on", "personal", "training", "classes", "this", "week"])
+                                            for _ in range(28))
+        generated[post_id] = {
+            'page_id': page_id,
+            'content': content,
+            'industry': rng.choice(INDUSTRIES),
+            'tone': rng.choice(TONES),
+            'content_type': 'trending',
+            'generated_at': moment,
+            'status': rng.choice(STATUSES),
+        }
+        if i % 3 == 0:
+            fb_post_id = f"{page_id}_{10 ** 15 + i}"
+            published[post_id] = {
+                'page_id': page_id,
+                'fb_post_id': fb_post_id,
+                'fb_post_url': f"https://www.facebook.com/{fb_post_id}",
+                'published_at': moment,
+                'original_content': content,
+                'has_image': bool(i % 2),
+            }
+    return json.dumps(generated), json.dumps(published)
+
+
+# Values of unexpected types that must read back unchanged, e.g. from JSON request bodies
+ODD_VALUES = [
+    {'tone': 1, 'industry': 42, 'status': None, 'generated_at': 1700000000, 'created_at': 1.5},
+    {'content_type': True, 'updated_at': '2024-01-01T00:00:00+00:00', 'generated_at': '2024-01-01 00:00'},
+    {'industry': ['a', 'b'], 'tone': {'x': 1}, 'page_id': 12345, 'created_at': False},
+]
+
+
+def check_round_trip(generated_json, published_json):
+    """Exit if any record differs from the dict it was built from, or doesn't survive JSON."""
+    cases = [(PostRecord, json.loads(generated_json)), (PublishedRecord, json.loads(published_json))]
+    cases.append((PostRecord, {f"odd_{i}": values for i, values in enumerate(ODD_VALUES)}))
+    cases.append((PublishedRecord, {'odd': {'published_at': 1700000000, 'fb_post_id': 7, 'has_image': 'yes'}}))
+    for record_type, plain in cases:
+        records = RecordMap(record_type, plain)
+        for post_id, values in plain.items():
+            record = records[post_id]
+            if dict(record) != values or json.loads(json.dumps(record.to_dict())) != json.loads(json.dumps(values)):
+                sys.exit(f"{record_type.__name__} doesn't round-trip: {values!r} -> {record.to_dict()!r}")
+            # Updating a field to another type and back must not leave the old value behind
+            for key, value in list(values.items()):
+                record[key] = 'changed'
+                record[key] = value
+            if dict(record) != values:
+                sys.exit(f"{record_type.__name__} changed after updates: {values!r} -> {record.to_dict()!r}")
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    collection = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del collection
+    gc.collect()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, nargs="+", default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'posts':>9} {'collection':<16} {'dict MiB':>9} {'record MiB':>11} {'saved':>6} {'dict B/post':>12} {'record B/post':>14}")
+    for count in args.posts:
+        generated_json, published_json = make_json(count)
+        check_round_trip(generated_json, published_json)
+        for name, text, record_type in (('generated_posts', generated_json, PostRecord),
+                                        ('published_posts', published_json, PublishedRecord)):
+            entries = max(1, len(json.loads(text)))
+            as_dicts = measure(lambda: json.loads(text))
+            as_records = measure(lambda: RecordMap(record_type, json.loads(text)))
+            print(f"{count:>9} {name:<16} {as_dicts / 2 ** 20:>9.1f} {as_records / 2 ** 20:>11.1f} "
+                  f"{1 - as_records / as_dicts:>6.0%} {as_dicts / entries:>12.0f} {as_records / entries:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
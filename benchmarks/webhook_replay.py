@@ -0,0 +1,276 @@
+"""Replay signed Facebook page webhook deliveries against the app and check what it ingested.
+
+Usage:
+    python benchmarks/webhook_replay.py [--events 20000] [--concurrency 8] [--posts 10]
+        [--changes 1] [--duplicate-rate 0.02] [--unlinked-rate 0.1] [--file deliveries.jsonl]
+        [--in-process | --target http://127.0.0.1:5000 --secret <FB_APP_SECRET>]
+
+First `--posts` posts are published through the Graph emulator (see
+graph_emulator.py) so the replayed events can be linked to them. Then
+comment, reaction and post-edit deliveries are signed with the app secret
+and sent from `--concurrency` threads. `--file` replays recorded deliveries
+instead, one JSON payload per line. `--in-process` calls the app through
+the Flask test client, which leaves out the HTTP server and shows the cost
+of the route itself.
+
+It reports acknowledgement latency, the time until the worker has
+processed every delivery, and whether the comment and reaction counts
+reported for each published post match what was sent.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.graph_emulator import EmulatorSettings, GraphEmulator
+from benchmarks.loadtest import percentile, start_app, wait_until_ready
+from utils.webhooks import SIGNATURE_HEADER, sign
+
+REACTIONS = ('like', 'love', 'wow', 'haha', 'care')
+PAGE_ID = 'replay_page'
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._local = threading.local()
+
+    def request(self, method, path, **kwargs):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+        return response.status_code, response.content
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=json, data=data, headers=headers)
+        return response.status_code, response.data
+
+
+def get_json(client, path):
+    status, body = client.request('GET', path, headers={'Accept': 'application/json'})
+    if status != 200:
+        raise RuntimeError(f"GET {path} answered {status}")
+    return json.loads(body)
+
+
+def seed_posts(client, count):
+    """Connect a page and publish `count` posts; {fb_post_id: post_id}."""
+    client.request('POST', '/api/connect-page', json={'page_id': PAGE_ID, 'access_token': 'replay-token'})
+    for number in range(count):
+        status, body = client.request('POST', '/api/create-post', data={
+            'content': f"Replayed webhook post {number} {random.random()}", 'page_id': PAGE_ID})
+        if status != 200:
+            raise RuntimeError(f"Creating a post failed with {status}: {body[:200]!r}")
+        post_id = json.loads(body)['post_id']
+        status, body = client.request('POST', '/api/publish-post', data={'post_id': post_id})
+        if status != 200:
+            raise RuntimeError(f"Publishing {post_id} failed with {status}: {body[:200]!r}")
+        # Post ids have one-second resolution
+        time.sleep(1.01)
+    posts = get_json(client, '/api/published-posts')['posts']
+    return {post['fb_post_id']: post['post_id'] for post in posts}
+
+
+def make_deliveries(fb_post_ids, events, changes, duplicate_rate, unlinked_rate, seed=0):
+    """Signed-to-be bodies plus the comment/reaction totals they should produce per fb post id."""
+    rng = random.Random(seed)
+    expected = {}
+    deliveries = []
+    comment_ids = iter(range(10 ** 9))
+    sent = 0
+    while sent < events:
+        if deliveries and rng.random() < duplicate_rate:
+            deliveries.append(rng.choice(deliveries))
+            continue
+        entry_changes = []
+        for _ in range(min(changes, events - sent)):
+            if rng.random() < unlinked_rate:
+                fb_post_id = f"{PAGE_ID}_{rng.randrange(10 ** 12)}"
+            else:
+                fb_post_id = rng.choice(fb_post_ids)
+            roll = rng.random()
+            value = {'post_id': fb_post_id, 'created_time': int(time.time()), 'from': {'id': str(rng.randrange(10 ** 9))}}
+            counts = expected.setdefault(fb_post_id, {'comments': 0, 'reactions': Counter()})
+            if roll < 0.55:
+                value.update(item='comment', verb='add', comment_id=f"{fb_post_id}_{next(comment_ids)}",
+                             message='Great post!')
+                counts['comments'] += 1
+            elif roll < 0.95:
+                reaction = rng.choice(REACTIONS)
+                value.update(item='reaction', verb='add', reaction_type=reaction)
+                counts['reactions'][reaction] += 1
+            else:
+                value.update(item='status', verb='edited', message='Edited text')
+            # Makes otherwise identical reactions from different users distinct
+            value['event_seq'] = sent
+            entry_changes.append({'field': 'feed', 'value': value})
+            sent += 1
+        deliveries.append(json.dumps({
+            'object': 'page',
+            'entry': [{'id': PAGE_ID, 'time': int(time.time()), 'changes': entry_changes}],
+        }).encode())
+    return deliveries, expected
+
+
+def load_deliveries(path):
+    with open(path, 'rb') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def replay(client, deliveries, secret, concurrency):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    work = iter(deliveries)
+
+    def worker():
+        local_latencies = []
+        local_statuses = Counter()
+        while True:
+            with lock:
+                body = next(work, None)
+            if body is None:
+                break
+            headers = {SIGNATURE_HEADER: sign(secret, body), 'Content-Type': 'application/json'}
+            start = time.perf_counter()
+            status, _ = client.request('POST', '/api/webhooks/facebook', data=body, headers=headers)
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), statuses, time.perf_counter() - started
+
+
+def wait_for_processing(client, baseline, accepted, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = get_json(client, '/api/webhook-status')
+        if status.get('processed', 0) - baseline >= accepted:
+            return status
+        time.sleep(0.01)
+    raise RuntimeError(f"Worker didn't process {accepted} deliveries within {timeout}s")
+
+
+def check_activity(client, expected, fb_to_post):
+    mismatches = []
+    for fb_post_id, post_id in fb_to_post.items():
+        want = expected.get(fb_post_id)
+        if want is None:
+            continue
+        page = get_json(client, f"/api/published-posts/{post_id}/activity")['pages'].get(PAGE_ID, {})
+        got = {'comments': page.get('comments', 0), 'reactions': Counter(page.get('reactions') or {})}
+        want = {'comments': want['comments'], 'reactions': +want['reactions']}
+        if got != want:
+            mismatches.append((post_id, want, got))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000, help="Feed changes to send")
+    parser.add_argument("--changes", type=int, default=1, help="Changes per delivery")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads")
+    parser.add_argument("--posts", type=int, default=10, help="Posts to publish and link events to")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="Fraction of deliveries resent")
+    parser.add_argument("--unlinked-rate", type=float, default=0.1,
+                        help="Fraction of changes for posts the app didn't publish")
+    parser.add_argument("--file", help="Replay these recorded deliveries (one JSON payload per line)")
+    parser.add_argument("--secret", default="replay-secret", help="App secret the deliveries are signed with")
+    parser.add_argument("--target", help="Base URL of an already running app")
+    parser.add_argument("--app-cmd", help="Command to start the app; {port} is substituted")
+    parser.add_argument("--in-process", action="store_true", help="Call the app through the Flask test client")
+    args = parser.parse_args()
+
+    emulator = GraphEmulator(EmulatorSettings(latency=0.0), port=0).start()
+    workdir = tempfile.mkdtemp(prefix='webhook-replay-')
+    process = None
+    try:
+        if args.target:
+            client = HttpClient(args.target.rstrip('/'))
+            print(f"Target: {args.target} (start it with FACEBOOK_GRAPH_URL={emulator.graph_url} "
+                  f"FB_APP_SECRET={args.secret})")
+        else:
+            os.environ.update(FB_APP_SECRET=args.secret, FACEBOOK_GRAPH_URL=emulator.graph_url,
+                              FB_PAGE_ID='', FLASK_DEBUG='false')
+            if args.in_process:
+                # The app writes its state files to the working directory
+                os.chdir(workdir)
+                from app import app
+                client = InProcessClient(app)
+                print(f"App loaded in process, working in {workdir}")
+            else:
+                process, base_url = start_app(args.app_cmd, emulator.graph_url, workdir)
+                client = HttpClient(base_url)
+                print(f"Started app at {base_url} in {workdir}")
+        if process is not None or args.target:
+            wait_until_ready(client.base_url, process)
+
+        if args.file:
+            deliveries, expected, fb_to_post = load_deliveries(args.file), {}, {}
+        else:
+            fb_to_post = seed_posts(client, args.posts) if args.posts else {}
+            linked = list(fb_to_post) or [f"{PAGE_ID}_0"]
+            deliveries, expected = make_deliveries(linked, args.events, args.changes,
+                                                   args.duplicate_rate, args.unlinked_rate)
+        print(f"Replaying {len(deliveries)} deliveries from {args.concurrency} threads")
+
+        baseline = get_json(client, '/api/webhook-status').get('processed', 0)
+        started = time.perf_counter()
+        latencies, statuses, send_s = replay(client, deliveries, args.secret, args.concurrency)
+        status = wait_for_processing(client, baseline, statuses.get(200, 0))
+        total_s = time.perf_counter() - started
+
+        print()
+        print(f"Acknowledged: {dict(statuses)} in {send_s:.2f}s ({len(latencies) / send_s:,.0f} deliveries/s)")
+        print(f"Ack latency ms: p50 {percentile(latencies, 50) * 1000:.3f}  p99 {percentile(latencies, 99) * 1000:.3f}  "
+              f"max {latencies[-1] * 1000:.3f}")
+        print(f"All processed after {total_s:.2f}s ({status.get('events', 0) / total_s:,.0f} events/s)")
+        batches = status.get('batches', 0)
+        print(f"Worker: {batches} batches, {status.get('processed', 0) / max(batches, 1):.1f} deliveries/batch, "
+              f"last batch {status.get('last_batch_ms')} ms")
+        print(f"Events: {status.get('events', 0)} stored, {status.get('duplicates', 0)} duplicates, "
+              f"{status.get('unlinked', 0)} unlinked, {status.get('dropped', 0)} dropped")
+
+        if expected and fb_to_post:
+            mismatches = check_activity(client, expected, fb_to_post)
+            if mismatches:
+                print(f"MISMATCH on {len(mismatches)} posts, e.g. {mismatches[0]}")
+                sys.exit(1)
+            print(f"Activity counts match for {len(fb_to_post)} published posts")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
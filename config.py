@@ -7,12 +7,88 @@ class Config:
     
     FB_ACCESS_TOKEN = os.getenv('FB_ACCESS_TOKEN', 'your_facebook_access_token')
     FB_PAGE_ID = os.getenv('FB_PAGE_ID', 'your_facebook_page_id')
+    FB_APP_ID = os.getenv('FB_APP_ID')
+    FB_APP_SECRET = os.getenv('FB_APP_SECRET')
+    FB_WEBHOOK_VERIFY_TOKEN = os.getenv('FB_WEBHOOK_VERIFY_TOKEN')
+    
+    TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv('TOKEN_REFRESH_MARGIN_SECONDS', str(7 * 24 * 3600)))
+    TOKEN_INTROSPECT_INTERVAL_SECONDS = int(os.getenv('TOKEN_INTROSPECT_INTERVAL_SECONDS', '3600'))
     
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
     FACEBOOK_API_VERSION = 'v23.0'
-    FACEBOOK_GRAPH_URL = f'https://graph.facebook.com/{FACEBOOK_API_VERSION}'
+    FACEBOOK_GRAPH_URL = os.getenv('FACEBOOK_GRAPH_URL', f'https://graph.facebook.com/{FACEBOOK_API_VERSION}')
+    
+    GRAPH_CONNECT_TIMEOUT_SECONDS = float(os.getenv('GRAPH_CONNECT_TIMEOUT_SECONDS', '3.05'))
+    GRAPH_READ_TIMEOUT_SECONDS = float(os.getenv('GRAPH_READ_TIMEOUT_SECONDS', '15'))
+    GRAPH_MAX_RETRIES = int(os.getenv('GRAPH_MAX_RETRIES', '2'))
+    GRAPH_BREAKER_FAILURES = int(os.getenv('GRAPH_BREAKER_FAILURES', '5'))
+    GRAPH_BREAKER_RESET_SECONDS = float(os.getenv('GRAPH_BREAKER_RESET_SECONDS', '30'))
+    GRAPH_IDEMPOTENCY_TTL_SECONDS = int(os.getenv('GRAPH_IDEMPOTENCY_TTL_SECONDS', '600'))
+    GRAPH_DEFERRED_MAX = int(os.getenv('GRAPH_DEFERRED_MAX', '1000'))
+    
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+    
+    EVENT_STREAM_MAX_QUEUE = int(os.getenv('EVENT_STREAM_MAX_QUEUE', '100'))
+    EVENT_STREAM_HEARTBEAT_SECONDS = int(os.getenv('EVENT_STREAM_HEARTBEAT_SECONDS', '15'))
+    
+    INSIGHTS_UPDATE_WINDOW_DAYS = int(os.getenv('INSIGHTS_UPDATE_WINDOW_DAYS', '28'))
+    INSIGHTS_MIN_INTERVAL_SECONDS = int(os.getenv('INSIGHTS_MIN_INTERVAL_SECONDS', '3600'))
+    
+    NEWS_SOURCES_FILE = os.getenv('NEWS_SOURCES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'news_sources.json'))
+    NEWS_LATENCY_BUDGET_SECONDS = float(os.getenv('NEWS_LATENCY_BUDGET_SECONDS', '2.5'))
+    NEWS_REFRESH_SECONDS = int(os.getenv('NEWS_REFRESH_SECONDS', '300'))
+    NEWS_MAX_HEADLINES = int(os.getenv('NEWS_MAX_HEADLINES', '5'))
+    NEWS_MAX_FEEDS = int(os.getenv('NEWS_MAX_FEEDS', '200'))
+    
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '6'))
+    TRENDING_TOP_K = int(os.getenv('TRENDING_TOP_K', '20'))
+    TRENDING_SKETCH_WIDTH = int(os.getenv('TRENDING_SKETCH_WIDTH', '8192'))
+    TRENDING_SKETCH_DEPTH = int(os.getenv('TRENDING_SKETCH_DEPTH', '4'))
+    TRENDING_MAX_INDUSTRIES = int(os.getenv('TRENDING_MAX_INDUSTRIES', '50'))
+    
+    ADMISSION_SCRAPE_LIMIT = int(os.getenv('ADMISSION_SCRAPE_LIMIT', '4'))
+    ADMISSION_SCRAPE_QUEUE = int(os.getenv('ADMISSION_SCRAPE_QUEUE', '8'))
+    ADMISSION_PUBLISH_LIMIT = int(os.getenv('ADMISSION_PUBLISH_LIMIT', '8'))
+    ADMISSION_PUBLISH_QUEUE = int(os.getenv('ADMISSION_PUBLISH_QUEUE', '16'))
+    ADMISSION_GENERATE_LIMIT = int(os.getenv('ADMISSION_GENERATE_LIMIT', '16'))
+    ADMISSION_GENERATE_QUEUE = int(os.getenv('ADMISSION_GENERATE_QUEUE', '32'))
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '2'))
+    
+    MEDIA_STORE_DIR = os.getenv('MEDIA_STORE_DIR', 'media_store')
+    MEDIA_STORE_MAX_BYTES = int(os.getenv('MEDIA_STORE_MAX_BYTES', str(1024 ** 3)))
+    MEDIA_MAX_UPLOAD_BYTES = int(os.getenv('MEDIA_MAX_UPLOAD_BYTES', str(10 * 1024 ** 2)))
+    MEDIA_MAX_SIDE = int(os.getenv('MEDIA_MAX_SIDE', '2048'))
+    MAX_CONTENT_LENGTH = MEDIA_MAX_UPLOAD_BYTES + 1024 ** 2
+    
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+    PROFILER_ADMIN_TOKEN = os.getenv('PROFILER_ADMIN_TOKEN')
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', '50'))
+    PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '30'))
+    PROFILER_ALLOW_LOCAL = os.getenv('PROFILER_ALLOW_LOCAL', 'false').lower() == 'true'
+    
+    WEBHOOK_MAX_QUEUE = int(os.getenv('WEBHOOK_MAX_QUEUE', '10000'))
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '500'))
+    WEBHOOK_FLUSH_MS = float(os.getenv('WEBHOOK_FLUSH_MS', '50'))
+    
+    CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', '8'))
+    CRAWL_MAX_BYTES = int(os.getenv('CRAWL_MAX_BYTES', str(2 * 1024 * 1024)))
+    CRAWL_TIME_BUDGET_SECONDS = float(os.getenv('CRAWL_TIME_BUDGET_SECONDS', '8'))
+    
+    DEDUP_MODE = os.getenv('DEDUP_MODE', 'flag')  # 'flag' or 'reject'
+    DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.6'))
+    DEDUP_HISTORY = int(os.getenv('DEDUP_HISTORY', '1000'))
+    
+    CONTENT_POOL_CAPACITY = int(os.getenv('CONTENT_POOL_CAPACITY', '20'))
+    CONTENT_POOL_LOW_WATER = int(os.getenv('CONTENT_POOL_LOW_WATER', '5'))
+    CONTENT_POOL_IDLE_SECONDS = int(os.getenv('CONTENT_POOL_IDLE_SECONDS', '3600'))
+    CONTENT_POOL_MAX_POOLS = int(os.getenv('CONTENT_POOL_MAX_POOLS', '1000'))
+    
+    STREAM_MIN_ITEMS = int(os.getenv('STREAM_MIN_ITEMS', '1000'))
+    
+    FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', '8'))
     
     DEFAULT_INDUSTRY = 'tech'
     DEFAULT_TONE = 'professional'
@@ -20,6 +96,8 @@ class Config:
     
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
+    COLD_START_BUDGET_MS = float(os.getenv('COLD_START_BUDGET_MS', '250'))
+    
     @staticmethod
     def validate_config():
         """Validate configuration settings"""
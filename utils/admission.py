@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import jsonify, request
+
+# Lower value is served first
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class Rejected(Exception):
+    """A request that can't be admitted; `reason` is queue_full, timeout or shed."""
+
+    def __init__(self, limiter, reason, retry_after):
+        super().__init__(f"Too many concurrent '{limiter}' requests, retry in {retry_after}s")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('priority', 'admitted', 'rejected', 'event')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.admitted = False
+        self.rejected = False
+        self.event = threading.Event()
+
+
+class ConcurrencyLimiter:
+    """At most `limit` requests at once, with a bounded priority queue in front.
+
+    A request that finds the limiter full waits up to `max_wait` seconds in
+    a queue of at most `max_queue`; freed slots go to the best priority,
+    first come first served within a priority. When the queue is full a
+    higher-priority arrival displaces the newest lowest-priority waiter,
+    otherwise it is rejected immediately. Rejections carry a Retry-After
+    estimated from the recent service time.
+    """
+
+    def __init__(self, name, limit, max_queue, max_wait=2.0):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.counts = {'admitted': 0, 'queued': 0, 'queue_full': 0, 'timeout': 0, 'shed': 0}
+        self._service_time = 0.5
+        self._wait_time = 0.0
+        self._queue = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free for a new arrival."""
+        backlog = (len(self._queue) + 1) / max(self.limit, 1)
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def acquire(self, priority=PRIORITIES['normal']):
+        with self._lock:
+            if self.active < self.limit and not self._queue:
+                self.active += 1
+                self.counts['admitted'] += 1
+                return
+            if self.max_wait <= 0 or self.max_queue <= 0:
+                self.counts['queue_full'] += 1
+                raise Rejected(self.name, 'queue_full', self.retry_after())
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                if worst[0] <= priority:
+                    self.counts['queue_full'] += 1
+                    raise Rejected(self.name, 'queue_full', self.retry_after())
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst[2].rejected = True
+                worst[2].event.set()
+                self.counts['shed'] += 1
+            waiter = _Waiter(priority)
+            heapq.heappush(self._queue, (priority, next(self._order), waiter))
+            self.counts['queued'] += 1
+
+        started = time.monotonic()
+        waiter.event.wait(self.max_wait)
+        with self._lock:
+            if not waiter.admitted and not waiter.rejected:
+                # Timed out: leave the queue
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                self.counts['timeout'] += 1
+                raise Rejected(self.name, 'timeout', self.retry_after())
+            if waiter.rejected:
+                raise Rejected(self.name, 'shed', self.retry_after())
+            self._wait_time = 0.8 * self._wait_time + 0.2 * (time.monotonic() - started)
+
+    def release(self, service_time=None):
+        with self._lock:
+            if service_time is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            if self._queue:
+                # Hand the slot straight to the next waiter; `active` is unchanged
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.admitted = True
+                self.counts['admitted'] += 1
+                waiter.event.set()
+            else:
+                self.active -= 1
+
+    @contextmanager
+    def slot(self, priority=PRIORITIES['normal']):
+        self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def status(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': self.active,
+                'waiting': len(self._queue),
+                'max_queue': self.max_queue,
+                'avg_service_ms': round(self._service_time * 1000, 1),
+                'avg_wait_ms': round(self._wait_time * 1000, 1),
+                **self.counts,
+            }
+
+
+class AdmissionControl:
+    """Named concurrency limiters for expensive routes.
+
+    Routes opt in with `@admission.limit(name)`; everything else is admitted
+    unconditionally, so an overloaded expensive route can't take the worker
+    threads that cheap routes need. Clients can lower or raise their place in
+    a queue with the `X-Request-Priority` header (high, normal or low).
+    """
+
+    def __init__(self, limiters=None):
+        self.limiters = {}
+        for name, options in (limiters or {}).items():
+            self.add(name, **options)
+
+    def add(self, name, limit, max_queue, max_wait=2.0):
+        self.limiters[name] = ConcurrencyLimiter(name, limit, max_queue, max_wait)
+        return self.limiters[name]
+
+    @staticmethod
+    def request_priority(default='normal'):
+        value = (request.headers.get('X-Request-Priority') or default).lower()
+        return PRIORITIES.get(value, PRIORITIES[default])
+
+    def limit(self, name, priority='normal'):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                limiter = self.limiters.get(name)
+                if limiter is None:
+                    return view(*args, **kwargs)
+                try:
+                    with limiter.slot(self.request_priority(priority)):
+                        return view(*args, **kwargs)
+                except Rejected as e:
+                    return too_many_requests(e)
+            return wrapper
+        return decorator
+
+    def status(self):
+        return {name: limiter.status() for name, limiter in self.limiters.items()}
+
+
+def too_many_requests(error):
+    response = jsonify({'error': str(error), 'reason': error.reason, 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
@@ -1,6 +1,6 @@
 import requests
-from bs4 import BeautifulSoup
 import random, re
+from utils.text_extract import extract_text
 
 UserAgents = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
@@ -10,35 +10,74 @@ UserAgents = [
     'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.7204.180 Mobile Safari/537.36'
 ]
 
-def url_scrape(url):
+def url_scrape(url, crawl=False, crawl_options=None, on_page_text=None):
+    html = fetch_page(url)
+    if html is None:
+        return None
+    return analyze_page(url, html, crawl, crawl_options, on_page_text), 200
+
+
+def fetch_page(url, timeout=10):
+    """Raw HTML of `url`, or None if it can't be fetched."""
     try:
         headers = {'user-agent': f"{random.choice(UserAgents)}"}
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=headers, timeout=timeout)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        return response.content
     except requests.exceptions.RequestException as e:
         print(f"Error: {e}")
         return None
+
+
+def analyze_page(url, html, crawl=False, crawl_options=None, on_page_text=None):
+    """Business name, industry, services and tone from a fetched homepage.
+
+    Pure parsing unless `crawl` is set, so it can run in a worker process.
+    """
+    from bs4 import BeautifulSoup
     
-    title_1 = soup.title.string.strip() if soup.title else None
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    title_1 = soup.title.string.strip() if soup.title and soup.title.string else None
     title_2 = soup.find("meta", {"property": "og:site_name"})
     og_site_name = title_2.get("content") if title_2 else None
-    title, cleaned_title = clean_title(title_1 or og_site_name)
+    title, cleaned_title = clean_title(title_1 or og_site_name) or (None, None)
     if not title:
         title = url
     
-    text_content = soup.get_text(separator=' ', strip=True)
+    # One lowercased, boilerplate-free buffer is shared by every analyzer
+    text_content = extract_text(soup).text
     
-    industry = find_industry(title, cleaned_title, text_content)
-    services = find_services(soup, text_content)
+    industry_scores = classify_industry(title, cleaned_title, text_content)
+    top_industry, top_score = industry_scores[0]
+    industry = top_industry if top_score >= INDUSTRY_MIN_CONFIDENCE else "Business"
+    services = collect_services(soup, text_content)
     tone = find_tone(text_content)
+    page_texts = [text_content]
+    
+    if crawl:
+        from utils.site_crawler import crawl_site
+        
+        # Services and menus usually live on subpages, so merge what they list
+        pages = crawl_site(url, soup, UserAgents, lambda html: BeautifulSoup(html, 'html.parser'), **(crawl_options or {}))
+        for page in pages:
+            page_text = extract_text(page).text
+            services |= collect_services(page, page_text)
+            page_texts.append(page_text)
+    
+    if on_page_text:
+        for page_text in page_texts:
+            on_page_text(industry, page_text)
+    
+    services = ", ".join(sorted(services)) if services else "General Services"
     
     return {
         "Name": title,
         "Industry": industry,
         "Services": services if services else "Not Found",
+        "Industry scores": [{"industry": label, "score": round(score, 3)} for label, score in industry_scores],
         "Tone of voice": tone
-    }, 200
+    }
     
     
 def clean_title(raw_title):
@@ -54,41 +93,26 @@ def clean_title(raw_title):
     
     return title.strip(), cleaned_title
 
-def find_industry(title, cleaned_title, text_content):
-    industry_list = {
-        "gym": "Fitness",
-        "salon": "Beauty",
-        "cafe": "Cafe",
-        "coffee": "Cafe",
-        "restaurant": "Restaurant",
-        "law": "Legal",
-        "real estate": "Real Estate",
-        "hotel": "rooms",
-        "hospital": "doctor"
-    }
-    
-    industry = None
-    business_title = title.lower()
-    business_title1 = cleaned_title.lower()
-    text_content = text_content.lower()
+# Below this probability the page is reported as a generic business
+INDUSTRY_MIN_CONFIDENCE = 0.3
+
+def classify_industry(title, cleaned_title, text_content, k=3):
+    from utils.industry_classifier import get_classifier
     
-    for keyword, info in industry_list.items():
-        if keyword in business_title1:
-            industry = info
-            break
+    # The title is the strongest signal, so it is repeated to weigh more
+    name = cleaned_title or title or ""
+    return get_classifier().classify(f"{name} {name} {name} {text_content}", k)
 
-    if industry is None:
-        for keyword, info in industry_list.items():
-            if keyword in text_content.lower():
-                industry = info
-                break
-            
-    if industry is None:
-        industry = "Business"
-        
-    return industry
+def find_industry(title, cleaned_title, text_content):
+    label, score = classify_industry(title, cleaned_title, text_content, k=1)[0]
+    return label if score >= INDUSTRY_MIN_CONFIDENCE else "Business"
+
+def find_services(soup, text_content):
+    """`text_content` is the lowercased page text from `extract_text`."""
+    services = sorted(collect_services(soup, text_content))
+    return ", ".join(services) if services else "General Services"
 
-def find_services(soup, text_content):    
+def collect_services(soup, text_content):    
     fitness_keywords = [
         "training", "personal trainer", "class", "yoga", "zumba", "cycling", "spin",
         "crossfit", "physiotherapy", "recovery", "assessment", "weight loss",
@@ -124,26 +148,27 @@ def find_services(soup, text_content):
     ]
     
     service_list = list(set(fitness_keywords+salon_keywords+cafe_keywords+restaurant_keywords+real_estate_keywords+hotel_keywords))
+    section_marker = re.compile("|".join(re.escape(keyword) for keyword in service_list))
  
     services = set()
+    # One walk over the tree finds every section whose id/class names a service
+    for tag in soup.find_all(True):
+        marker = f"{tag.get('id', '') or ''} {' '.join(tag.get('class', []))}"
+        if not marker.strip() or not section_marker.search(marker.lower()):
+            continue
+        for item in tag.find_all(['li', 'h3', 'p']):
+            text = item.get_text(strip=True)
+            if 3 < len(text.split()) < 10:
+                services.add(text)
+    
     for keyword in service_list:
-        sections = soup.find_all(lambda tag: keyword.lower() in (tag.get("id", "") or "").lower() 
-                                 or keyword.lower() in ' '.join(tag.get("class", [])).lower()
-                                )
-        for section in sections:
-            items = section.find_all(['li', 'h3', 'p'])
-            for item in items:
-                text = item.get_text(strip=True)
-                if 3 < len(text.split()) < 10:
-                    services.add(text)
-        
-        if keyword.lower() in text_content.lower():
+        if keyword in text_content:
             services.add(keyword.title())
     
-    services = sorted(list(services))
-    return ", ".join(services) if services else "General Services"
+    return services
 
 def find_tone(text_content):
+    """`text_content` is the lowercased page text from `extract_text`."""
     tone_list = {
         "Friendly": ["welcome", "friendly", "enjoy", "fun", "smile", "hi", "hello", "join", "love", "happy", "comfortable"],
         "Professional": ["certified", "trusted", "professional", "expert", "experienced", "solutions", "team", "reliable", "quality", "trained"],
@@ -157,7 +182,7 @@ def find_tone(text_content):
     tone_matches = {tone: 0 for tone in tone_list}
     for tone, keywords in tone_list.items():
         for keyword in keywords:
-            tone_matches[tone] += text_content.lower().count(keyword)
+            tone_matches[tone] += text_content.count(keyword)
             
     sorted_tones = sorted(tone_matches.items(), key=lambda x: -x[1])
     tone = [tone for tone, count in sorted_tones if count > 0][:2]
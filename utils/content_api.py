@@ -2,7 +2,17 @@ import requests
 import random
 
 
-def get_industry_news(industry):
+def get_industry_news(industry, aggregator=None):
+    if aggregator is not None:
+        # In-process: skip the HTTP round trip to our own /api/news
+        headlines = aggregator.headlines(industry)
+        return headlines or [
+            f"Latest {industry} trends and developments",
+            f"New innovations in {industry} sector",
+            f"Industry insights for {industry} professionals",
+            f"Breaking news in {industry}",
+            f"Expert analysis on {industry} market"
+        ]
     try:
         payload = {"industry": industry}
         # Use the correct endpoint on the same server
@@ -95,7 +105,7 @@ def generate_content(profile, news, tone, post_type, frequency):
 
     return posts
 
-def generate_ai_content(industry, tone, content_type):
+def generate_ai_content(industry, tone, content_type, hashtags=None):
     content_templates = {
         'fitness': {
             'professional': [
@@ -221,7 +231,7 @@ def generate_ai_content(industry, tone, content_type):
     content = template.format(industry=industry)
     
     if content_type == 'trending':
-        hashtags = {
+        fixed_hashtags = {
             'fitness': ['#FitnessGoals', '#WorkoutMotivation', '#HealthyLifestyle'],
             'beauty': ['#BeautyTrends', '#MakeupInspiration', '#SelfCare'],
             'healthcare': ['#Healthcare', '#Wellness', '#HealthyLiving'],
@@ -230,7 +240,14 @@ def generate_ai_content(industry, tone, content_type):
             'food': ['#Foodie', '#Delicious', '#Culinary'],
             'education': ['#Learning', '#Education', '#Knowledge']
         }
-        content += f"\n\n{' '.join(hashtags.get(industry, ['#Trending', '#Innovation']))}"
+        # Live trending tags when there are any, else the industry's evergreen ones
+        tags = list(hashtags or [])
+        for tag in fixed_hashtags.get(industry, ['#Trending', '#Innovation']):
+            if len(tags) >= 3:
+                break
+            if tag.lower() not in {t.lower() for t in tags}:
+                tags.append(tag)
+        content += f"\n\n{' '.join(tags)}"
     
     return content
 
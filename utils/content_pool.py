@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+def profile_key(profile, tone, post_type):
+    """Stable key for a (profile, tone, post_type) pool."""
+    identity = {
+        'name': profile.get('name'),
+        'industry': profile.get('industry'),
+        'services': sorted(profile.get('services') or []),
+    }
+    digest = hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:16]
+    return (digest, tone, post_type)
+
+
+class _Pool:
+    __slots__ = ('profile', 'tone', 'post_type', 'posts', 'last_used')
+
+    def __init__(self, profile, tone, post_type):
+        self.profile = profile
+        self.tone = tone
+        self.post_type = post_type
+        self.posts = deque()
+        self.last_used = time.time()
+
+
+class ContentPool:
+    """Buffers of ready-made posts per (profile, tone, post_type).
+
+    `take` pops from the buffer and only generates inline for whatever the
+    buffer can't cover. A buffer never holds the same post twice and a
+    response never repeats one, unless more posts are asked for than the
+    profile can produce distinctly. When a buffer drops below `low_water` it is queued for
+    the background worker, which tops it back up to `capacity`. Pools unused
+    for `idle_ttl` seconds are dropped, and at most `max_pools` are kept
+    (least recently used go first). Buffered posts older than `max_age`
+    seconds are discarded so news-based updates don't go stale.
+    """
+
+    def __init__(self, generate, capacity=20, low_water=5, idle_ttl=3600, max_pools=1000, max_age=6 * 3600,
+                 attempts=3):
+        self.generate = generate
+        self.attempts = attempts
+        self.max_age = max_age
+        self.capacity = capacity
+        self.low_water = low_water
+        self.idle_ttl = idle_ttl
+        self.max_pools = max_pools
+        self._pools = OrderedDict()
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def _pool(self, profile, tone, post_type):
+        key = profile_key(profile, tone, post_type)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _Pool(dict(profile, services=list(profile.get('services') or [])), tone, post_type)
+            self._pools[key] = pool
+            while len(self._pools) > self.max_pools:
+                evicted, _ = self._pools.popitem(last=False)
+                self._pending.pop(evicted, None)
+        self._pools.move_to_end(key)
+        pool.last_used = time.time()
+        return key, pool
+
+    def take(self, profile, tone, post_type, count):
+        with self._lock:
+            key, pool = self._pool(profile, tone, post_type)
+            cutoff = time.time() - self.max_age
+            while pool.posts and pool.posts[0][0] < cutoff:
+                pool.posts.popleft()
+            posts = [pool.posts.popleft()[1] for _ in range(min(count, len(pool.posts)))]
+            if len(pool.posts) < self.low_water:
+                self._schedule(key)
+
+        if len(posts) == count:
+            self.hits += 1
+            return posts
+
+        self.misses += 1
+        shortfall = count - len(posts)
+        fresh = self._generate_distinct(pool.profile, tone, post_type, shortfall, exclude=posts)
+        posts += fresh
+        if len(fresh) < shortfall:
+            # The profile has fewer distinct posts than requested; repeat as generate_content does
+            posts += self.generate(dict(pool.profile, services=list(pool.profile['services'])),
+                                   tone, post_type, shortfall - len(fresh))
+        return posts
+
+    def _generate_distinct(self, profile, tone, post_type, count, exclude=()):
+        """Up to `count` posts that differ from each other and from `exclude`.
+
+        The generator samples with replacement once asked for more posts than
+        it has items. Each call asks for enough posts to cover the ones
+        already seen, and calls repeat until no new post turns up.
+        """
+        seen = set(exclude)
+        fresh = []
+        for _ in range(self.attempts):
+            added = 0
+            for post in self.generate(dict(profile, services=list(profile['services'])),
+                                      tone, post_type, len(seen) + count - len(fresh)):
+                if post not in seen:
+                    seen.add(post)
+                    fresh.append(post)
+                    added += 1
+            if len(fresh) >= count or not added:
+                break
+        return fresh[:count]
+
+    def warm(self, profile, tone, post_type):
+        with self._lock:
+            key, _ = self._pool(profile, tone, post_type)
+            self._schedule(key)
+
+    def _schedule(self, key):
+        if key not in self._pending:
+            self._pending[key] = True
+            self._wakeup.notify()
+        self._start()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='content-pool', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pools': len(self._pools),
+                'buffered_posts': sum(len(pool.posts) for pool in self._pools.values()),
+                'pending_refills': len(self._pending),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def evict_idle(self, now=None):
+        cutoff = (now or time.time()) - self.idle_ttl
+        with self._lock:
+            idle = [key for key, pool in self._pools.items() if pool.last_used < cutoff]
+            for key in idle:
+                del self._pools[key]
+                self._pending.pop(key, None)
+        return len(idle)
+
+    def _run(self):
+        last_sweep = time.time()
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait(timeout=60)
+                    if time.time() - last_sweep > 60:
+                        break
+                key = next(iter(self._pending), None)
+                pool = self._pools.get(key) if key else None
+                missing = self.capacity - len(pool.posts) if pool else 0
+                buffered = [post for _, post in pool.posts] if pool else []
+
+            if time.time() - last_sweep > 60:
+                self.evict_idle()
+                last_sweep = time.time()
+            if key is None:
+                continue
+
+            if missing > 0:
+                try:
+                    fresh = self._generate_distinct(pool.profile, pool.tone, pool.post_type, missing,
+                                                    exclude=buffered)
+                except Exception as e:
+                    logger.error(f"Error refilling content pool: {e}")
+                    fresh = []
+                with self._lock:
+                    # The pool may have been evicted while generating
+                    if self._pools.get(key) is pool:
+                        created = time.time()
+                        buffered = {post for _, post in pool.posts}
+                        fresh = [post for post in fresh if post not in buffered]
+                        pool.posts.extend((created, post) for post in fresh[:self.capacity - len(pool.posts)])
+
+            with self._lock:
+                self._pending.pop(key, None)
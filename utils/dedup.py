@@ -0,0 +1,119 @@
+import re
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+# Mersenne prime for the universal hash family; keeps a*x + b inside uint64
+PRIME = (1 << 31) - 1
+WORD_RE = re.compile(r"[a-z0-9#]+")
+
+
+def shingles(text, size=3):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """MinHash + LSH index of post content, partitioned by page.
+
+    Each post gets a `num_perm` MinHash signature split into `bands` bands.
+    Posts sharing any band bucket on the same page are candidates, and the
+    fraction of equal signature slots estimates their Jaccard similarity.
+    Only the last `history` posts per page are kept in the buckets. Text
+    without any words has no signature; it is neither indexed nor matched,
+    so blank drafts aren't duplicates of each other.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.6, history=1000, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.history = history
+        self._buckets = {}
+        self._signatures = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, text):
+        """MinHash signature of the text, or None if it has no words."""
+        tokens = shingles(text)
+        if not tokens:
+            return None
+        hashes = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME).min(axis=1)
+
+    def _band_keys(self, page_id, signature):
+        view = signature.reshape(self.bands, self.rows)
+        return [(page_id or '', band, view[band].tobytes()) for band in range(self.bands)]
+
+    def find(self, content, page_id=None, signature=None, exclude=None):
+        """Near-duplicates of `content` on the page as [(post_id, similarity)], best first.
+
+        `exclude` is left out of the matches, for the id the content is about to be stored under.
+        """
+        signature = self.signature(content) if signature is None else signature
+        if signature is None:
+            return []
+        candidates = set()
+        with self._lock:
+            for key in self._band_keys(page_id, signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(exclude)
+            matches = []
+            for post_id in candidates:
+                similarity = float((self._signatures[post_id][1] == signature).mean())
+                if similarity >= self.threshold:
+                    matches.append((post_id, round(similarity, 3)))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, post_id, content, page_id=None, signature=None):
+        signature = self.signature(content) if signature is None else signature
+        with self._lock:
+            existed = post_id in self._signatures
+            if existed:
+                self._remove(post_id)
+            if signature is None:
+                return
+            self._signatures[post_id] = (page_id or '', signature)
+            for key in self._band_keys(page_id, signature):
+                self._buckets.setdefault(key, set()).add(post_id)
+
+            if not existed:
+                recent = self._recent.setdefault(page_id or '', deque())
+                recent.append(post_id)
+                while len(recent) > self.history:
+                    old = recent.popleft()
+                    if old in self._signatures:
+                        self._remove(old)
+
+    def remove(self, post_id):
+        with self._lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id):
+        page_id, signature = self._signatures.pop(post_id)
+        for key in self._band_keys(page_id, signature):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(post_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def check_and_add(self, post_id, content, page_id=None):
+        """Record the post and return the near-duplicates it had before being added."""
+        signature = self.signature(content)
+        matches = self.find(content, page_id, signature, exclude=post_id)
+        self.add(post_id, content, page_id, signature)
+        return matches
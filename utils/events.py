@@ -0,0 +1,87 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.evicted = False
+
+
+class EventBroker:
+    """Fan-out of server-sent events to dashboard connections.
+
+    Each event is serialized once into an SSE frame and the same string is
+    handed to every subscriber. Subscribers have a bounded queue; one that
+    falls behind by more than `max_queue` events is evicted and its stream
+    ends, so a slow client can't hold memory or slow down publishers.
+    """
+
+    def __init__(self, max_queue=100, history=256, heartbeat=15):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, last_event_id=None):
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                # Replay what the client missed while reconnecting
+                missed = [frame for event_id, frame in self._history if event_id > last_event_id]
+                for frame in missed[-self.max_queue:]:
+                    subscriber.queue.put_nowait(frame)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data=None):
+        with self._lock:
+            event_id = next(self._ids)
+            frame = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data or {})}\n\n"
+            self._history.append((event_id, frame))
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(frame)
+            except queue.Full:
+                self._evict(subscriber)
+
+    def _evict(self, subscriber):
+        self.unsubscribe(subscriber)
+        subscriber.evicted = True
+        with subscriber.queue.mutex:
+            subscriber.queue.queue.clear()
+        subscriber.queue.put_nowait(None)
+        logger.warning("Evicted slow event stream subscriber")
+
+    def stream(self, subscriber):
+        """Generator of SSE frames for one subscriber, with keepalive comments."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    frame = subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
@@ -0,0 +1,342 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes that mean "not processed, try again"
+RETRYABLE_CODES = frozenset([1, 2])
+# Throttling codes: count against the breaker but never retry straight away
+THROTTLE_CODES = frozenset([4, 17, 32, 341, 613])
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling Graph while an endpoint's breaker is open."""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Graph API '{endpoint}' endpoint is unavailable, retry in {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CallInProgress(CircuitOpenError):
+    """An identical call is still in flight after waiting for it; its outcome isn't known yet."""
+
+    def __init__(self, key, retry_after):
+        Exception.__init__(self, f"Graph call {key} is still in progress, retry in {retry_after:.0f}s")
+        self.endpoint = None
+        self.key = key
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one Graph endpoint.
+
+    After `failure_threshold` failures in a row the breaker opens and calls
+    fail immediately. Once `reset_timeout` has passed a single probe call is
+    let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self, now=None):
+        return max(0.0, self.opened_at + self.reset_timeout - (now or time.time()))
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.time()
+            if self.state == OPEN and self.retry_after(now) > 0:
+                raise CircuitOpenError(self.name, self.retry_after(now))
+            if self._probing:
+                raise CircuitOpenError(self.name, 1)
+            self.state = HALF_OPEN
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for Graph '{self.name}' closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for Graph '{self.name}' opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def is_open(self):
+        return self.state == OPEN and self.retry_after() > 0
+
+    def status(self):
+        return {
+            'state': OPEN if self.is_open() else (HALF_OPEN if self.state != CLOSED else CLOSED),
+            'consecutive_failures': self.failures,
+            'retry_after': round(self.retry_after(), 1) if self.state == OPEN else 0,
+        }
+
+
+class IdempotencyTracker:
+    """Remembers successful calls by key so they aren't sent twice.
+
+    A call whose key already succeeded within `ttl` seconds gets the stored
+    response back. A second call while the first is still in flight waits
+    for it and shares its outcome, for at most `wait_timeout` seconds; then
+    it gets CallInProgress rather than sending the call again. Only
+    completed entries are evicted to stay within `max_entries`.
+    """
+
+    def __init__(self, ttl=600, max_entries=10000, wait_timeout=60):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Return (True, None) if the caller should make the call, else (False, response)."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry['response'] is not None and time.time() - entry['at'] > self.ttl:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    self._entries[key] = {'done': threading.Event(), 'response': None, 'at': time.time()}
+                    self._evict()
+                    return True, None
+                if entry['response'] is not None:
+                    return False, entry['response']
+                done = entry['done']
+            # Wait for the in-flight call; if it failed, the key is free again
+            if not done.wait(self.wait_timeout):
+                raise CallInProgress(key, self.wait_timeout)
+
+    def _evict(self):
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        # Evicting an in-flight entry would let a duplicate call through
+        stale = []
+        for key, entry in self._entries.items():
+            if len(stale) == excess:
+                break
+            if entry['response'] is not None:
+                stale.append(key)
+        for key in stale:
+            del self._entries[key]
+
+    def complete(self, key, response):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if response is not None:
+                entry['response'] = response
+                entry['at'] = time.time()
+            else:
+                del self._entries[key]
+            entry['done'].set()
+
+
+class DeferredQueue:
+    """Bounded queue of Graph work held back while a breaker is open.
+
+    Each job is retried by a background thread once its endpoint's breaker
+    lets calls through again; `on_done` receives the job's return value.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._jobs = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def put(self, endpoint, job, on_done=None):
+        with self._lock:
+            if len(self._jobs) >= self.max_size:
+                return False
+            self._jobs.append((endpoint, job, on_done))
+            self._wakeup.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='graph-deferred', daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._jobs:
+                    self._wakeup.wait()
+                endpoint, job, on_done = self._jobs.popleft()
+            try:
+                result = job()
+            except CircuitOpenError as e:
+                with self._lock:
+                    self._jobs.appendleft((endpoint, job, on_done))
+                time.sleep(max(e.retry_after, 0.5))
+                continue
+            except Exception as e:
+                logger.error(f"Deferred Graph job for '{endpoint}' failed: {e}")
+                continue
+            if on_done:
+                try:
+                    on_done(result)
+                except Exception as e:
+                    logger.error(f"Error completing deferred Graph job for '{endpoint}': {e}")
+
+
+class GraphClient:
+    """Graph API calls behind per-endpoint circuit breakers.
+
+    Retries use full-jitter exponential backoff. GETs are retried on any
+    transient failure; POSTs only when the request provably wasn't processed
+    (connect timeout, or a Graph error marked transient), so a post is never
+    sent twice by a retry. Passing an `idempotency_key` additionally
+    deduplicates repeated calls made by the caller.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=15, max_retries=2, backoff_base=0.5,
+                 backoff_cap=4, failure_threshold=5, reset_timeout=30, idempotency_ttl=600,
+                 deferred_max=1000):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Longest an in-flight POST can take: each attempt up to both timeouts plus its backoff
+        self.idempotency = IdempotencyTracker(
+            idempotency_ttl, wait_timeout=(connect_timeout + read_timeout + backoff_cap) * (max_retries + 1)
+        )
+        self.deferred = DeferredQueue(deferred_max)
+        self.session = requests.Session()
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    endpoint, CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+                )
+        return breaker
+
+    def is_open(self, *endpoints):
+        return any(self.breaker(endpoint).is_open() for endpoint in endpoints)
+
+    def get(self, endpoint, url, **kwargs):
+        return self.request('GET', endpoint, url, **kwargs)
+
+    def post(self, endpoint, url, idempotency_key=None, **kwargs):
+        if idempotency_key is None:
+            return self.request('POST', endpoint, url, **kwargs)
+
+        should_call, response = self.idempotency.claim(idempotency_key)
+        if not should_call:
+            logger.info(f"Skipping repeated Graph '{endpoint}' call {idempotency_key}")
+            return response
+        response = None
+        try:
+            response = self.request('POST', endpoint, url, **kwargs)
+        finally:
+            self.idempotency.complete(idempotency_key, response if response is not None and response.ok else None)
+        return response
+
+    def request(self, method, endpoint, url, **kwargs):
+        breaker = self.breaker(endpoint)
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            breaker.before_call()
+            _rewind(kwargs.get('files'))
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectTimeout:
+                breaker.record_failure()
+                if self._give_up(breaker, attempt):
+                    raise
+            except (requests.Timeout, requests.ConnectionError):
+                breaker.record_failure()
+                # The request may have been processed; only reads are safe to repeat
+                if method != 'GET' or self._give_up(breaker, attempt):
+                    raise
+            except requests.RequestException:
+                breaker.record_failure()
+                raise
+            else:
+                code, transient = _graph_error(response)
+                if not transient:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                retryable = code not in THROTTLE_CODES and (method == 'GET' or code in RETRYABLE_CODES)
+                if not retryable or self._give_up(breaker, attempt):
+                    return response
+
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+            logger.warning(f"Retrying Graph '{endpoint}' call in {delay:.2f}s (attempt {attempt + 2})")
+            time.sleep(delay)
+
+    def _give_up(self, breaker, attempt):
+        # No point backing off for a retry the open breaker would refuse
+        return attempt == self.max_retries or breaker.is_open()
+
+    def defer(self, endpoint, job, on_done=None):
+        return self.deferred.put(endpoint, job, on_done)
+
+    def status(self):
+        return {
+            'breakers': {name: breaker.status() for name, breaker in list(self._breakers.items())},
+            'deferred': len(self.deferred),
+        }
+
+
+def _rewind(files):
+    """Seek file objects back to the start so a retry re-sends the whole upload."""
+    for value in (files or {}).values():
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+
+
+def _graph_error(response):
+    """(error code, transient) for a Graph response; transient failures count against the breaker."""
+    if response.status_code < 400:
+        return None, False
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    error = (body.get('error') if isinstance(body, dict) else None) or {}
+    code = error.get('code')
+    transient = (response.status_code >= 500 or error.get('is_transient')
+                 or code in RETRYABLE_CODES or code in THROTTLE_CODES)
+    return code, bool(transient)
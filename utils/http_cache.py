@@ -0,0 +1,169 @@
+import gzip
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+from utils.serialization import wants_ndjson
+
+# Versions restart at zero on every process start, so ETags carry a boot id
+# to avoid matching a tag handed out by a previous process.
+BOOT_ID = uuid.uuid4().hex[:8]
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/css',
+                      'application/javascript')
+
+
+class CollectionVersions:
+    """Monotonic change counters for the in-memory collections."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, name):
+        return self._versions.get(name, 0)
+
+    def etag(self, *names):
+        return '-'.join([BOOT_ID] + [f"{name}.{self.get(name)}" for name in names])
+
+
+collection_versions = CollectionVersions()
+
+
+def conditional(*collections, negotiated=False):
+    """Serve a 304 for unchanged collections without calling the view.
+
+    The ETag is computed before the view runs, so a change that lands during
+    serialization only makes the next poll refetch. With `negotiated`, the
+    view can also answer in NDJSON, so the tag names the representation and
+    the response varies on Accept.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = collection_versions.etag(*collections)
+            if negotiated and wants_ndjson():
+                etag = f"{etag}-ndjson"
+            # Compressed representations carry an encoding suffix on the tag
+            for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+                if request.if_none_match.contains(candidate):
+                    response = make_response('', 304)
+                    response.set_etag(candidate)
+                    break
+            else:
+                response = make_response(view(*args, **kwargs))
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            if negotiated:
+                response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+
+class _CompressedCache:
+    """Small LRU of compressed bodies keyed by (etag, encoding)."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_compressed_cache = _CompressedCache()
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def choose_encoding(accept_encodings):
+    if accept_encodings['br'] and _brotli() is not None:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def compress_response(response, min_size=1024):
+    """Compress text responses above `min_size` bytes with brotli or gzip.
+
+    Streamed responses are gzip-compressed chunk by chunk as they are sent.
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        if not request.accept_encodings['gzip']:
+            return response
+        response.response = _gzip_stream(response.response)
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, _ = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-gzip")
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    etag, _ = response.get_etag()
+    key = (etag, encoding) if etag else None
+    compressed = _compressed_cache.get(key) if key else None
+    if compressed is None:
+        if encoding == 'br':
+            compressed = _brotli().compress(body, quality=5)
+        else:
+            compressed = gzip.compress(body, compresslevel=6)
+        if key:
+            _compressed_cache.put(key, compressed)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # A compressed representation needs its own strong validator
+        response.set_etag(f"{etag}-{encoding}")
+    return response
@@ -0,0 +1,201 @@
+"""TF-IDF weighted naive Bayes industry classifier.
+
+Train from the labeled corpus with:
+    python -m utils.industry_classifier [corpus.jsonl] [model.npz]
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+CORPUS_PATH = os.path.join(DATA_DIR, 'industry_corpus.jsonl')
+MODEL_PATH = os.path.join(DATA_DIR, 'industry_model.npz')
+
+# Only the start of a page is scored; it carries the signal and bounds the cost
+MAX_CHARS = 20000
+
+# Documents matching few known terms are shrunk towards the prior, so a single
+# ambiguous word can't produce a confident label
+EVIDENCE_TERMS = 8
+
+TOKEN_RE = re.compile(r"[a-z]+(?:-[a-z]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or our the this to we with you your "
+    "us all any can get more new now out see than that their them then there these they up was will".split()
+)
+
+
+def tokenize(text):
+    words = [w for w in TOKEN_RE.findall(text[:MAX_CHARS].lower()) if w not in STOPWORDS and len(w) > 1]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IndustryClassifier:
+    def __init__(self, labels, vocab, idf, weights, log_prior, temperature=1.0):
+        self.labels = list(labels)
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.idf = idf
+        self.weights = weights
+        self.log_prior = log_prior
+        self.temperature = temperature
+
+    def _vectorize(self, texts):
+        """CSR arrays (indptr, indices, data) of normalized sublinear TF-IDF."""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            counts = {}
+            for token in tokenize(text):
+                i = self.vocab.get(token)
+                if i is not None:
+                    counts[i] = counts.get(i, 0) + 1
+            cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * self.idf[cols]
+            norm = np.sqrt((values ** 2).sum())
+            if norm:
+                values *= len(cols) / (len(cols) + EVIDENCE_TERMS) / norm
+            indices.append(cols)
+            data.append(values)
+            indptr.append(indptr[-1] + len(cols))
+        return (np.asarray(indptr),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+                np.concatenate(data) if data else np.zeros(0))
+
+    def decision(self, texts):
+        """Raw (documents x labels) scores."""
+        indptr, indices, data = self._vectorize(texts)
+        scores = np.tile(self.log_prior, (len(texts), 1))
+        if len(indices):
+            contributions = data[:, None] * self.weights[indices]
+            starts = indptr[:-1]
+            nonempty = indptr[1:] > starts
+            scores[nonempty] += np.add.reduceat(contributions, starts[nonempty], axis=0)
+        return scores
+
+    def predict_proba(self, texts):
+        scores = self.decision(texts) / self.temperature
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def top_k(self, texts, k=3):
+        """For each text, the k most likely (label, probability) pairs."""
+        probs = self.predict_proba(texts)
+        order = np.argsort(-probs, axis=1)[:, :k]
+        return [[(self.labels[j], float(row[j])) for j in idx] for row, idx in zip(probs, order)]
+
+    def classify(self, text, k=3):
+        return self.top_k([text], k)[0]
+
+    def save(self, path):
+        inverse_vocab = sorted(self.vocab, key=self.vocab.get)
+        # Written aside and renamed, so a crash can't leave a truncated model to load
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, labels=np.array(self.labels), vocab=np.array(inverse_vocab), idf=self.idf,
+                     weights=self.weights, log_prior=self.log_prior, temperature=np.array(self.temperature))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['labels'].tolist(), data['vocab'].tolist(), data['idf'], data['weights'],
+                       data['log_prior'], float(data['temperature']))
+
+
+def fit(texts, y, labels, min_df=1, alpha=0.1):
+    docs = [tokenize(text) for text in texts]
+    df = {}
+    for tokens in docs:
+        for token in set(tokens):
+            df[token] = df.get(token, 0) + 1
+    vocab = sorted(term for term, count in df.items() if count >= min_df)
+    n_docs = len(docs)
+    idf = np.array([np.log((1 + n_docs) / (1 + df[term])) + 1 for term in vocab])
+
+    model = IndustryClassifier(labels, vocab, idf, np.zeros((len(vocab), len(labels))), np.zeros(len(labels)))
+    indptr, indices, data = model._vectorize(texts)
+
+    # Class-conditional TF-IDF mass -> smoothed log likelihoods
+    rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+    feature_mass = np.zeros((len(vocab), len(labels)))
+    np.add.at(feature_mass, (indices, y[rows]), data)
+    log_likelihood = np.log((feature_mass + alpha) / (feature_mass + alpha).sum(axis=0))
+    # Centering per term keeps only what distinguishes industries
+    model.weights = log_likelihood - log_likelihood.mean(axis=1, keepdims=True)
+    model.log_prior = np.log(np.bincount(y, minlength=len(labels)) / n_docs)
+    return model
+
+
+def train(corpus_path=CORPUS_PATH, folds=4, seed=0):
+    with open(corpus_path) as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    labels = sorted({e['industry'] for e in examples})
+    label_index = {label: i for i, label in enumerate(labels)}
+    texts = [e['text'] for e in examples]
+    y = np.array([label_index[e['industry']] for e in examples])
+
+    # Out-of-fold scores so the temperature is calibrated on unseen text
+    fold_of = np.random.default_rng(seed).permutation(len(texts)) % folds
+    held_out_scores = np.zeros((len(texts), len(labels)))
+    for fold in range(folds):
+        train_idx = np.nonzero(fold_of != fold)[0]
+        test_idx = np.nonzero(fold_of == fold)[0]
+        fold_model = fit([texts[i] for i in train_idx], y[train_idx], labels)
+        held_out_scores[test_idx] = fold_model.decision([texts[i] for i in test_idx])
+
+    model = fit(texts, y, labels)
+    model.temperature = fit_temperature(held_out_scores, y)
+    return model
+
+
+def fit_temperature(scores, y):
+    """Temperature minimising negative log likelihood of held-out scores."""
+    best, best_nll = 1.0, np.inf
+    for temperature in np.geomspace(0.01, 10, 120):
+        scaled = scores / temperature
+        scaled = scaled - scaled.max(axis=1, keepdims=True)
+        log_probs = scaled - np.log(np.exp(scaled).sum(axis=1, keepdims=True))
+        nll = -log_probs[np.arange(len(y)), y].mean()
+        if nll < best_nll:
+            best, best_nll = float(temperature), nll
+    return best
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_classifier():
+    """Load the trained model, training it from the corpus the first time."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if os.path.exists(MODEL_PATH):
+                _model = IndustryClassifier.load(MODEL_PATH)
+            else:
+                _model = train()
+                try:
+                    _model.save(MODEL_PATH)
+                except OSError as e:
+                    # A read-only deploy still classifies; it just retrains on the next start
+                    logger.warning(f"Could not save the industry model to {MODEL_PATH}: {e}")
+        return _model
+
+
+if __name__ == '__main__':
+    corpus = sys.argv[1] if len(sys.argv) > 1 else CORPUS_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+    trained = train(corpus)
+    trained.save(output)
+    print(f"Trained {len(trained.labels)} industries over {len(trained.vocab)} terms "
+          f"(temperature {trained.temperature:.2f}) -> {output}")
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Graph API batch requests accept at most 50 operations.
+BATCH_LIMIT = 50
+
+# Our metric name -> Graph post insights metric
+METRICS = {
+    'impressions': 'post_impressions',
+    'reach': 'post_impressions_unique',
+    'engagement': 'post_engaged_users',
+    'clicks': 'post_clicks',
+}
+
+CATEGORIES = ('page', 'industry', 'tone')
+NUMERIC = ('published_ts', 'fetched_ts', 'weekday', 'hour') + tuple(METRICS)
+DTYPES = {
+    'published_ts': np.int64,
+    'fetched_ts': np.int64,
+    'weekday': np.int8,
+    'hour': np.int8,
+    'impressions': np.int64,
+    'reach': np.int64,
+    'engagement': np.int64,
+    'clicks': np.int64,
+}
+
+
+class InsightsStore:
+    """Columnar store of per-post metrics.
+
+    Numeric columns are NumPy arrays grown by doubling. Page, industry and tone
+    are dictionary-encoded into int32 codes, so grouping is a `np.bincount`
+    over the code column. The store persists to a single `.npz` file.
+    """
+
+    def __init__(self, path=None, capacity=1024):
+        self.path = path
+        self.size = 0
+        self.version = 0
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=DTYPES[name]) for name in NUMERIC}
+        self.codes = {name: np.zeros(capacity, dtype=np.int32) for name in CATEGORIES}
+        self.vocab = {name: [] for name in CATEGORIES}
+        self._vocab_index = {name: {} for name in CATEGORIES}
+        self.post_ids = []
+        self._row_index = {}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for group in (self.columns, self.codes):
+            for name, array in group.items():
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                group[name] = grown
+        self._capacity = capacity
+
+    def _encode(self, category, value):
+        index = self._vocab_index[category]
+        value = value or 'unknown'
+        if value not in index:
+            index[value] = len(self.vocab[category])
+            self.vocab[category].append(value)
+        return index[value]
+
+    def upsert(self, fb_post_id, page_id, industry, tone, published_ts, fetched_ts, metrics):
+        with self._lock:
+            row = self._row_index.get(fb_post_id)
+            if row is None:
+                row = self.size
+                self._grow(row + 1)
+                self._row_index[fb_post_id] = row
+                self.post_ids.append(fb_post_id)
+                self.size += 1
+                published = datetime.fromtimestamp(published_ts)
+                self.columns['published_ts'][row] = published_ts
+                self.columns['weekday'][row] = published.weekday()
+                self.columns['hour'][row] = published.hour
+                self.codes['page'][row] = self._encode('page', page_id)
+                self.codes['industry'][row] = self._encode('industry', (industry or '').lower())
+                self.codes['tone'][row] = self._encode('tone', (tone or '').lower())
+            self.columns['fetched_ts'][row] = fetched_ts
+            for name in METRICS:
+                self.columns[name][row] = metrics.get(name, 0)
+            self.version += 1
+
+    def code(self, category, value):
+        return self._vocab_index[category].get(value)
+
+    def fetched_at(self, fb_post_id):
+        row = self._row_index.get(fb_post_id)
+        return None if row is None else int(self.columns['fetched_ts'][row])
+
+    def column(self, name):
+        if name in self.codes:
+            return self.codes[name][:self.size]
+        return self.columns[name][:self.size]
+
+    def aggregate(self, by, metric):
+        """Count, total and mean of `metric` grouped by a category or weekday."""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if by == 'weekday':
+            keys = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        elif by in CATEGORIES:
+            keys = self.vocab[by]
+        else:
+            raise ValueError(f"Cannot group by: {by}")
+
+        groups = self.column(by)
+        values = self.column(metric)
+        counts = np.bincount(groups, minlength=len(keys))
+        totals = np.bincount(groups, weights=values, minlength=len(keys))
+        means = np.divide(totals, counts, out=np.zeros(len(keys)), where=counts > 0)
+
+        return [
+            {'key': key, 'posts': int(count), 'total': int(total), 'mean': round(float(mean), 2)}
+            for key, count, total, mean in zip(keys, counts, totals, means)
+            if count
+        ]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            arrays = {f"col_{name}": self.column(name) for name in NUMERIC}
+            arrays.update({f"code_{name}": self.column(name) for name in CATEGORIES})
+            arrays['post_ids'] = np.array(self.post_ids, dtype=str)
+            arrays['vocab'] = np.array(json.dumps(self.vocab))
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path):
+        store = cls(path)
+        if not os.path.exists(path):
+            return store
+        with np.load(path) as data:
+            post_ids = [str(p) for p in data['post_ids']]
+            store._grow(max(len(post_ids), 1))
+            store.size = len(post_ids)
+            for name in NUMERIC:
+                # Metrics added since the file was written stay zero until the next fetch
+                if f"col_{name}" in data.files:
+                    store.columns[name][:store.size] = data[f"col_{name}"]
+            for name in CATEGORIES:
+                store.codes[name][:store.size] = data[f"code_{name}"]
+            store.vocab = json.loads(str(data['vocab']))
+        store.version = 1
+        store.post_ids = post_ids
+        store._row_index = {post_id: row for row, post_id in enumerate(post_ids)}
+        store._vocab_index = {name: {value: i for i, value in enumerate(values)}
+                              for name, values in store.vocab.items()}
+        return store
+
+
+class InsightsIngester:
+    """Pulls post insights for recently published posts in Graph batches.
+
+    Only posts published within `update_window` seconds are refreshed, and a
+    post is skipped until `min_interval` seconds after its last fetch, so each
+    run only touches posts whose numbers can still change.
+    """
+
+    def __init__(self, store, graph_url, update_window=28 * 24 * 3600, min_interval=3600, timeout=10):
+        self.store = store
+        self.graph_url = graph_url
+        self.update_window = update_window
+        self.min_interval = min_interval
+        self.timeout = timeout
+
+    def due(self, candidates, now):
+        """Candidates published inside the update window and not fetched recently."""
+        window_start = now - self.update_window
+        due = []
+        for candidate in candidates:
+            fb_post_id, published_ts = candidate['fb_post_id'], candidate['published_ts']
+            if published_ts < window_start:
+                continue
+            fetched_at = self.store.fetched_at(fb_post_id)
+            if fetched_at is not None and fetched_at > now - self.min_interval:
+                continue
+            due.append(candidate)
+        return due
+
+    def ingest(self, candidates, now=None):
+        """Fetch and store insights for the due candidates.
+
+        Each candidate is a dict with fb_post_id, page_id, access_token,
+        industry, tone and published_ts.
+        """
+        now = int(now or time.time())
+        due = self.due(candidates, now)
+        fetched = failed = 0
+
+        for start in range(0, len(due), BATCH_LIMIT):
+            chunk = due[start:start + BATCH_LIMIT]
+            try:
+                results = self._fetch_batch(chunk)
+            except Exception as e:
+                logger.error(f"Error fetching post insights: {e}")
+                failed += len(chunk)
+                continue
+
+            for candidate, metrics in zip(chunk, results):
+                if metrics is None:
+                    failed += 1
+                    continue
+                self.store.upsert(
+                    candidate['fb_post_id'], candidate['page_id'], candidate.get('industry'),
+                    candidate.get('tone'), candidate['published_ts'], now, metrics
+                )
+                fetched += 1
+
+        if fetched:
+            self.store.save()
+        return {'due': len(due), 'fetched': fetched, 'failed': failed}
+
+    def _fetch_batch(self, chunk):
+        metric_names = ','.join(METRICS.values())
+        batch = [
+            {
+                'method': 'GET',
+                'relative_url': f"{c['fb_post_id']}/insights?metric={metric_names}&access_token={c['access_token']}",
+            }
+            for c in chunk
+        ]
+        response = requests.post(
+            self.graph_url,
+            data={'access_token': chunk[0]['access_token'], 'batch': json.dumps(batch)},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+        by_graph_name = {graph_name: name for name, graph_name in METRICS.items()}
+        results = []
+        for item in response.json():
+            if not item or item.get('code') != 200:
+                results.append(None)
+                continue
+            metrics = {}
+            for entry in json.loads(item.get('body') or '{}').get('data', []):
+                name = by_graph_name.get(entry.get('name'))
+                values = entry.get('values') or [{}]
+                value = values[-1].get('value', 0)
+                if name:
+                    metrics[name] = sum(value.values()) if isinstance(value, dict) else int(value or 0)
+            results.append(metrics)
+        return results
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaTooLarge(Exception):
+    def __init__(self, limit):
+        super().__init__(f"Upload exceeds the {limit / (1024 * 1024):.1f} MiB limit")
+        self.limit = limit
+
+
+class MediaMissing(Exception):
+    """The source of a variant was evicted before the variant was built."""
+
+
+class MediaEmpty(ValueError):
+    def __init__(self):
+        super().__init__("Upload is empty")
+
+
+def variant_key(source, params):
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{source}|{canonical}".encode()).hexdigest()
+
+
+def render_variant(source_path, output, params):
+    """Resize, watermark and re-encode an image into the open file `output`."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    with Image.open(source_path) as image:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        max_side = params.get('max_side')
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side))
+        else:
+            image = image.copy()
+
+    stamp = params.get('watermark')
+    if stamp:
+        draw = ImageDraw.Draw(image)
+        try:
+            font = ImageFont.truetype("arial.ttf", 10)
+        except OSError:
+            font = ImageFont.load_default()
+        width, height = image.size
+        # Nearly invisible, it only has to make the bytes unique
+        draw.text((width - 50, height - 15), stamp, fill=(250, 250, 250, 1), font=font)
+
+    image.save(output, format=params.get('format', 'JPEG'), quality=params.get('quality', 95))
+
+
+class MediaStore:
+    """Content-addressed files for uploaded images and their processed variants.
+
+    Uploads are streamed to disk while being hashed, so the same image is
+    stored once however often it is sent. A variant is keyed by the source
+    hash plus its transform parameters and rendered at most once; later
+    publishes, retries and other pages reuse the file. Files are read back
+    through `mmap` instead of being copied into Python buffers. When the
+    store grows past `max_bytes`, the least recently used files that aren't
+    open are deleted.
+    """
+
+    def __init__(self, root, max_bytes=1024 ** 3, max_upload_bytes=10 * 1024 ** 2, render=render_variant):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_upload_bytes = max_upload_bytes
+        self.render = render
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = OrderedDict()
+        self._size = 0
+        self._pins = {}
+        self._building = {}
+        self._lock = threading.Lock()
+        for kind in ('sources', 'variants', 'tmp'):
+            os.makedirs(os.path.join(root, kind), exist_ok=True)
+        # Leftovers from writes interrupted by a crash
+        for name in os.listdir(os.path.join(root, 'tmp')):
+            os.remove(os.path.join(root, 'tmp', name))
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for kind in ('sources', 'variants'):
+            for name in os.listdir(os.path.join(self.root, kind)):
+                path = os.path.join(self.root, kind, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        # mtime is bumped on every use, so it orders the files by recency
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._size += size
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, kind, key)
+
+    def put(self, stream):
+        """Stream a file-like object into the store and return its content hash."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise MediaTooLarge(self.max_upload_bytes)
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            if not size:
+                # Nothing to store, and a zero-length file can't be mapped
+                raise MediaEmpty()
+            source = digest.hexdigest()
+            self._commit(tmp_path, self._path('sources', source))
+            return source
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def variant(self, source, params):
+        """Key of the `params` rendering of `source`, building it if it isn't stored."""
+        key = variant_key(source, params)
+        path = self._path('variants', key)
+        while True:
+            with self._lock:
+                if path in self._files:
+                    self._touch(path)
+                    self.hits += 1
+                    return key
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another request is rendering the same variant; use its result
+            building.wait()
+
+        try:
+            source_path = self._path('sources', source)
+            with self._lock:
+                if source_path not in self._files:
+                    raise MediaMissing(source)
+                self._touch(source_path)
+                self._pins[source_path] = self._pins.get(source_path, 0) + 1
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    self.render(source_path, tmp, params)
+                self._commit(tmp_path, path)
+            finally:
+                self._unpin(source_path)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return key
+        finally:
+            with self._lock:
+                self._building.pop(key).set()
+
+    def open_variant(self, source, params):
+        """`open` the `params` rendering of `source`, rendering it again if it was just evicted."""
+        for _ in range(2):
+            key = self.variant(source, params)
+            try:
+                return self.open('variants', key)
+            except MediaMissing:
+                continue
+        raise MediaMissing(source)
+
+    def pin(self, kind, key):
+        """Keep a stored file from being evicted until a matching `unpin`."""
+        path = self._path(kind, key)
+        with self._lock:
+            if path not in self._files:
+                raise MediaMissing(key)
+            self._touch(path)
+            self._pins[path] = self._pins.get(path, 0) + 1
+        return path
+
+    def unpin(self, kind, key):
+        self._unpin(self._path(kind, key))
+
+    def open(self, kind, key):
+        """Memory-mapped, read-only view of a stored file; use as a context manager."""
+        path = self.pin(kind, key)
+        try:
+            return MappedFile(path, lambda: self._unpin(path))
+        except Exception:
+            self._unpin(path)
+            raise
+
+    def _commit(self, tmp_path, path):
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if path in self._files:
+                # Same content already stored
+                self._touch(path)
+                return
+            os.replace(tmp_path, path)
+            self._files[path] = size
+            self._size += size
+            self._evict()
+
+    def _touch(self, path):
+        self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _unpin(self, path):
+        with self._lock:
+            remaining = self._pins.get(path, 1) - 1
+            if remaining:
+                self._pins[path] = remaining
+            else:
+                self._pins.pop(path, None)
+            self._evict()
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        for path in list(self._files):
+            if self._size <= self.max_bytes:
+                break
+            if path in self._pins:
+                continue
+            size = self._files.pop(path)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def status(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'open': sum(self._pins.values()),
+                'variant_hits': self.hits,
+                'variant_misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class MappedFile:
+    """Read-only mmap of a stored file that releases its pin on close."""
+
+    def __init__(self, path, on_close):
+        self.name = os.path.basename(path)
+        self._on_close = on_close
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size=-1):
+        return self._map.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._map.seek(offset, whence)
+
+    def tell(self):
+        return self._map.tell()
+
+    def __len__(self):
+        return len(self._map)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,216 @@
+import calendar
+import html
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote_plus
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Search feeds used for every industry; `{query}` is the URL-encoded industry
+DEFAULT_SOURCES = [
+    "https://news.google.com/rss/search?q={query}",
+    "https://www.bing.com/news/search?q={query}&format=rss",
+]
+
+# Headlines sharing at least this fraction of their words are the same story
+SIMILARITY_THRESHOLD = 0.6
+# Recency half-life for ranking
+HALF_LIFE_HOURS = 24
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by for from has in is it its of on or the to with".split())
+# Google/Bing titles end in " - Publisher"
+PUBLISHER_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—]{2,60}$")
+
+
+def normalize_title(title):
+    title = html.unescape(title or "")
+    title = PUBLISHER_SUFFIX.sub("", " ".join(title.split()))
+    return title.strip()
+
+
+def title_words(title):
+    return frozenset(w for w in WORD_RE.findall(title.lower()) if w not in STOPWORDS)
+
+
+def load_sources(path):
+    """Industry -> feed URL templates from a JSON file; the "default" list applies to all industries."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class NewsAggregator:
+    """Fetches an industry's RSS/Atom sources concurrently and merges their headlines.
+
+    Each source is fetched with If-None-Match / If-Modified-Since and its
+    parsed entries are cached, so unchanged feeds cost a 304. A call waits at
+    most `budget` seconds: sources still in flight contribute their cached
+    entries and finish in the background for the next call. Near-identical
+    headlines from different sources are merged, and stories are ranked by
+    how many sources carry them, recency and whether they mention the industry.
+    Only the `max_feeds` most recently used feeds stay cached.
+    """
+
+    def __init__(self, sources=None, budget=2.5, refresh_interval=300, max_items=5, max_feeds=200,
+                 timeout=10, workers=8, user_agent="Mozilla/5.0 (compatible; news-aggregator)", on_headlines=None):
+        self.sources = sources or {}
+        # Called with (industry, titles) for headlines a fetch hasn't returned before
+        self.on_headlines = on_headlines
+        self.budget = budget
+        self.refresh_interval = refresh_interval
+        self.max_items = max_items
+        self.max_feeds = max_feeds
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._feeds = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='news')
+
+    def source_urls(self, industry):
+        templates = self.sources.get(industry.lower()) or []
+        templates = list(dict.fromkeys(templates + (self.sources.get("default") or DEFAULT_SOURCES)))
+        return [template.format(query=quote_plus(industry)) for template in templates]
+
+    def headlines(self, industry, limit=None):
+        return [story['title'] for story in self.stories(industry, limit)]
+
+    def stories(self, industry, limit=None):
+        """Ranked, deduplicated stories: dicts with title, link, published, sources and score."""
+        deadline = time.monotonic() + self.budget
+        urls = self.source_urls(industry)
+        futures = [self._refresh(url, industry) for url in urls]
+        pending = [f for f in futures if f is not None]
+        if pending:
+            wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+
+        entries = []
+        with self._lock:
+            for url in urls:
+                feed = self._feeds.get(url)
+                if feed:
+                    self._feeds.move_to_end(url)
+                    entries.extend((url, entry) for entry in feed['entries'])
+        return self._rank(self._merge(entries), industry)[:limit or self.max_items]
+
+    def _refresh(self, url, industry):
+        """Start a conditional fetch unless the cache is fresh or one is already running."""
+        with self._lock:
+            feed = self._feeds.get(url)
+            if feed and time.time() - feed['fetched_at'] < self.refresh_interval:
+                return None
+            future = self._in_flight.get(url)
+            if future is None:
+                future = self._executor.submit(self._fetch, url, industry)
+                self._in_flight[url] = future
+            return future
+
+    def _fetch(self, url, industry):
+        try:
+            feed = self._feeds.get(url)
+            headers = {'user-agent': self.user_agent}
+            if feed and feed.get('etag'):
+                headers['If-None-Match'] = feed['etag']
+            if feed and feed.get('last_modified'):
+                headers['If-Modified-Since'] = feed['last_modified']
+
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and feed:
+                feed['fetched_at'] = time.time()
+                return
+            response.raise_for_status()
+
+            import feedparser
+            parsed = feedparser.parse(response.content)
+            entries = []
+            for entry in parsed.entries:
+                title = normalize_title(entry.get('title'))
+                if not title:
+                    continue
+                published = entry.get('published_parsed') or entry.get('updated_parsed')
+                entries.append({
+                    'title': title,
+                    'link': entry.get('link'),
+                    'published': calendar.timegm(published) if published else None,
+                })
+            with self._lock:
+                self._feeds[url] = {
+                    'entries': entries,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.time(),
+                }
+                self._feeds.move_to_end(url)
+                # Every industry asked about adds its own search feeds
+                while len(self._feeds) > self.max_feeds:
+                    self._feeds.popitem(last=False)
+            if self.on_headlines:
+                known = {entry['title'] for entry in feed['entries']} if feed else set()
+                fresh = [entry['title'] for entry in entries if entry['title'] not in known]
+                if fresh:
+                    self.on_headlines(industry, fresh)
+        except Exception as e:
+            logger.warning(f"Error fetching news feed {url}: {e}")
+            if feed:
+                # Keep serving the stale entries, but don't retry on every call
+                feed['fetched_at'] = time.time()
+        finally:
+            with self._lock:
+                self._in_flight.pop(url, None)
+
+    @staticmethod
+    def _merge(entries):
+        stories = []
+        for url, entry in entries:
+            words = title_words(entry['title'])
+            for story in stories:
+                union = len(words | story['words'])
+                if union and len(words & story['words']) / union >= SIMILARITY_THRESHOLD:
+                    story['sources'].add(url)
+                    story['mentions'] += 1
+                    if entry['published'] and (not story['published'] or entry['published'] < story['published']):
+                        story['published'] = entry['published']
+                    break
+            else:
+                stories.append({
+                    'title': entry['title'],
+                    'link': entry['link'],
+                    'published': entry['published'],
+                    'words': words,
+                    'sources': {url},
+                    'mentions': 1,
+                })
+        return stories
+
+    @staticmethod
+    def _rank(stories, industry):
+        now = time.time()
+        industry_words = title_words(industry)
+        for story in stories:
+            age_hours = (now - story['published']) / 3600 if story['published'] else HALF_LIFE_HOURS
+            score = (1 + 0.5 * (len(story['sources']) - 1) + 0.1 * (story['mentions'] - 1))
+            score *= 0.5 ** (max(age_hours, 0) / HALF_LIFE_HOURS)
+            if industry_words & story['words']:
+                score *= 1.2
+            story['score'] = round(score, 4)
+        ranked = sorted(stories, key=lambda story: -story['score'])
+        return [
+            {
+                'title': story['title'],
+                'link': story['link'],
+                'published': story['published'],
+                'sources': len(story['sources']),
+                'score': story['score'],
+            }
+            for story in ranked
+        ]
@@ -0,0 +1,265 @@
+"""Compact in-memory records for generated and published posts.
+
+A record behaves like the dict it replaces (same keys, same values, same
+JSON) but keeps its known fields in `__slots__`. Low-cardinality strings
+(status, tone, industry, ...) are stored as small integer codes into a
+shared vocabulary, page ids are interned, and naive ISO timestamps are
+stored as integer microseconds since the epoch. Keys outside the known
+fields, and known fields holding a value of another type (an int tone,
+a numeric timestamp), go into a per-record dict that only exists when
+needed, so every value reads back exactly as it was stored.
+"""
+import sys
+import threading
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<missing>'
+
+
+# Marks a known field the record doesn't have, so absent keys stay absent
+MISSING = _Missing()
+
+
+class Vocabulary:
+    """Bidirectional value <-> small int code table, shared by all records."""
+
+    def __init__(self):
+        self._codes = {}
+        self._values = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def value(self, code):
+        return self._values[code]
+
+
+def encode_timestamp(value):
+    """Integer microseconds for a naive ISO timestamp that round-trips exactly; anything else as is."""
+    if not isinstance(value, str):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return value
+    return (moment - EPOCH) // _MICROSECOND
+
+
+def decode_timestamp(value):
+    """ISO string for a value from `encode_timestamp`; only encoded timestamps are stored as ints."""
+    if type(value) is int:
+        return (EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CompactRecord(MutableMapping):
+    """Dict-compatible record with slot storage; see the module docstring."""
+
+    __slots__ = ()
+
+    FIELDS = ()
+    ENUMS = {}
+    TIMESTAMPS = frozenset()
+    INTERNED = frozenset()
+
+    def __init__(self, data=()):
+        for field in self.FIELDS:
+            setattr(self, field, MISSING)
+        self._extra = None
+        self.update(data)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            raw = getattr(self, key)
+            if raw is not MISSING:
+                vocabulary = self.ENUMS.get(key)
+                if vocabulary is not None:
+                    return vocabulary.value(raw)
+                if key in self.TIMESTAMPS:
+                    return decode_timestamp(raw)
+                return raw
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._FIELD_SET:
+            self._discard_extra(key)
+            vocabulary = self.ENUMS.get(key)
+            if vocabulary is not None:
+                if not isinstance(value, str):
+                    # Slots of enum fields only ever hold codes; other values are kept as given
+                    setattr(self, key, MISSING)
+                    self._set_extra(key, value)
+                    return
+                value = vocabulary.code(value)
+            elif key in self.TIMESTAMPS:
+                if not isinstance(value, str):
+                    # Ints in the slot are encoded timestamps, so raw values go to _extra
+                    setattr(self, key, MISSING)
+                    self._set_extra(key, value)
+                    return
+                value = encode_timestamp(value)
+            elif key in self.INTERNED:
+                value = _intern(value)
+            setattr(self, key, value)
+        else:
+            self._set_extra(key, value)
+
+    def _set_extra(self, key, value):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def _discard_extra(self, key):
+        if self._extra is not None and key in self._extra:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __delitem__(self, key):
+        if key in self._FIELD_SET and getattr(self, key) is not MISSING:
+            setattr(self, key, MISSING)
+            return
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        self._discard_extra(key)
+
+    def __contains__(self, key):
+        if key in self._FIELD_SET and getattr(self, key) is not MISSING:
+            return True
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field) is not MISSING:
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(getattr(self, field) is not MISSING for field in self.FIELDS) + len(self._extra or ())
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+STATUSES = Vocabulary()
+TONES = Vocabulary()
+INDUSTRIES = Vocabulary()
+CONTENT_TYPES = Vocabulary()
+
+
+class PostRecord(CompactRecord):
+    """A `generated_posts` entry."""
+
+    FIELDS = ('page_id', 'content', 'industry', 'tone', 'content_type', 'status',
+              'generated_at', 'created_at', 'updated_at')
+    __slots__ = FIELDS + ('_extra',)
+    ENUMS = {'industry': INDUSTRIES, 'tone': TONES, 'content_type': CONTENT_TYPES, 'status': STATUSES}
+    TIMESTAMPS = frozenset(['generated_at', 'created_at', 'updated_at'])
+    INTERNED = frozenset(['page_id'])
+
+
+POST_URL_PREFIX = 'https://www.facebook.com/'
+
+
+class _Derived:
+    __slots__ = ()
+
+
+# fb_post_url is almost always the post id under POST_URL_PREFIX; only other URLs are stored
+DERIVED = _Derived()
+
+
+class PublishedRecord(CompactRecord):
+    """A `published_posts` entry."""
+
+    FIELDS = ('page_id', 'fb_post_id', 'fb_post_url', 'published_at', 'original_content', 'has_image')
+    __slots__ = FIELDS + ('_extra',)
+    TIMESTAMPS = frozenset(['published_at'])
+    INTERNED = frozenset(['page_id'])
+
+    def __getitem__(self, key):
+        if key == 'fb_post_url' and self.fb_post_url is DERIVED:
+            return f"{POST_URL_PREFIX}{self.fb_post_id}"
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        if key == 'fb_post_id' and self.fb_post_url is DERIVED:
+            # Keep the URL that was derived from the old id
+            self.fb_post_url = self['fb_post_url']
+        if (key == 'fb_post_url' and isinstance(value, str) and isinstance(self.fb_post_id, str)
+                and value == f"{POST_URL_PREFIX}{self.fb_post_id}"):
+            self.fb_post_url = DERIVED
+            return
+        super().__setitem__(key, value)
+
+
+class RecordMap(dict):
+    """dict of id -> record that converts plain dicts to `record_type` on the way in."""
+
+    __slots__ = ('record_type',)
+
+    def __init__(self, record_type, *args, **kwargs):
+        super().__init__()
+        self.record_type = record_type
+        self.update(*args, **kwargs)
+
+    def _convert(self, value):
+        if isinstance(value, self.record_type) or not isinstance(value, Mapping):
+            return value
+        return self.record_type(value)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, self._convert(value))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+def to_json(value):
+    """`default` hook for JSON encoders."""
+    if isinstance(value, CompactRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
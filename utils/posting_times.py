@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SLOTS = 7 * 24
+
+
+class PostingTimeModel:
+    """Per-page weekday x hour engagement model built from the insights store.
+
+    Engagement sums and post counts are kept as (pages, 168) matrices and
+    updated incrementally: each refresh only applies the change in every
+    row's engagement since the previous refresh. Scores are smoothed across
+    neighbouring hours and shrunk towards the all-pages average, so pages
+    with few posts still get sensible slots.
+    """
+
+    def __init__(self, store, metric='engagement', prior_weight=3.0):
+        self.store = store
+        self.metric = metric
+        self.prior_weight = prior_weight
+        self._lock = threading.Lock()
+        self._version = -1
+        self._rows = 0
+        self._contributed = np.zeros(0, dtype=np.float64)
+        self._sums = np.zeros((0, SLOTS))
+        self._counts = np.zeros((0, SLOTS))
+        self._scores = np.zeros((0, SLOTS))
+        self._observed = np.zeros(SLOTS, dtype=bool)
+
+    def refresh(self):
+        with self._lock:
+            if self.store.version == self._version:
+                return
+            self._apply_changes()
+            self._scores = self._score()
+            self._observed = self._counts.sum(axis=0) > 0
+            self._version = self.store.version
+
+    def _apply_changes(self):
+        size = len(self.store)
+        pages = len(self.store.vocab['page'])
+        if pages > self._sums.shape[0]:
+            self._sums = np.vstack([self._sums, np.zeros((pages - self._sums.shape[0], SLOTS))])
+            self._counts = np.vstack([self._counts, np.zeros((pages - self._counts.shape[0], SLOTS))])
+        if size > len(self._contributed):
+            self._contributed = np.concatenate([self._contributed, np.zeros(size - len(self._contributed))])
+
+        page = self.store.column('page')
+        slot = self.store.column('weekday').astype(np.int64) * 24 + self.store.column('hour')
+        cell = page.astype(np.int64) * SLOTS + slot
+        values = self.store.column(self.metric).astype(np.float64)
+
+        delta = values - self._contributed[:size]
+        changed = np.nonzero(delta)[0]
+        if len(changed):
+            self._sums += np.bincount(cell[changed], weights=delta[changed],
+                                      minlength=self._sums.size).reshape(self._sums.shape)
+        if size > self._rows:
+            new = cell[self._rows:size]
+            self._counts += np.bincount(new, minlength=self._counts.size).reshape(self._counts.shape)
+        self._contributed[:size] = values
+        self._rows = size
+
+    def _score(self):
+        sums, counts = self._sums, self._counts
+        if not counts.size:
+            return np.zeros((0, SLOTS))
+
+        # Global per-slot mean is the prior every page is shrunk towards
+        total_counts = counts.sum(axis=0)
+        global_mean = np.divide(sums.sum(axis=0), total_counts, out=np.zeros(SLOTS), where=total_counts > 0)
+        fallback = global_mean[total_counts > 0].mean() if total_counts.any() else 0.0
+        global_mean[total_counts == 0] = fallback
+
+        k = self.prior_weight
+        means = (sums + k * global_mean) / (counts + k)
+
+        # Smooth across adjacent hours; the week wraps around Sunday -> Monday
+        return 0.25 * np.roll(means, 1, axis=1) + 0.5 * means + 0.25 * np.roll(means, -1, axis=1)
+
+    def _page_scores(self, page_id):
+        code = self.store.code('page', page_id)
+        if code is None or code >= self._scores.shape[0]:
+            if not self._scores.shape[0]:
+                return None
+            # Pages without history use the average across all pages
+            return self._scores.mean(axis=0)
+        return self._scores[code]
+
+    def top_slots(self, page_id, n=5, one_per_day=False):
+        """Best (day, hour, score) slots for a page, highest score first.
+
+        Only slots some page has posted in are ranked: the rest all carry the
+        same fallback score, so they would tie and say nothing about the hour.
+        """
+        self.refresh()
+        scores = self._page_scores(page_id)
+        if scores is None:
+            return []
+        n = max(1, min(n, SLOTS))
+        scores = np.where(self._observed, scores, -np.inf)
+
+        if one_per_day:
+            by_day = scores.reshape(7, 24)
+            hours = by_day.argmax(axis=1)
+            day_scores = by_day[np.arange(7), hours]
+            order = [day for day in np.argsort(-day_scores) if np.isfinite(day_scores[day])][:n]
+            slots = [(int(day), int(hours[day]), float(day_scores[day])) for day in order]
+        else:
+            n = min(n, int(self._observed.sum()))
+            if not n:
+                return []
+            top = np.argpartition(-scores, n - 1)[:n]
+            top = top[np.argsort(-scores[top])]
+            slots = [(int(s) // 24, int(s) % 24, float(scores[s])) for s in top]
+
+        return [{'day': DAYS[day], 'hour': hour, 'score': round(score, 3)} for day, hour, score in slots]
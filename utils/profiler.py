@@ -0,0 +1,270 @@
+import hmac
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Stacks are cut above this frame so every flame graph starts at the request
+ROOT_FUNCTION = 'full_dispatch_request'
+MAX_DEPTH = 128
+
+
+def _label(code, module, cache={}):
+    label = cache.get(code)
+    if label is None:
+        label = cache[code] = f"{module}:{code.co_name}"
+    return label
+
+
+def collapse(frame):
+    """`module:function;...` for a frame's stack, outermost first."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        code = frame.f_code
+        labels.append(_label(code, frame.f_globals.get('__name__', '?')))
+        if code.co_name == ROOT_FUNCTION:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class _Session:
+    __slots__ = ('thread_id', 'stacks', 'samples', 'deadline', 'truncated')
+
+    def __init__(self, thread_id, deadline):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self.deadline = deadline
+        self.truncated = False
+
+
+class Sampler:
+    """One background thread that samples the stacks of the threads being profiled.
+
+    The thread only runs while at least one session is open. Every
+    `interval` seconds it reads the current frame of each profiled thread
+    and counts its collapsed stack, so the profiled code itself runs
+    uninstrumented. A session is stopped at `max_seconds` to bound memory.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=30, max_stacks=5000):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_stacks = max_stacks
+        self._sessions = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, thread_id):
+        session = _Session(thread_id, time.monotonic() + self.max_seconds)
+        with self._lock:
+            self._sessions[thread_id] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session):
+        with self._lock:
+            if self._sessions.get(session.thread_id) is session:
+                del self._sessions[session.thread_id]
+        return session
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            now = time.monotonic()
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                for thread_id, session in list(self._sessions.items()):
+                    frame = frames.get(thread_id)
+                    if now > session.deadline:
+                        session.truncated = True
+                        del self._sessions[thread_id]
+                        continue
+                    if frame is None:
+                        continue
+                    stack = collapse(frame)
+                    if stack in session.stacks or len(session.stacks) < self.max_stacks:
+                        session.stacks[stack] += 1
+                    else:
+                        session.truncated = True
+                    session.samples += 1
+            del frames
+
+
+def breakdown(stacks, interval, limit=15):
+    """Self and total milliseconds per function and self milliseconds per module."""
+    self_samples = Counter()
+    total_samples = Counter()
+    modules = Counter()
+    for stack, count in stacks.items():
+        labels = stack.split(';')
+        self_samples[labels[-1]] += count
+        modules[labels[-1].split(':', 1)[0]] += count
+        for label in set(labels):
+            total_samples[label] += count
+    ms = interval * 1000
+    return {
+        'functions': [
+            {'function': label, 'total_ms': round(count * ms, 1), 'self_ms': round(self_samples[label] * ms, 1)}
+            for label, count in total_samples.most_common(limit)
+        ],
+        'modules': {module: round(count * ms, 1) for module, count in modules.most_common(limit)},
+    }
+
+
+class RequestProfiler:
+    """Opt-in sampling profiles of single requests, kept in a bounded list.
+
+    A request is profiled when it carries `X-Profile: <admin token>` or is
+    picked at `sample_rate`. Its thread's stacks are sampled for the
+    duration of the request and stored as collapsed stacks (the input
+    format of flamegraph.pl and speedscope) with the route, post id and
+    wall/CPU time. Only the newest `max_profiles` are kept. When neither
+    trigger is configured, `install` registers no hooks, so requests pay
+    nothing. Stored profiles are only served with the admin token, or to
+    local requests when `allow_local` is set and no token is configured.
+    """
+
+    def __init__(self, sample_rate=0.0, admin_token=None, interval=0.005, max_profiles=50, max_seconds=30,
+                 allow_local=False):
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.allow_local = allow_local
+        self.sampler = Sampler(interval, max_seconds)
+        self._profiles = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.admin_token) or self.sample_rate > 0
+
+    def install(self, app):
+        if not self.enabled:
+            return
+        if not self.admin_token:
+            logger.warning("Request profiling is on without an admin token; profiles are "
+                           + ("served to local requests" if self.allow_local else "not served"))
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _trigger(self):
+        if self.admin_token and _token_matches(request.headers.get('X-Profile'), self.admin_token):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def _before(self):
+        trigger = self._trigger()
+        if trigger is None:
+            return
+        g.profile = {
+            'trigger': trigger,
+            'session': self.sampler.start(threading.get_ident()),
+            'started_at': datetime.now().isoformat(),
+            'wall': time.perf_counter(),
+            'cpu': time.thread_time(),
+        }
+
+    def _after(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        wall_ms = (time.perf_counter() - profile['wall']) * 1000
+        cpu_ms = (time.thread_time() - profile['cpu']) * 1000
+        session = self.sampler.stop(profile['session'])
+
+        record = {
+            'id': next(self._ids),
+            'route': request.url_rule.rule if request.url_rule else None,
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'post_id': self._post_id(response),
+            'trigger': profile['trigger'],
+            'started_at': profile['started_at'],
+            'wall_ms': round(wall_ms, 1),
+            'cpu_ms': round(cpu_ms, 1),
+            # Time the thread was off the CPU: network, disk, locks, queues
+            'waiting_ms': round(max(wall_ms - cpu_ms, 0.0), 1),
+            'samples': session.samples,
+            'interval_ms': self.sampler.interval * 1000,
+            'truncated': session.truncated,
+            'breakdown': breakdown(session.stacks, self.sampler.interval),
+            'stacks': dict(session.stacks),
+        }
+        with self._lock:
+            self._profiles.append(record)
+        response.headers['X-Profile-Id'] = str(record['id'])
+        return response
+
+    def _teardown(self, error=None):
+        # Requests that never reached after_request
+        profile = g.pop('profile', None)
+        if profile is not None:
+            self.sampler.stop(profile['session'])
+
+    @staticmethod
+    def _post_id(response):
+        post_id = (request.view_args or {}).get('post_id') or request.values.get('post_id')
+        if post_id:
+            return post_id
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and body.get('post_id'):
+            return body['post_id']
+        if response.is_json and not response.is_streamed:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                return body.get('post_id')
+        return None
+
+    def authorized(self):
+        """Admin token in `X-Admin-Token`; without a configured token, local requests if `allow_local`."""
+        if self.admin_token:
+            return _token_matches(request.headers.get('X-Admin-Token'), self.admin_token)
+        # Behind a local reverse proxy every request looks local, hence opt-in
+        return self.allow_local and request.remote_addr in ('127.0.0.1', '::1')
+
+    def profiles(self):
+        """Stored profiles, newest first, without their stacks."""
+        with self._lock:
+            return [{key: value for key, value in record.items() if key != 'stacks'}
+                    for record in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for record in self._profiles:
+                if record['id'] == profile_id:
+                    return record
+        return None
+
+    @staticmethod
+    def collapsed(record):
+        """The profile in collapsed-stack format, one `stack count` line per stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(record['stacks'].items()))
+
+
+def _token_matches(given, token):
+    return given is not None and hmac.compare_digest(given.encode(), token.encode())
+
+
+def forbidden():
+    return jsonify({'error': 'Admin token required'}), 403
@@ -0,0 +1,172 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+
+TOKEN_RE = re.compile(r"[a-z0-9#]+")
+STOPWORDS = frozenset("a an and are as at be by for from has have in is it of on or the this to with".split())
+
+# Searchable fields and how much a match in each one counts
+FIELDS = {'content': 1, 'business_name': 3, 'industry': 2, 'tone': 2}
+
+# Terms in more than this share of posts don't select hits when the query has
+# rarer terms; they only add their (low-IDF) score to posts the rarer terms
+# matched, so ranking uses them without scoring their whole postings
+COMMON_TERM_RATIO = 0.3
+
+K1 = 1.2
+B = 0.75
+
+# Single-term queries over postings larger than this are answered from a
+# cached top-ranked list, dropped whenever the term's postings change
+CACHE_MIN_POSTINGS = 5000
+CACHE_DEPTH = 1000
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """Incrementally maintained BM25 inverted index over posts."""
+
+    def __init__(self):
+        self._postings = {}
+        self._docs = {}
+        self._meta = {}
+        self._lengths = {}
+        self._total_length = 0
+        self._top_cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _terms(post_data):
+        terms = {}
+        for field, weight in FIELDS.items():
+            value = post_data.get(field)
+            if isinstance(value, list):
+                value = ' '.join(map(str, value))
+            for token in tokenize(value):
+                terms[token] = terms.get(token, 0) + weight
+        return terms
+
+    def add(self, post_id, post_data, status=None):
+        """Index or re-index a post."""
+        terms = self._terms(post_data)
+        meta = {
+            'status': status or post_data.get('status'),
+            'page_id': post_data.get('page_id'),
+        }
+        with self._lock:
+            if post_id in self._docs:
+                self._remove(post_id)
+            self._insert(post_id, terms, meta)
+
+    def _insert(self, post_id, terms, meta):
+        self._docs[post_id] = terms
+        self._meta[post_id] = meta
+        self._lengths[post_id] = sum(terms.values())
+        self._total_length += self._lengths[post_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[post_id] = tf
+            self._top_cache.pop(term, None)
+
+    def set_status(self, post_id, status):
+        with self._lock:
+            if post_id in self._meta:
+                self._meta[post_id]['status'] = status
+
+    def remove(self, post_id):
+        with self._lock:
+            if post_id in self._docs:
+                self._remove(post_id)
+
+    def _remove(self, post_id):
+        terms = self._docs.pop(post_id)
+        self._meta.pop(post_id, None)
+        self._total_length -= self._lengths.pop(post_id)
+        for term in terms:
+            self._top_cache.pop(term, None)
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(post_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def search(self, query, page=1, per_page=20, status=None, page_id=None):
+        """Ranked (post_id, score) results for one page of hits, plus the total hit count."""
+        with self._lock:
+            n_docs = len(self._docs)
+            terms = [t for t in dict.fromkeys(tokenize(query)) if t in self._postings]
+            if not n_docs or not terms:
+                return [], 0
+
+            terms.sort(key=lambda t: len(self._postings[t]))
+            rare = [t for t in terms if len(self._postings[t]) <= COMMON_TERM_RATIO * n_docs]
+            common = terms[len(rare):] if rare else []
+            terms = rare or terms
+
+            if (len(terms) == 1 and not common and not status and not page_id and page * per_page <= CACHE_DEPTH
+                    and len(self._postings[terms[0]]) >= CACHE_MIN_POSTINGS):
+                term = terms[0]
+                if term not in self._top_cache:
+                    scores = self._score([term], n_docs)
+                    self._top_cache[term] = heapq.nlargest(CACHE_DEPTH, scores.items(), key=lambda item: item[1])
+                top = self._top_cache[term]
+                hits = top[(page - 1) * per_page:page * per_page]
+                return [(post_id, round(score, 4)) for post_id, score in hits], len(self._postings[term])
+
+            scores = self._score(terms, n_docs)
+            if common:
+                self._score(common, n_docs, scores)
+
+            if status or page_id:
+                scores = {
+                    post_id: score for post_id, score in scores.items()
+                    if (not status or self._meta[post_id]['status'] == status)
+                    and (not page_id or self._meta[post_id]['page_id'] == page_id)
+                }
+
+        total = len(scores)
+        top = heapq.nlargest(page * per_page, scores.items(), key=lambda item: item[1])
+        return [(post_id, round(score, 4)) for post_id, score in top[(page - 1) * per_page:]], total
+
+    def _score(self, terms, n_docs, candidates=None):
+        """BM25 scores for `terms`; with `candidates`, only those posts' scores are added to."""
+        avg_length = self._total_length / n_docs
+        lengths = self._lengths
+        scores = {} if candidates is None else candidates
+        for term in terms:
+            posting = self._postings[term]
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            if candidates is None:
+                matches = posting.items()
+            else:
+                matches = [(post_id, posting[post_id]) for post_id in candidates if post_id in posting]
+            for post_id, tf in matches:
+                norm = K1 * (1 - B + B * lengths[post_id] / avg_length)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def save(self, path):
+        with self._lock:
+            snapshot = {'docs': self._docs, 'meta': self._meta}
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(snapshot, file)
+            # Inside the lock: concurrent saves share the temporary file
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path) as file:
+            snapshot = json.load(file)
+        for post_id, terms in snapshot['docs'].items():
+            index._insert(post_id, terms, snapshot['meta'].get(post_id, {}))
+        return index
@@ -0,0 +1,134 @@
+import json
+from collections.abc import Mapping
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Records encoded per streamed chunk
+STREAM_BATCH_SIZE = 500
+
+
+def _orjson():
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
+
+def _orjson_options(orjson, indent=False):
+    # Datetimes go through `default` so they render the same as with the stdlib encoder
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return option
+
+
+def _default(value):
+    # Dict-like records (see utils.post_records) serialize as their dict
+    if isinstance(value, Mapping):
+        return dict(value)
+    return DefaultJSONProvider.default(value)
+
+
+def dumps(obj, default=_default):
+    """Compact UTF-8 JSON bytes, using orjson when it is installed."""
+    orjson = _orjson()
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_orjson_options(orjson))
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles those
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """`jsonify` backed by orjson, falling back to the stdlib encoder.
+
+    Keys are not sorted and non-ASCII text is sent as UTF-8 rather than
+    escaped; both are valid JSON and noticeably cheaper to produce.
+    """
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs or set(kwargs) == {'separators'}:
+            return dumps(obj, self.default).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        orjson = _orjson()
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = orjson.dumps(obj, default=self.default,
+                                option=_orjson_options(orjson, indent) | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _explicit_quality(accept, mimetype):
+    # Wildcards such as */* (browsers, curl, requests) don't count as asking for a type
+    return max((quality for value, quality in accept if value == mimetype), default=0)
+
+
+def wants_ndjson():
+    """NDJSON only when asked for explicitly: `?format=ndjson`, or an Accept that prefers it over JSON."""
+    if request.args.get('format') == 'ndjson':
+        return True
+    accept = request.accept_mimetypes
+    return _explicit_quality(accept, NDJSON_MIMETYPE) > _explicit_quality(accept, 'application/json')
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ndjson_chunks(records):
+    for batch in _batches(records, STREAM_BATCH_SIZE):
+        yield b''.join(dumps(record) + b'\n' for record in batch)
+
+
+def _json_chunks(key, records):
+    yield b'{"' + key.encode() + b'":['
+    first = True
+    for batch in _batches(records, STREAM_BATCH_SIZE):
+        # Encoding the batch as one list and dropping the brackets leaves
+        # comma-separated records
+        chunk = dumps(batch)[1:-1]
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']}\n'
+
+
+def collection_response(key, collection, serialize, stream_min_items=1000):
+    """Respond with `{key: [serialize(item_id, item), ...]}` for a dict collection.
+
+    Collections of at least `stream_min_items` are streamed in batches, so
+    only the ids and one encoded batch are held in memory. With
+    `?format=ndjson` or `Accept: application/x-ndjson` the records are always
+    streamed, one per line. Items removed while streaming are skipped.
+    """
+    # Snapshot the ids only, so the dict can change while we stream
+    ids = list(collection)
+    records = (serialize(item_id, item) for item_id, item in
+               ((item_id, collection.get(item_id)) for item_id in ids) if item is not None)
+    if wants_ndjson():
+        return current_app.response_class(_ndjson_chunks(records), mimetype=NDJSON_MIMETYPE)
+    if len(ids) >= stream_min_items:
+        return current_app.response_class(_json_chunks(key, records), mimetype='application/json')
+    return current_app.json.response({key: list(records)})
@@ -0,0 +1,240 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib import robotparser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Path/anchor words that usually mark the pages listing what a business offers
+RELEVANT_WORDS = {
+    "service": 5, "services": 5, "menu": 5, "rooms": 5, "treatments": 5, "classes": 5,
+    "pricing": 4, "prices": 4, "packages": 4, "offerings": 4, "products": 4, "programs": 4,
+    "memberships": 4, "suites": 4, "practice-areas": 4, "listings": 3, "what-we-do": 4,
+    "about": 2, "team": 1, "book": 1,
+}
+
+SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".pdf", ".zip", ".mp4", ".css", ".js", ".xml")
+
+ROBOTS_TTL = 3600
+# Hosts whose robots.txt is kept; the least recently used are dropped
+ROBOTS_CACHE_MAX = 1024
+
+_robots_cache = OrderedDict()
+_robots_lock = threading.Lock()
+
+
+def canonical_url(url):
+    """Normalize a URL so trivially different links dedupe to one page."""
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = re.sub(r"/+", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return urlunsplit((parts.scheme.lower() or "https", host, path, parts.query, ""))
+
+
+def same_site(url, root_host):
+    host = urlsplit(url).netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host == root_host
+
+
+def relevance(url, anchor_text=""):
+    haystack = f"{urlsplit(url).path} {anchor_text}".lower()
+    return sum(weight for word, weight in RELEVANT_WORDS.items() if word in haystack)
+
+
+def robots_for(url, user_agent, timeout):
+    """robots.txt parser for the URL's host, cached per host for ROBOTS_TTL seconds."""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    now = time.time()
+    with _robots_lock:
+        cached = _robots_cache.get(host)
+        if cached and cached[0] > now:
+            _robots_cache.move_to_end(host)
+            return cached[1]
+
+    parser = robotparser.RobotFileParser()
+    try:
+        response = requests.get(f"{host}/robots.txt", headers={"user-agent": user_agent}, timeout=timeout)
+        if response.status_code == 200:
+            parser.parse(response.text.splitlines())
+        else:
+            parser.parse([])
+    except requests.exceptions.RequestException:
+        parser.parse([])
+
+    with _robots_lock:
+        _robots_cache[host] = (now + ROBOTS_TTL, parser)
+        _robots_cache.move_to_end(host)
+        while len(_robots_cache) > ROBOTS_CACHE_MAX:
+            _robots_cache.popitem(last=False)
+    return parser
+
+
+def fetch_capped(url, headers, timeout, max_bytes):
+    """GET a page, reading at most max_bytes of the body."""
+    with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
+            return b""
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(16384):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+        return b"".join(chunks)[:max_bytes]
+
+
+def _add_link(links, href, score):
+    # Keyed by canonical URL for dedup; the href as found is what gets fetched
+    key = canonical_url(href)
+    if key in links:
+        links[key] = (max(score, links[key][0]), links[key][1])
+    else:
+        links[key] = (score, href)
+
+
+def discover_links(soup, base_url, root_host):
+    """Same-site links from nav/header/footer (weighted up) and the rest of the page.
+
+    Returns {canonical url: (score, href)}.
+    """
+    links = {}
+    nav_links = set()
+    for container in soup.find_all(["nav", "header", "footer"]):
+        for a in container.find_all("a", href=True):
+            nav_links.add(id(a))
+
+    for a in soup.find_all("a", href=True):
+        href = urljoin(base_url, a["href"])
+        if not href.startswith("http") or not same_site(href, root_host):
+            continue
+        if urlsplit(href).path.lower().endswith(SKIP_EXTENSIONS):
+            continue
+        score = relevance(href, a.get_text(" ", strip=True)) + (2 if id(a) in nav_links else 0)
+        _add_link(links, href, score)
+    return links
+
+
+def sitemap_links(base_url, root_host, robots, headers, timeout, max_bytes, deadline=None):
+    """Same-site links listed in the sitemaps, as {canonical url: (score, href)}."""
+    sitemap_urls = list(getattr(robots, "site_maps", lambda: None)() or [])
+    if not sitemap_urls:
+        sitemap_urls = [urljoin(base_url, "/sitemap.xml")]
+
+    links = {}
+    for sitemap_url in sitemap_urls[:2]:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = min(timeout, remaining)
+        try:
+            body = fetch_capped(sitemap_url, headers, timeout, max_bytes)
+        except requests.exceptions.RequestException:
+            continue
+        for loc in re.findall(rb"<loc>\s*([^<\s]+)\s*</loc>", body):
+            href = loc.decode("utf-8", "ignore")
+            if same_site(href, root_host) and not href.lower().endswith(SKIP_EXTENSIONS):
+                _add_link(links, href, relevance(href))
+    return links
+
+
+def crawl_site(url, home_soup, user_agents, parse, max_pages=8, max_bytes=2_000_000,
+               time_budget=8.0, workers=4, page_timeout=5):
+    """Fetch the most relevant same-site pages after the homepage.
+
+    `parse` turns raw HTML into a soup. Returns a list of soups for the extra
+    pages fetched within the page, byte and time budgets. Pages are deduped by
+    canonical URL and by content hash.
+    """
+    deadline = time.monotonic() + time_budget
+    user_agent = random.choice(user_agents)
+    headers = {"user-agent": user_agent}
+    root_host = urlsplit(canonical_url(url)).netloc
+
+    # The setup fetches count against the same time budget as the pages
+    robots = robots_for(url, user_agent, max(0.1, min(page_timeout, deadline - time.monotonic())))
+    candidates = discover_links(home_soup, url, root_host)
+    if time.monotonic() < deadline:
+        found = sitemap_links(url, root_host, robots, headers, page_timeout, max_bytes // 4, deadline)
+        for score, href in found.values():
+            _add_link(candidates, href, score)
+
+    home = canonical_url(url)
+    canonical = home_soup.find("link", rel="canonical")
+    seen_urls = {home}
+    if canonical and canonical.get("href"):
+        seen_urls.add(canonical_url(urljoin(url, canonical["href"])))
+
+    ranked = [(key, href) for key, (score, href) in sorted(candidates.items(), key=lambda item: -item[1][0])
+              if score > 0 and key not in seen_urls and robots.can_fetch(user_agent, href)]
+
+    soups = []
+    seen_hashes = set()
+    # Each fetch reserves its cap up front, so concurrent fetches can't
+    # overshoot the byte budget together; unused bytes are returned
+    bytes_left = max_bytes
+    page_cap = max(max_bytes // workers, 1)
+    queue = ranked[:max_pages * 2]
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        while (queue or pending) and len(soups) < max_pages:
+            while queue and len(pending) < workers and bytes_left > 0:
+                key, href = queue.pop(0)
+                cap = min(page_cap, bytes_left)
+                bytes_left -= cap
+                pending[pool.submit(fetch_capped, href, headers, page_timeout, cap)] = (key, href, cap)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not pending:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+
+            for future in done:
+                key, href, cap = pending.pop(future)
+                try:
+                    body = future.result()
+                except requests.exceptions.RequestException as e:
+                    bytes_left += cap
+                    logger.info(f"Skipping {href}: {e}")
+                    continue
+                bytes_left += cap - len(body)
+                digest = hashlib.sha1(body).hexdigest()
+                if not body or digest in seen_hashes:
+                    continue
+                seen_hashes.add(digest)
+                soup = parse(body)
+                page_canonical = soup.find("link", rel="canonical")
+                if page_canonical and page_canonical.get("href"):
+                    page_key = canonical_url(urljoin(href, page_canonical["href"]))
+                    if page_key in seen_urls and page_key != key:
+                        continue
+                    seen_urls.add(page_key)
+                soups.append(soup)
+                if len(soups) >= max_pages:
+                    break
+    finally:
+        # Don't wait on fetches still running past the deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return soups
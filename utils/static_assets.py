@@ -0,0 +1,201 @@
+"""Split the dashboard's inline CSS/JS into fingerprinted, precompressed files.
+
+Usage:
+    python -m utils.static_assets [templates/index.html] [static/dist]
+
+The app runs the same build on startup whenever the template has changed
+since the last one, so running it by hand is only needed to ship a
+prebuilt `static/dist` with a deployment.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+
+from flask import make_response, request, send_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(ROOT, 'templates', 'index.html')
+DIST_DIR = os.path.join(ROOT, 'static', 'dist')
+MANIFEST = 'manifest.json'
+URL_PREFIX = '/assets/'
+
+INLINE_STYLE = re.compile(r"[ \t]*<style>(.*?)</style>\n?", re.S)
+INLINE_SCRIPT = re.compile(r"[ \t]*<script>(.*?)</script>\n?", re.S)
+
+MIMETYPES = {'.css': 'text/css', '.js': 'application/javascript', '.html': 'text/html'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_compressed(path, data):
+    """Write `data` plus .gz and, when brotli is installed, .br siblings."""
+    _write(path, data)
+    _write(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    brotli = _brotli()
+    if brotli is not None:
+        _write(f"{path}.br", brotli.compress(data, quality=11))
+
+
+def build(template_path=TEMPLATE_PATH, dist_dir=DIST_DIR):
+    """Extract inline <style>/<script> blocks into hashed files and write the shell that links them."""
+    with open(template_path, 'rb') as f:
+        source = f.read()
+    html = source.decode('utf-8')
+    os.makedirs(dist_dir, exist_ok=True)
+
+    assets = {}
+    for kind, pattern in (('css', INLINE_STYLE), ('js', INLINE_SCRIPT)):
+        blocks = pattern.findall(html)
+        if not blocks:
+            continue
+        data = "\n".join(block.strip("\n") for block in blocks).encode('utf-8') + b"\n"
+        name = f"app.{fingerprint(data)}.{kind}"
+        _write_compressed(os.path.join(dist_dir, name), data)
+        assets[kind] = name
+
+        # The first block becomes the link; the others are folded into it
+        tag = (f'    <link href="{URL_PREFIX}{name}" rel="stylesheet">\n' if kind == 'css'
+               else f'    <script src="{URL_PREFIX}{name}"></script>\n')
+        replacements = iter([tag] + [''] * (len(blocks) - 1))
+        html = pattern.sub(lambda match: next(replacements), html)
+
+    shell = html.encode('utf-8')
+    _write_compressed(os.path.join(dist_dir, 'index.html'), shell)
+
+    previous = read_manifest(dist_dir)
+    manifest = {
+        'source': fingerprint(source),
+        'shell_etag': fingerprint(shell),
+        'assets': assets,
+        # Kept one build longer so pages loaded before a deploy can still fetch them
+        'previous_assets': sorted(set((previous or {}).get('assets', {}).values()) - set(assets.values())),
+    }
+    _write(os.path.join(dist_dir, MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+    _prune(dist_dir, set(assets.values()) | set(manifest['previous_assets']))
+    return manifest
+
+
+def _prune(dist_dir, keep):
+    for name in os.listdir(dist_dir):
+        if not name.startswith('app.'):
+            continue
+        base = name[:-3] if name.endswith(('.gz', '.br')) else name
+        if base not in keep:
+            os.remove(os.path.join(dist_dir, name))
+
+
+def read_manifest(dist_dir=DIST_DIR):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class StaticAssets:
+    """Serves the built dashboard shell and its fingerprinted assets.
+
+    Assets are named by content hash, so they are sent with a one-year
+    immutable Cache-Control and never revalidated. The shell is held in
+    memory, precompressed, and revalidated with an ETag, so a repeat visit
+    costs one 304. The build is redone on first use if the template changed.
+    """
+
+    def __init__(self, template_path=TEMPLATE_PATH, dist_dir=DIST_DIR):
+        self.template_path = template_path
+        self.dist_dir = dist_dir
+        self._shell = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        with self._lock:
+            if self._shell is None:
+                with open(self.template_path, 'rb') as f:
+                    source = fingerprint(f.read())
+                manifest = read_manifest(self.dist_dir)
+                if manifest is None or manifest.get('source') != source:
+                    manifest = build(self.template_path, self.dist_dir)
+                self._shell = {'etag': manifest['shell_etag'], 'bodies': {}}
+                for encoding, suffix in ((None, ''), ('gzip', '.gz'), ('br', '.br')):
+                    path = os.path.join(self.dist_dir, f"index.html{suffix}")
+                    if os.path.exists(path):
+                        with open(path, 'rb') as f:
+                            self._shell['bodies'][encoding] = f.read()
+            return self._shell
+
+    def _encoding(self, available):
+        if request.accept_encodings['br'] and 'br' in available:
+            return 'br'
+        if request.accept_encodings['gzip'] and 'gzip' in available:
+            return 'gzip'
+        return None
+
+    def shell_response(self):
+        shell = self._current()
+        encoding = self._encoding(shell['bodies'])
+        etag = f"{shell['etag']}-{encoding}" if encoding else shell['etag']
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(shell['bodies'][encoding])
+            response.mimetype = 'text/html'
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def asset_response(self, filename):
+        self._current()
+        base, ext = os.path.splitext(filename)
+        if '/' in filename or not base.startswith('app.') or ext not in MIMETYPES:
+            return make_response('Not found', 404)
+        path = os.path.join(self.dist_dir, filename)
+        available = {encoding for encoding, suffix in (('gzip', '.gz'), ('br', '.br'))
+                     if os.path.exists(f"{path}{suffix}")}
+        encoding = self._encoding(available)
+        if encoding:
+            path = f"{path}{'.br' if encoding == 'br' else '.gz'}"
+        if not os.path.exists(path):
+            return make_response('Not found', 404)
+
+        response = send_file(path, mimetype=MIMETYPES[ext], conditional=False, etag=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == '__main__':
+    template = sys.argv[1] if len(sys.argv) > 1 else TEMPLATE_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else DIST_DIR
+    built = build(template, output)
+    for name in [*built['assets'].values(), 'index.html']:
+        sizes = [f"{label} {os.path.getsize(os.path.join(output, name + suffix)):,}"
+                 for label, suffix in (('raw', ''), ('gzip', '.gz'), ('brotli', '.br'))
+                 if os.path.exists(os.path.join(output, name + suffix))]
+        print(f"{name}: {', '.join(sizes)} bytes")
@@ -0,0 +1,87 @@
+import re
+
+# Subtrees that never hold business content
+PRUNED_TAGS = frozenset(["script", "style", "noscript", "template", "svg", "iframe", "canvas", "form", "nav", "header", "footer"])
+PRUNED_MARKERS = re.compile(r"cookie|consent|gdpr|popup|modal|newsletter|breadcrumb|skip-link")
+HEADING_TAGS = frozenset(["h1", "h2", "h3"])
+
+MAX_TEXT_CHARS = 200_000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class PageText:
+    """Normalized, lowercased page text shared by every analyzer.
+
+    `sections` holds (heading, start, end) offsets into `text` for each
+    h1-h3 heading, so analyzers can look at one part of the page without
+    re-walking the soup.
+    """
+
+    __slots__ = ("text", "sections")
+
+    def __init__(self, text, sections):
+        self.text = text
+        self.sections = sections
+
+    def __len__(self):
+        return len(self.text)
+
+    def section(self, heading):
+        heading = heading.lower()
+        for name, start, end in self.sections:
+            if heading in name:
+                return self.text[start:end]
+        return ""
+
+
+def _pruned(tag):
+    if tag.name in PRUNED_TAGS:
+        return True
+    if tag.get("aria-hidden") == "true" or tag.get("hidden") is not None:
+        return True
+    attrs = tag.attrs
+    if "id" in attrs or "class" in attrs:
+        marker = f"{attrs.get('id', '')} {' '.join(attrs.get('class', []))}".lower()
+        return bool(PRUNED_MARKERS.search(marker))
+    return False
+
+
+def extract_text(soup, max_chars=MAX_TEXT_CHARS):
+    """Walk the document once, skipping non-content subtrees.
+
+    The walk stops as soon as `max_chars` of text has been collected.
+    """
+    from bs4 import NavigableString, Comment
+
+    root = soup.body or soup
+    parts = []
+    size = 0
+    headings = []
+    stack = [iter(root.contents)]
+
+    while stack and size < max_chars:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+        if isinstance(node, NavigableString):
+            if isinstance(node, Comment):
+                continue
+            chunk = _WHITESPACE.sub(" ", node).strip()
+            if chunk:
+                parts.append(chunk)
+                size += len(chunk) + 1
+            continue
+        if _pruned(node):
+            continue
+        if node.name in HEADING_TAGS:
+            headings.append((_WHITESPACE.sub(" ", node.get_text(" ", strip=True)).lower(), size))
+        stack.append(iter(node.contents))
+
+    text = " ".join(parts).lower()[:max_chars]
+    sections = []
+    for i, (name, start) in enumerate(headings):
+        end = headings[i + 1][1] if i + 1 < len(headings) else len(text)
+        sections.append((name, min(start, len(text)), min(end, len(text))))
+    return PageText(text, sections)
@@ -0,0 +1,205 @@
+import json
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Graph API batch requests accept at most 50 operations.
+BATCH_LIMIT = 50
+
+
+class TokenRegistry:
+    """Cache of page access tokens and their debug_token introspection results.
+
+    Publishing checks `is_valid` against the cached expiry, so no network call
+    happens on the hot path. A background thread batch-introspects tokens and
+    refreshes the ones that are close to expiring.
+    """
+
+    def __init__(self, graph_url, app_id=None, app_secret=None, user_token=None,
+                 refresh_margin=7 * 24 * 3600, introspect_interval=3600, timeout=10,
+                 on_refresh=None):
+        self.graph_url = graph_url
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.user_token = user_token
+        self.refresh_margin = refresh_margin
+        self.introspect_interval = introspect_interval
+        self.timeout = timeout
+        self.on_refresh = on_refresh
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def app_token(self):
+        if self.app_id and self.app_secret:
+            return f"{self.app_id}|{self.app_secret}"
+        return None
+
+    def register(self, page_id, access_token, name=None):
+        with self._lock:
+            entry = self._tokens.get(page_id)
+            if entry and entry['access_token'] == access_token:
+                if name:
+                    entry['name'] = name
+                return entry
+            entry = {
+                'access_token': access_token,
+                'name': name,
+                'is_valid': True,
+                'expires_at': None,
+                'checked_at': None,
+            }
+            self._tokens[page_id] = entry
+            return entry
+
+    def forget(self, page_id):
+        with self._lock:
+            self._tokens.pop(page_id, None)
+
+    def get(self, page_id):
+        return self._tokens.get(page_id)
+
+    def get_cached(self, page_id, access_token):
+        """Return the cached entry if it is for this token and still valid."""
+        entry = self._tokens.get(page_id)
+        if entry and entry['access_token'] == access_token and self.is_valid(page_id):
+            return entry
+        return None
+
+    def is_valid(self, page_id, now=None):
+        """O(1) validity check from the cached introspection result.
+
+        Tokens that have not been introspected yet are assumed valid.
+        An `expires_at` of 0 means the token never expires.
+        """
+        entry = self._tokens.get(page_id)
+        if entry is None or not entry['is_valid']:
+            return False
+        expires_at = entry['expires_at']
+        if not expires_at:
+            return True
+        return expires_at > (now or time.time())
+
+    def status(self):
+        now = time.time()
+        return [
+            {
+                'page_id': page_id,
+                'name': entry['name'],
+                'is_valid': self.is_valid(page_id, now),
+                'expires_at': entry['expires_at'],
+                'checked_at': entry['checked_at'],
+            }
+            for page_id, entry in list(self._tokens.items())
+        ]
+
+    def introspect(self, page_ids=None):
+        """Batch debug_token calls for the given pages (all pages by default)."""
+        with self._lock:
+            items = [(page_id, self._tokens[page_id]['access_token'])
+                     for page_id in (page_ids or list(self._tokens))
+                     if page_id in self._tokens]
+
+        for start in range(0, len(items), BATCH_LIMIT):
+            chunk = items[start:start + BATCH_LIMIT]
+            try:
+                results = self._debug_token_batch(chunk)
+            except Exception as e:
+                logger.error(f"Error introspecting tokens: {e}")
+                continue
+            checked_at = time.time()
+            with self._lock:
+                for (page_id, token), data in zip(chunk, results):
+                    entry = self._tokens.get(page_id)
+                    if entry is None or entry['access_token'] != token or data is None:
+                        continue
+                    entry['is_valid'] = bool(data.get('is_valid'))
+                    entry['expires_at'] = data.get('expires_at')
+                    entry['checked_at'] = checked_at
+
+    def _debug_token_batch(self, chunk):
+        batch = [
+            {
+                'method': 'GET',
+                'relative_url': f"debug_token?input_token={token}&access_token={self.app_token or token}",
+            }
+            for _, token in chunk
+        ]
+        response = requests.post(
+            self.graph_url,
+            data={'access_token': self.app_token or chunk[0][1], 'batch': json.dumps(batch)},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+        results = []
+        for item in response.json():
+            if not item or item.get('code') != 200:
+                results.append(None)
+                continue
+            results.append(json.loads(item.get('body') or '{}').get('data', {}))
+        return results
+
+    def expiring(self, now=None):
+        """Pages whose token expires within the refresh margin."""
+        deadline = (now or time.time()) + self.refresh_margin
+        return [page_id for page_id, entry in list(self._tokens.items())
+                if entry['expires_at'] and entry['expires_at'] < deadline]
+
+    def refresh(self, page_id):
+        """Fetch a fresh page token using the long-lived user token."""
+        if not self.user_token:
+            return False
+        try:
+            response = requests.get(
+                f"{self.graph_url}/{page_id}",
+                params={'access_token': self.user_token, 'fields': 'access_token,name'},
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                logger.warning(f"Token refresh failed for page {page_id}: {response.text}")
+                return False
+            data = response.json()
+        except Exception as e:
+            logger.error(f"Error refreshing token for page {page_id}: {e}")
+            return False
+
+        new_token = data.get('access_token')
+        if not new_token:
+            return False
+        self.register(page_id, new_token, data.get('name'))
+        if self.on_refresh:
+            self.on_refresh(page_id, new_token)
+        logger.info(f"Refreshed access token for page {page_id}")
+        return True
+
+    def run_once(self):
+        self.introspect()
+        refreshed = [page_id for page_id in self.expiring() if self.refresh(page_id)]
+        if refreshed:
+            self.introspect(refreshed)
+        return refreshed
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='token-registry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Token registry refresh failed: {e}")
+            self._stop.wait(self.introspect_interval)
@@ -0,0 +1,257 @@
+import hashlib
+import heapq
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+# Mersenne prime for the universal hash family; keeps a*x + b inside uint64
+PRIME = (1 << 31) - 1
+TOKEN_RE = re.compile(r"#?[a-z][a-z0-9]*(?:['-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a about after all also an and are as at be been before but by can could did do does for from get gets had has "
+    "have he her his how if in into is it its just may me more most my new news no not now of on one or our out over says say "
+    "should so than that the their them there these they this to top two up us was we were what when where which "
+    "who why will with would year years you your".split()
+)
+# Forward-decay weights are rebased before they can lose float precision
+MAX_LOG2_WEIGHT = 40
+
+
+def extract_terms(text, max_words=None):
+    """Hashtags, words and word pairs worth tracking in `text`, with their counts."""
+    terms = Counter()
+    words = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if token.startswith('#'):
+            # Explicit hashtags count double and don't form pairs
+            terms[token[1:]] += 2
+            continue
+        if len(token) < 2 or token in STOPWORDS:
+            words.append(None)
+            continue
+        words.append(token)
+        if max_words and len(words) >= max_words:
+            break
+    terms.update(word for word in words if word)
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]) if a and b)
+    return terms
+
+
+def hashtag(term):
+    return '#' + ''.join(part[:1].upper() + part[1:] for part in re.split(r"[\s'-]+", term) if part)
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimates: `depth` hashed rows of `width` counters.
+
+    Estimates never undercount; collisions overcount by at most about
+    e/width of the total weight with probability 1 - e^-depth. Updates are
+    conservative (only counters at the current estimate are raised), which
+    cuts the overcount for the rare terms that make up most of the stream.
+    """
+
+    def __init__(self, width=8192, depth=4, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, size=depth, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=depth, dtype=np.uint64)
+        self.width = width
+        self.counts = np.zeros((depth, width), dtype=np.float32)
+        self._rows = np.arange(depth)[:, None]
+
+    def _columns(self, terms):
+        hashes = np.fromiter((zlib.crc32(t.encode()) for t in terms), dtype=np.uint64, count=len(terms))
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME) % self.width
+
+    def add(self, terms, weights):
+        """Add `weights` to `terms` and return their new estimates."""
+        columns = self._columns(terms)
+        estimates = self.counts[self._rows, columns].min(axis=0) + np.asarray(weights, dtype=np.float32)
+        np.maximum.at(self.counts, (self._rows, columns), estimates[None, :])
+        return estimates
+
+    def estimate(self, term):
+        return float(self.counts[self._rows, self._columns([term])].min())
+
+    def scale(self, factor):
+        self.counts *= factor
+
+
+class TopK:
+    """The `k` heaviest terms seen so far, as a min-heap over their estimates.
+
+    Estimates only grow, so heap entries are allowed to go stale and are
+    refreshed lazily when they reach the top of the heap.
+    """
+
+    def __init__(self, k=20):
+        self.k = k
+        self.scores = {}
+        self._heap = []
+
+    def offer(self, term, score):
+        if term in self.scores:
+            self.scores[term] = max(self.scores[term], score)
+            return
+        if len(self.scores) < self.k:
+            self.scores[term] = score
+            heapq.heappush(self._heap, (score, term))
+            return
+        while True:
+            low, low_term = self._heap[0]
+            current = self.scores[low_term]
+            if current == low:
+                break
+            heapq.heapreplace(self._heap, (current, low_term))
+        if score <= low:
+            return
+        heapq.heapreplace(self._heap, (score, term))
+        del self.scores[low_term]
+        self.scores[term] = score
+
+    def scale(self, factor):
+        self.scores = {term: score * factor for term, score in self.scores.items()}
+        self._heap = [(score * factor, term) for score, term in self._heap]
+
+
+class DecayingTrends:
+    """Time-decayed term counts for one industry.
+
+    Uses forward decay: an occurrence at time t is added with weight
+    2^(t / half_life), so older occurrences shrink relative to newer ones
+    without touching stored counts. Dividing by the current weight turns a
+    stored count into a decayed score. Counts are rebased when the weights
+    grow large.
+    """
+
+    def __init__(self, half_life, k, width, depth):
+        self.half_life = half_life
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(k)
+        self.landmark = time.time()
+
+    def _log2_weight(self, now):
+        return (now - self.landmark) / self.half_life
+
+    def add(self, terms, weight, now):
+        log2_weight = self._log2_weight(now)
+        if log2_weight > MAX_LOG2_WEIGHT:
+            factor = 2.0 ** -log2_weight
+            self.sketch.scale(factor)
+            self.top.scale(factor)
+            self.landmark = now
+            log2_weight = 0.0
+        names = list(terms)
+        scale = weight * 2.0 ** log2_weight
+        estimates = self.sketch.add(names, [terms[name] * scale for name in names])
+        for name, estimate in zip(names, estimates):
+            self.top.offer(name, float(estimate))
+
+    def trending(self, limit, now, min_score):
+        factor = 2.0 ** -self._log2_weight(now)
+        # On equal scores the word pair is the more specific trend
+        ranked = sorted(self.top.scores.items(), key=lambda item: (-item[1], -item[0].count(' ')))
+        return [(term, score * factor) for term, score in ranked if score * factor >= min_score][:limit]
+
+
+class TrendTracker:
+    """Streaming trending terms and hashtags per industry, from headlines and page text.
+
+    Every headline and scraped page is tokenized once and its terms are
+    added to the industry's Count-Min Sketch, whose estimates feed a
+    top-k heap. Memory per industry is fixed by the sketch size and `k`
+    regardless of how many distinct terms have been seen, and reading the
+    current trends only looks at the k heap entries. Texts already seen are
+    skipped, so re-fetched headlines don't inflate their counts.
+    """
+
+    def __init__(self, half_life_hours=6, k=20, width=8192, depth=4, max_industries=50,
+                 page_weight=0.25, page_max_words=2000, min_score=1.0, seen_max=20000):
+        self.half_life = half_life_hours * 3600
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.max_industries = max_industries
+        self.page_weight = page_weight
+        self.page_max_words = page_max_words
+        self.min_score = min_score
+        self.seen_max = seen_max
+        self._industries = OrderedDict()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(industry):
+        return (industry or '').strip().lower()
+
+    def _first_sighting(self, key, text):
+        digest = hashlib.blake2b(f"{key}\0{text}".encode(), digest_size=12).digest()
+        if digest in self._seen:
+            return False
+        self._seen[digest] = None
+        while len(self._seen) > self.seen_max:
+            self._seen.popitem(last=False)
+        return True
+
+    def _observe(self, industry, text, weight, max_words=None):
+        key = self._key(industry)
+        if not key or not text:
+            return
+        terms = extract_terms(text, max_words)
+        # The industry itself is always "trending" for its own feed
+        for word in key.split():
+            terms.pop(word, None)
+        if not terms:
+            return
+        with self._lock:
+            if not self._first_sighting(key, text):
+                return
+            trends = self._industries.get(key)
+            if trends is None:
+                trends = DecayingTrends(self.half_life, self.k, self.width, self.depth)
+                self._industries[key] = trends
+                while len(self._industries) > self.max_industries:
+                    self._industries.popitem(last=False)
+            else:
+                self._industries.move_to_end(key)
+            trends.add(terms, weight, time.time())
+
+    def observe_headlines(self, industry, headlines):
+        for headline in headlines:
+            self._observe(industry, headline, 1.0)
+
+    def observe_page(self, industry, text):
+        self._observe(industry, text, self.page_weight, self.page_max_words)
+
+    def trending(self, industry, limit=10):
+        """[(term, decayed score)] for the industry, highest first."""
+        with self._lock:
+            trends = self._industries.get(self._key(industry))
+            if trends is None:
+                return []
+            return [(term, round(score, 3)) for term, score in trends.trending(limit, time.time(), self.min_score)]
+
+    def hashtags(self, industry, limit=3):
+        """Tags for the top terms, skipping any that share a word with a better-ranked one."""
+        tags = []
+        used = set()
+        for term, _ in self.trending(industry, self.k):
+            words = set(term.split())
+            if words & used:
+                continue
+            used |= words
+            tags.append(hashtag(term))
+            if len(tags) == limit:
+                break
+        return tags
+
+    def status(self):
+        with self._lock:
+            return {
+                'industries': len(self._industries),
+                'sketch_bytes': sum(trends.sketch.counts.nbytes for trends in self._industries.values()),
+                'seen_texts': len(self._seen),
+            }
@@ -0,0 +1,334 @@
+"""Facebook page webhooks: signature check, bounded queue and batched writes.
+
+The receiving route only verifies the signature and queues the raw body,
+so Facebook gets its 200 without waiting on parsing or disk. A single
+worker thread drains the queue in batches, parses the deliveries into
+events, appends each batch to a JSON-lines log in one write and folds it
+into per-post activity (comments, reactions, status) keyed by Facebook
+post id and linked to our post ids.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Hub-Signature-256'
+
+# Feed items that are the post itself rather than a comment or reaction on it
+POST_ITEMS = frozenset(['post', 'status', 'photo', 'video', 'share'])
+POST_STATUSES = {'add': 'published', 'edited': 'edited', 'remove': 'removed', 'hide': 'hidden', 'unhide': 'published'}
+# Dedup keys per line of a compacted log
+SEEN_LINE_KEYS = 10000
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret, body, header):
+    """Whether `header` is the X-Hub-Signature-256 of `body` under the app secret."""
+    if not secret or not header:
+        return False
+    return hmac.compare_digest(sign(secret, body), header)
+
+
+def parse_events(payload, received_at):
+    """Flat `feed` change events from one delivery; other fields are skipped."""
+    events = []
+    ignored = 0
+    if not isinstance(payload, dict) or payload.get('object') != 'page':
+        return events, 1
+    for entry in payload.get('entry') or []:
+        page_id = str(entry.get('id') or '')
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            if change.get('field') != 'feed' or not value.get('post_id'):
+                ignored += 1
+                continue
+            events.append({
+                'fb_post_id': value['post_id'],
+                'page_id': page_id,
+                'item': value.get('item'),
+                'verb': value.get('verb'),
+                'reaction_type': value.get('reaction_type'),
+                'comment_id': value.get('comment_id'),
+                'created_time': value.get('created_time') or entry.get('time'),
+                'received_at': received_at,
+                # Facebook redelivers until it gets a 200, so identical changes are dropped by key
+                'key': hashlib.blake2b(json.dumps([page_id, value], sort_keys=True).encode(),
+                                       digest_size=12).hexdigest(),
+            })
+    return events, ignored
+
+
+class PostIndex:
+    """fb_post_id -> (post_id, page_id) over published posts, including their `pages` entries.
+
+    Rebuilt on a lookup miss when `version()` has changed, or at most every
+    `max_age` seconds otherwise, since webhooks can arrive for posts that
+    were published elsewhere or just before their record is written.
+    """
+
+    def __init__(self, items, version, max_age=30):
+        self.items = items
+        self.version = version
+        self.max_age = max_age
+        self._index = {}
+        self._built_version = None
+        self._built_at = 0.0
+
+    def _rebuild(self):
+        index = {}
+        for post_id, pub_data in list(self.items()):
+            if pub_data.get('fb_post_id'):
+                index[pub_data['fb_post_id']] = (post_id, pub_data.get('page_id'))
+            for page_id, page_post in (pub_data.get('pages') or {}).items():
+                if page_post.get('fb_post_id'):
+                    index[page_post['fb_post_id']] = (post_id, page_id)
+        self._index = index
+        self._built_at = time.monotonic()
+
+    def resolve(self, fb_post_ids):
+        """{fb_post_id: (post_id, page_id)} for the ids that belong to published posts."""
+        missing = [fb_post_id for fb_post_id in fb_post_ids if fb_post_id not in self._index]
+        if missing:
+            version = self.version()
+            if version != self._built_version or time.monotonic() - self._built_at > self.max_age:
+                self._built_version = version
+                self._rebuild()
+        return {fb_post_id: self._index[fb_post_id] for fb_post_id in fb_post_ids if fb_post_id in self._index}
+
+
+def _new_activity():
+    return {'post_id': None, 'page_id': None, 'status': None, 'comments': 0, 'reactions': {},
+            'events': 0, 'last_event_at': None}
+
+
+class ActivityStore:
+    """Per Facebook post counters, persisted as an append-only JSON-lines event log.
+
+    `write` appends a whole batch with one write call and then updates the
+    in-memory state. On start the log is replayed; when it has grown well
+    past the number of posts it is rewritten as one snapshot line per post,
+    followed by the recent dedup keys.
+    """
+
+    def __init__(self, path=None, seen_max=100000):
+        self.path = path
+        self.seen_max = seen_max
+        self.posts = {}
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            self._load()
+            self._file = open(path, 'ab')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write cut short by a crash
+                    continue
+                lines += 1
+                if 'snapshot' in record:
+                    self.posts[record['snapshot']] = record['state']
+                elif 'seen' in record:
+                    for key in record['seen']:
+                        self._remember(key)
+                else:
+                    self._remember(record.get('key'))
+                    self._apply(record)
+        if lines > max(10000, 4 * len(self.posts)):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(dumps({'snapshot': fb_post_id, 'state': state}) + b"\n"
+                         for fb_post_id, state in self.posts.items())
+            # The recent keys, oldest first, so a redelivery after a restart is still dropped
+            seen = list(self._seen)
+            f.writelines(dumps({'seen': seen[start:start + SEEN_LINE_KEYS]}) + b"\n"
+                         for start in range(0, len(seen), SEEN_LINE_KEYS))
+        os.replace(tmp_path, self.path)
+        logger.info(f"Compacted page event log to {len(self.posts)} posts")
+
+    def _remember(self, key):
+        """False if the event key was already seen."""
+        if key is None:
+            return True
+        if key in self._seen:
+            return False
+        self._seen[key] = None
+        while len(self._seen) > self.seen_max:
+            self._seen.popitem(last=False)
+        return True
+
+    def _apply(self, event):
+        state = self.posts.get(event['fb_post_id'])
+        if state is None:
+            state = self.posts[event['fb_post_id']] = _new_activity()
+        if event.get('post_id'):
+            state['post_id'] = event['post_id']
+        state['page_id'] = state['page_id'] or event.get('page_id')
+        state['events'] += 1
+        state['last_event_at'] = event.get('created_time') or event.get('received_at')
+
+        item, verb = event.get('item'), event.get('verb')
+        if item == 'comment':
+            if verb == 'add':
+                state['comments'] += 1
+            elif verb == 'remove':
+                state['comments'] = max(state['comments'] - 1, 0)
+        elif item == 'reaction':
+            reaction = event.get('reaction_type') or 'like'
+            reactions = state['reactions']
+            if verb == 'add':
+                reactions[reaction] = reactions.get(reaction, 0) + 1
+            elif verb == 'remove' and reactions.get(reaction):
+                reactions[reaction] -= 1
+        elif item in POST_ITEMS and verb in POST_STATUSES:
+            state['status'] = POST_STATUSES[verb]
+
+    def write(self, events):
+        """Persist and apply a batch; returns the events that weren't duplicates."""
+        with self._lock:
+            fresh = [event for event in events if self._remember(event.get('key'))]
+            if not fresh:
+                return fresh
+            if self._file is not None:
+                self._file.write(b''.join(dumps(event) + b"\n" for event in fresh))
+                self._file.flush()
+            for event in fresh:
+                self._apply(event)
+            return fresh
+
+    def activity(self, fb_post_ids):
+        with self._lock:
+            return {fb_post_id: dict(self.posts[fb_post_id], reactions=dict(self.posts[fb_post_id]['reactions']))
+                    for fb_post_id in fb_post_ids if fb_post_id in self.posts}
+
+    def status(self):
+        with self._lock:
+            return {
+                'posts': len(self.posts),
+                'linked_posts': sum(1 for state in self.posts.values() if state['post_id']),
+            }
+
+
+class WebhookIngester:
+    """Bounded queue of raw webhook deliveries and the worker that writes them in batches.
+
+    `submit` only enqueues, so the route answers in microseconds. When the
+    queue is full the delivery is refused and Facebook retries it later,
+    instead of the process buffering without limit. The worker takes up to
+    `batch_size` deliveries, waiting at most `flush_interval` for a batch
+    to fill, and hands all their events to the store in one write.
+    """
+
+    def __init__(self, store, index, max_queue=10000, batch_size=500, flush_interval=0.05, on_batch=None):
+        self.store = store
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_batch = on_batch
+        self.counts = Counter()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._last_flush_ms = 0.0
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name='webhook-ingester', daemon=True)
+        self._worker.start()
+
+    def submit(self, body):
+        try:
+            self._queue.put_nowait((body, time.time()))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('received')
+        return True
+
+    def reject(self):
+        """Count a delivery refused for a bad signature."""
+        self._count('invalid_signature')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._process(batch)
+            except Exception:
+                logger.exception(f"Failed to ingest {len(batch)} webhook deliveries")
+                self._count('failed', len(batch))
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        events = []
+        for body, received_at in batch:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._count('malformed', 1)
+                continue
+            parsed, ignored = parse_events(payload, received_at)
+            events.extend(parsed)
+            self._count('ignored', ignored)
+
+        links = self.index.resolve({event['fb_post_id'] for event in events})
+        for event in events:
+            post_id, page_id = links.get(event['fb_post_id'], (None, None))
+            event['post_id'] = post_id
+            event['page_id'] = event['page_id'] or page_id
+
+        fresh = self.store.write(events)
+        self._count('events', len(fresh))
+        self._count('duplicates', len(events) - len(fresh))
+        self._count('unlinked', sum(1 for event in fresh if not event['post_id']))
+        self._count('batches', 1)
+        self._count('processed', len(batch))
+        self._last_flush_ms = (time.perf_counter() - started) * 1000
+        if fresh and self.on_batch is not None:
+            self.on_batch(fresh)
+
+    def _counts(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def status(self):
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'last_batch_ms': round(self._last_flush_ms, 2),
+            **self._counts(),
+            **self.store.status(),
+        }